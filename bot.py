@@ -5,10 +5,18 @@
 # =========================================================
 
 import os
+import csv
+import copy
+import gzip
 import json
+import bisect
 import random
+import sqlite3
+import tempfile
 import threading
+import time
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 
 from dotenv import load_dotenv
 from telegram import (
@@ -21,6 +29,7 @@ from telegram.ext import (
     Updater,
     CommandHandler,
     CallbackQueryHandler,
+    ChatMemberHandler,
     MessageHandler,
     Filters,
     CallbackContext,
@@ -42,15 +51,48 @@ CHANNEL_LINK = os.getenv("CHANNEL_LINK", "https://t.me/PowerPointBreak")
 ADMIN_CONTACT = os.getenv("ADMIN_CONTACT", "@MinexxProo")
 DATA_FILE = os.getenv("DATA_FILE", "giveaway_data.json")
 
+# live post refresh cadence (seconds); per giveaway override via /refreshrate
+LIVE_REFRESH_MIN = max(1, int(os.getenv("LIVE_REFRESH_MIN", "1")))
+LIVE_REFRESH_MAX = max(1, int(os.getenv("LIVE_REFRESH_MAX", "60")))
+
+# per-user click limits (token bucket per action) and load shedding;
+# CLICK_SHED_DEPTH = queued updates above which non-admin clicks get "busy" (0 = off)
+CLICK_RATE = max(0.01, float(os.getenv("CLICK_RATE", "1")))
+CLICK_BURST = max(1, int(os.getenv("CLICK_BURST", "4")))
+CLICK_SHED_DEPTH = max(0, int(os.getenv("CLICK_SHED_DEPTH", "500")))
+
+# max independent Telegram calls in flight per fan-out
+FANOUT_WORKERS = max(1, int(os.getenv("FANOUT_WORKERS", "8")))
+
+# verify membership cache (seconds): confirmed members / confirmed non-members
+VERIFY_TTL_OK = max(0, int(os.getenv("VERIFY_TTL_OK", "300")))
+VERIFY_TTL_FAIL = max(0, int(os.getenv("VERIFY_TTL_FAIL", "20")))
+
+# membership index fed by chat_member updates (bot must be admin in the watched chats)
+MEMBERSHIP_DB = os.getenv("MEMBERSHIP_DB", "membership.db")
+
+# Bot API endpoint; point at fake_bot_api.py for offline runs (e.g. http://127.0.0.1:8081/bot)
+TELEGRAM_BASE_URL = os.getenv("TELEGRAM_BASE_URL", "").strip() or None
+
 # =========================================================
 # THREAD SAFE STORAGE
 # =========================================================
-lock = threading.RLock()
+# one lock per area of `data`; when nesting, always take them in this order:
+#   lock -> history_lock -> parts_lock
+# never hold any of them across a Telegram call or a file write
+lock = threading.RLock()          # giveaway config/state, verify targets, blocks, job handles
+history_lock = threading.RLock()  # data["history"] snapshots + latest_gid
+parts_lock = threading.RLock()    # data["participants"] + first-join fields + eligible_index
+
+HISTORY_KEYS = ("history", "latest_gid")
+PARTS_KEYS = ("participants", "first_winner_id", "first_winner_username", "first_winner_name")
 
 # =========================================================
 # JOB HANDLES
 # =========================================================
 countdown_job = None
+countdown_due_ts = 0.0
+live_last_edit_ts = 0.0
 closed_msg_job = None
 
 draw_progress_job = None
@@ -115,6 +157,10 @@ def fresh_default_data():
         "claim_expires_ts": None,
         "winners_message_id": None,
 
+        # live post refresh policy (None -> LIVE_REFRESH_MIN / LIVE_REFRESH_MAX)
+        "refresh_min": None,
+        "refresh_max": None,
+
         # Auto Draw master switch
         "autodraw_enabled": False,
 
@@ -150,9 +196,57 @@ def load_data():
 
 
 def save_data():
+    # cheap: marks data dirty; the save writer thread serializes and writes it
+    save_pending.set()
+
+
+def dump_data() -> str:
+    # each area is serialized under its own lock only, then stitched together
+    def section(keys):
+        return {k: json.dumps(data.get(k), indent=4, ensure_ascii=False) for k in keys}
+
     with lock:
-        with open(DATA_FILE, "w", encoding="utf-8") as f:
-            json.dump(data, f, indent=4, ensure_ascii=False)
+        out = section([k for k in list(data.keys()) if k not in HISTORY_KEYS and k not in PARTS_KEYS])
+    with history_lock:
+        out.update(section(HISTORY_KEYS))
+    with parts_lock:
+        out.update(section(PARTS_KEYS))
+    body = ",\n".join(f"    {json.dumps(k)}: {v.replace(chr(10), chr(10) + '    ')}" for k, v in out.items())
+    return "{\n" + body + "\n}"
+
+
+def write_data_file(text: str):
+    tmp = DATA_FILE + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, DATA_FILE)
+
+
+def flush_data():
+    # synchronous save (writer loop, shutdown); only the file itself is serialized
+    save_pending.clear()
+    text = dump_data()
+    with save_io_lock:
+        write_data_file(text)
+
+
+def _save_writer_loop():
+    while True:
+        save_pending.wait()
+        try:
+            flush_data()
+        except Exception as e:
+            print(f"save failed: {e}")
+            save_pending.set()
+            time.sleep(1)
+
+
+def start_save_writer():
+    threading.Thread(target=_save_writer_loop, name="save-writer", daemon=True).start()
+
+
+save_pending = threading.Event()
+save_io_lock = threading.Lock()
 
 
 data = load_data()
@@ -184,6 +278,12 @@ def participants_count() -> int:
     return len(data.get("participants", {}) or {})
 
 
+def history_snapshot(gid: str) -> dict:
+    # private copy of one history entry; render / answer from it with no lock held
+    with history_lock:
+        return copy.deepcopy((data.get("history", {}) or {}).get(gid, {}) or {})
+
+
 def format_hms(seconds: int) -> str:
     if seconds < 0:
         seconds = 0
@@ -193,11 +293,14 @@ def format_hms(seconds: int) -> str:
     return f"{h:02d}:{m:02d}:{s:02d}"
 
 
-def build_bar(percent: int) -> str:
+def bar_filled(percent: int) -> int:
     percent = max(0, min(100, int(percent)))
-    blocks = 10
-    filled = int(round(blocks * percent / 100.0))
-    empty = blocks - filled
+    return int(round(10 * percent / 100.0))
+
+
+def build_bar(percent: int) -> str:
+    filled = bar_filled(percent)
+    empty = 10 - filled
     return "▰" * filled + "▱" * empty
 
 
@@ -257,6 +360,25 @@ def safe_edit_markup(bot, chat_id, message_id, reply_markup=None):
         return False, str(e)
 
 
+# bounded pool for independent Telegram calls (never submit to it from inside itself)
+fanout_pool = ThreadPoolExecutor(max_workers=FANOUT_WORKERS, thread_name_prefix="fanout")
+
+
+def fan_out(*calls):
+    """
+    Runs independent zero-arg callables concurrently on the bounded pool.
+    Returns results in call order; a failed call yields its exception.
+    """
+    futures = [fanout_pool.submit(c) for c in calls]
+    out = []
+    for f in futures:
+        try:
+            out.append(f.result())
+        except Exception as e:
+            out.append(e)
+    return out
+
+
 def normalize_verify_ref(text: str) -> str:
     s = (text or "").strip()
     if not s:
@@ -275,22 +397,214 @@ def normalize_verify_ref(text: str) -> str:
     return ""
 
 
+# =========================================================
+# MEMBERSHIP INDEX (chat_member updates -> SQLite)
+# =========================================================
+# A chat is "live" once a chat_member update has arrived from it in this
+# process. Only "event" rows written since then are trusted: anything older may
+# have missed a leave while the bot was down. "join" rows (the user passed
+# verification at ts) are trusted for VERIFY_TTL_OK, like the verify cache.
+member_db = None  # opened by init_membership_index()
+member_db_lock = threading.Lock()
+member_live_since = {}  # chat_key -> ts of its first chat_member update in this process
+
+
+def init_membership_index():
+    global member_db
+    with member_db_lock:
+        if member_db is None:
+            member_db = sqlite3.connect(MEMBERSHIP_DB, check_same_thread=False)
+        member_db.executescript(
+            """
+            PRAGMA journal_mode=WAL;
+            PRAGMA synchronous=NORMAL;
+            CREATE TABLE IF NOT EXISTS membership (
+                chat_key TEXT NOT NULL,
+                user_id INTEGER NOT NULL,
+                is_member INTEGER NOT NULL,
+                source TEXT NOT NULL,      -- event / join
+                ts REAL NOT NULL,
+                PRIMARY KEY (chat_key, user_id)
+            );
+            CREATE TABLE IF NOT EXISTS member_chats (
+                chat_key TEXT PRIMARY KEY,
+                last_event_ts REAL NOT NULL
+            );
+            """
+        )
+        member_live_since.clear()
+
+
+def member_key(ref) -> str:
+    ref = str(ref or "").strip()
+    return ref.lower() if ref.startswith("@") else ref
+
+
+def chat_keys(chat) -> list:
+    keys = [str(chat.id)]
+    if getattr(chat, "username", None):
+        keys.append("@" + chat.username.lower())
+    return keys
+
+
+def membership_lookup(refs: list, user_id: int) -> dict:
+    # ref -> True/False for rows that can be trusted (see above); refs not returned are unknown
+    if member_db is None:
+        return {}
+    keys = {member_key(r): r for r in refs}
+    marks = ",".join("?" * len(keys))
+    with member_db_lock:
+        rows = member_db.execute(
+            f"SELECT chat_key, is_member, source, ts FROM membership WHERE user_id=? AND chat_key IN ({marks})",
+            [user_id, *keys],
+        ).fetchall()
+    join_after = now_ts() - VERIFY_TTL_OK
+    out = {}
+    for k, m, source, ts in rows:
+        if source == "event":
+            since = member_live_since.get(k)
+            if since is not None and ts >= since:
+                out[keys[k]] = bool(m)
+        elif ts > join_after:
+            out[keys[k]] = bool(m)
+    return out
+
+
+def membership_record_event(keys: list, user_id: int, is_member: bool):
+    if member_db is None:
+        return
+    now = now_ts()
+    with member_db_lock:
+        for k in keys:
+            member_live_since.setdefault(k, now)
+        member_db.executemany(
+            "INSERT OR REPLACE INTO membership(chat_key,user_id,is_member,source,ts) VALUES(?,?,?,?,?)",
+            [(k, user_id, 1 if is_member else 0, "event", now) for k in keys],
+        )
+        member_db.executemany(
+            "INSERT OR REPLACE INTO member_chats(chat_key,last_event_ts) VALUES(?,?)",
+            [(k, now) for k in keys],
+        )
+        member_db.commit()
+
+
+def membership_record_joins(joins: list, refs: list):
+    # joins: (user_id, ts) of participants that passed verification for these targets at ts;
+    # refreshes earlier "join" rows, never overrides a row that came from a chat_member update
+    rows = [(member_key(r), int(u), 1, "join", float(ts or 0)) for u, ts in joins for r in refs if r]
+    if not rows or member_db is None:
+        return
+    with member_db_lock:
+        member_db.executemany(
+            "INSERT INTO membership(chat_key,user_id,is_member,source,ts) VALUES(?,?,?,?,?) "
+            "ON CONFLICT(chat_key,user_id) DO UPDATE SET is_member=1, ts=excluded.ts "
+            "WHERE membership.source='join' AND excluded.ts > membership.ts",
+            rows,
+        )
+        member_db.commit()
+
+
+def warm_membership_from_participants():
+    # rows keep the original join time, so only recent joins are still trusted after a restart
+    with parts_lock:
+        joins = [(uid, (info or {}).get("joined_ts", 0)) for uid, info in (data.get("participants", {}) or {}).items()]
+    with lock:
+        refs = [(t or {}).get("ref", "") for t in (data.get("verify_targets", []) or [])]
+    membership_record_joins(joins, refs)
+
+
+def watched_member_keys() -> set:
+    refs = [(t or {}).get("ref", "") for t in (data.get("verify_targets", []) or [])]
+    return {member_key(r) for r in refs if r} | {str(CHANNEL_ID)}
+
+
+def on_chat_member(update: Update, context: CallbackContext):
+    cmu = update.chat_member
+    if not cmu or not cmu.new_chat_member:
+        return
+    keys = chat_keys(cmu.chat)
+    if not watched_member_keys() & set(keys):
+        return
+    new = cmu.new_chat_member
+    status = getattr(new, "status", None)
+    is_member = status in ("member", "administrator", "creator") or (
+        status == "restricted" and bool(getattr(new, "is_member", False))
+    )
+    membership_record_event(keys, new.user.id, is_member)
+
+
+# (ref, user_id) -> (is_member, expires_ts); only definite answers are cached.
+# Expired entries are dropped when looked up, and all of them once the cache
+# grows past VERIFY_CACHE_PRUNE_ABOVE (at most one scan per VERIFY_TTL_FAIL, since
+# a cache full of live entries would otherwise be rescanned on every miss).
+VERIFY_CACHE_PRUNE_ABOVE = 50000
+verify_cache = {}
+verify_cache_lock = threading.Lock()
+verify_cache_next_prune = 0.0
+
+
+def invalidate_verify_cache():
+    with verify_cache_lock:
+        verify_cache.clear()
+
+
+def check_member(bot, ref: str, user_id: int):
+    # True / False from Telegram, None if the call failed (not cached)
+    try:
+        member = bot.get_chat_member(chat_id=ref, user_id=user_id)
+    except Exception:
+        return None
+    return getattr(member, "status", None) in ("member", "administrator", "creator")
+
+
 def verify_user_join(bot, user_id: int) -> bool:
+    global verify_cache_next_prune
     targets = data.get("verify_targets", []) or []
     if not targets:
         return True
-    for t in targets:
-        ref = (t or {}).get("ref", "")
-        if not ref:
-            return False
-        try:
-            member = bot.get_chat_member(chat_id=ref, user_id=user_id)
-            status = getattr(member, "status", None)
-            if status not in ("member", "administrator", "creator"):
-                return False
-        except Exception:
-            return False
-    return True
+    refs = [(t or {}).get("ref", "") for t in targets]
+    if not all(refs):
+        return False
+
+    # membership index first (live chats only), then the TTL cache, then the API
+    known = membership_lookup(refs, user_id)
+    if any(v is False for v in known.values()):
+        return False
+
+    now = now_ts()
+    misses = []
+    with verify_cache_lock:
+        for ref in refs:
+            if ref in known:
+                continue
+            hit = verify_cache.get((ref, user_id))
+            if hit and hit[1] > now:
+                if not hit[0]:
+                    return False
+            else:
+                if hit:
+                    del verify_cache[(ref, user_id)]
+                misses.append(ref)
+    if not misses:
+        return True
+
+    if len(misses) == 1:
+        results = [check_member(bot, misses[0], user_id)]
+    else:
+        results = fan_out(*[(lambda r=r: check_member(bot, r, user_id)) for r in misses])
+
+    now = now_ts()
+    with verify_cache_lock:
+        if len(verify_cache) >= VERIFY_CACHE_PRUNE_ABOVE and now >= verify_cache_next_prune:
+            for k in [k for k, v in verify_cache.items() if v[1] <= now]:
+                del verify_cache[k]
+            verify_cache_next_prune = now + max(1, VERIFY_TTL_FAIL)
+        for ref, ok in zip(misses, results):
+            if ok is True:
+                verify_cache[(ref, user_id)] = (True, now + VERIFY_TTL_OK)
+            elif ok is False:
+                verify_cache[(ref, user_id)] = (False, now + VERIFY_TTL_FAIL)
+    return all(ok is True for ok in results)
 
 
 def parse_user_lines(text: str):
@@ -542,6 +856,20 @@ def autodraw_toggle_markup():
     )
 
 
+def winnerlist_nav_markup(page, first_key, last_key, has_prev, has_next):
+    # keys are (created_ts, gid) of the first/last giveaway on the page
+    buttons = []
+    if has_prev:
+        buttons.append(InlineKeyboardButton(
+            "⬅️ Prev", callback_data=f"winnerlist:p:{page - 1}:{first_key[0]!r}:{first_key[1]}"
+        ))
+    if has_next:
+        buttons.append(InlineKeyboardButton(
+            "Next ➡️", callback_data=f"winnerlist:n:{page + 1}:{last_key[0]!r}:{last_key[1]}"
+        ))
+    return InlineKeyboardMarkup([buttons]) if buttons else None
+
+
 def claim_button_markup(gid: str):
     return InlineKeyboardMarkup(
         [[InlineKeyboardButton("🏆✨ CLAIM YOUR PRIZE NOW ✨🏆", callback_data=f"claim:{gid}")]]
@@ -644,8 +972,7 @@ def build_closed_post_text(prize: str, total_p: int, total_w: int) -> str:
     )
 
 
-def build_winners_post_text(gid: str) -> str:
-    snap = (data.get("history", {}) or {}).get(gid, {}) or {}
+def build_winners_post_text(gid: str, snap: dict) -> str:
     winners = snap.get("winners", {}) or {}
     delivered = snap.get("delivered", {}) or {}
     prize = snap.get("prize", "")
@@ -696,8 +1023,7 @@ def build_winners_post_text(gid: str) -> str:
     return "\n".join(lines)
 
 
-def build_selection_post_text(gid: str, percent: int, time_remain: int, show_items: list, winners_selected: int, total_winners: int) -> str:
-    snap = (data.get("history", {}) or {}).get(gid, {}) or {}
+def build_selection_post_text(gid: str, snap: dict, percent: int, time_remain: int, show_items: list, winners_selected: int, total_winners: int) -> str:
     prize = snap.get("prize", "")
     title = snap.get("title", HOST_NAME)
 
@@ -733,19 +1059,79 @@ def build_selection_post_text(gid: str, percent: int, time_remain: int, show_ite
 # JOB CONTROLS
 # =========================================================
 def stop_live_countdown():
-    global countdown_job
-    if countdown_job is not None:
+    global countdown_job, countdown_due_ts
+    with lock:
+        job = countdown_job
+        countdown_job = None
+        countdown_due_ts = 0.0
+    if job is not None:
         try:
-            countdown_job.schedule_removal()
+            job.schedule_removal()
         except Exception:
             pass
-    countdown_job = None
 
 
 def start_live_countdown(job_queue):
-    global countdown_job
     stop_live_countdown()
-    countdown_job = job_queue.run_repeating(live_tick, interval=5, first=0, name="live_countdown")
+    schedule_live_tick(job_queue, 0)
+
+
+def live_refresh_policy():
+    lo = int(data.get("refresh_min") or LIVE_REFRESH_MIN)
+    hi = int(data.get("refresh_max") or LIVE_REFRESH_MAX)
+    lo = max(1, lo)
+    return lo, max(lo, hi)
+
+
+def live_bar_blocks(elapsed: int, duration: int) -> int:
+    duration = duration if duration > 0 else 1
+    elapsed = max(0, min(duration, elapsed))
+    return bar_filled(int(round((elapsed / float(duration)) * 100)))
+
+
+def live_refresh_delay(remaining: int, duration: int) -> int:
+    # per minute far from the end, per second near it; never skip a bar block
+    if remaining <= 0:
+        return 1
+    lo, hi = live_refresh_policy()
+    delay = max(lo, min(hi, remaining // 30))
+    delay = max(1, min(delay, remaining))
+
+    elapsed = duration - remaining
+    cur = live_bar_blocks(elapsed, duration)
+    if live_bar_blocks(elapsed + delay, duration) != cur:
+        a, b = 1, delay
+        while a < b:
+            mid = (a + b) // 2
+            if live_bar_blocks(elapsed + mid, duration) != cur:
+                b = mid
+            else:
+                a = mid + 1
+        delay = a
+    return delay
+
+
+def schedule_live_tick(job_queue, delay: float):
+    global countdown_job, countdown_due_ts
+    due = now_ts() + delay
+    with lock:
+        old = countdown_job
+        if old is not None and countdown_due_ts <= due:
+            return  # an earlier tick is already pending
+        countdown_job = job_queue.run_once(live_tick, when=max(0.0, delay), name="live_countdown")
+        countdown_due_ts = due
+    if old is not None:
+        try:
+            old.schedule_removal()
+        except Exception:
+            pass
+
+
+def request_live_refresh(job_queue):
+    # participant count changed: pull the next tick forward (max one edit per min interval)
+    lo, _ = live_refresh_policy()
+    wait = lo - (now_ts() - live_last_edit_ts)
+    schedule_live_tick(job_queue, max(0.0, wait))
 
 
 def stop_draw_jobs():
@@ -804,7 +1190,11 @@ def stop_reset_progress_job():
 # LIVE COUNTDOWN TICK
 # =========================================================
 def live_tick(context: CallbackContext):
+    global countdown_job, countdown_due_ts, live_last_edit_ts
     with lock:
+        if countdown_job is context.job:
+            countdown_job = None
+            countdown_due_ts = 0.0
         if not data.get("active"):
             stop_live_countdown()
             return
@@ -878,10 +1268,14 @@ def live_tick(context: CallbackContext):
                 pass
         return
 
+    # next tick (adaptive)
+    schedule_live_tick(context.job_queue, live_refresh_delay(remaining, duration))
+
     if not live_mid:
         return
 
     # update live post
+    live_last_edit_ts = now_ts()
     try:
         safe_edit_text(
             context.bot,
@@ -943,23 +1337,12 @@ def manual_draw_finalize(context: CallbackContext):
     admin_msg_id = jd["admin_msg_id"]
 
     with lock:
-        parts = data.get("participants", {}) or {}
-        if not parts:
-            safe_edit_text(context.bot, admin_chat_id, admin_msg_id, "No participants to draw winners from.")
-            return
-
-        # eligible pool for winners selection (username required)
-        eligible = []
-        for uid, info in parts.items():
-            uname = (info or {}).get("username", "")
-            if uname and uname.startswith("@"):
-                eligible.append(uid)
-
-        if not eligible:
-            safe_edit_text(context.bot, admin_chat_id, admin_msg_id, "No eligible entries (username required).")
-            return
-
         total_winners = max(1, int(data.get("winner_count", 1) or 1))
+        prize = data.get("prize", "")
+
+    with parts_lock:
+        parts = data.get("participants", {}) or {}
+        has_parts = bool(parts)
 
         # first join winner (must have username to be eligible; otherwise skip)
         first_uid = data.get("first_winner_id")
@@ -971,48 +1354,54 @@ def manual_draw_finalize(context: CallbackContext):
             if fu and fu.startswith("@"):
                 winners[str(first_uid)] = {"username": fu, "first": True}
 
-        pool = [uid for uid in eligible if uid not in winners]
-        need = max(0, total_winners - len(winners))
-        need = min(need, len(pool))
-        picked = random.sample(pool, need) if need > 0 else []
+        # one pass over the participants (username required), bounded memory
+        picked, seen = reservoir_sample(iter_eligible(parts, exclude=winners), total_winners - len(winners))
 
-        for uid in picked:
-            uname = (parts.get(uid, {}) or {}).get("username", "")
-            winners[str(uid)] = {"username": uname, "first": False}
+    if not has_parts:
+        safe_edit_text(context.bot, admin_chat_id, admin_msg_id, "No participants to draw winners from.")
+        return
+    if not seen and not winners:
+        safe_edit_text(context.bot, admin_chat_id, admin_msg_id, "No eligible entries (username required).")
+        return
 
-        # preview text (admin only) — will be posted to channel after approve
-        lines = []
-        lines.append("🏆 GIVEAWAY WINNER ANNOUNCEMENT 🏆")
-        lines.append("")
-        lines.append(HOST_NAME)
-        lines.append("")
-        lines.append(f"🎁 PRIZE: {data.get('prize','')}")
-        lines.append(f"📦 Prize Delivery: 0/{total_winners}")
-        lines.append("")
+    for uid, uname in picked:
+        winners[str(uid)] = {"username": uname, "first": False}
 
-        if winners:
-            first_block = [uid for uid, info in winners.items() if info.get("first") is True]
-            if first_block:
-                uid = first_block[0]
-                lines.append("🥇 ⭐ FIRST JOIN CHAMPION ⭐")
-                lines.append(f"👑 {winners[uid]['username']}")
-                lines.append(f"🆔 {uid}")
-                lines.append("")
+    # preview text (admin only) — will be posted to channel after approve
+    lines = []
+    lines.append("🏆 GIVEAWAY WINNER ANNOUNCEMENT 🏆")
+    lines.append("")
+    lines.append(HOST_NAME)
+    lines.append("")
+    lines.append(f"🎁 PRIZE: {prize}")
+    lines.append(f"📦 Prize Delivery: 0/{total_winners}")
+    lines.append("")
 
-        lines.append("👑 OTHER WINNERS")
-        i = 1
-        for uid, info in winners.items():
-            if info.get("first") is True:
-                continue
-            lines.append(f"{i}️⃣ 👤 {info.get('username','')} | 🆔 {uid} | Pending ⏳")
-            i += 1
+    if winners:
+        first_block = [uid for uid, info in winners.items() if info.get("first") is True]
+        if first_block:
+            uid = first_block[0]
+            lines.append("🥇 ⭐ FIRST JOIN CHAMPION ⭐")
+            lines.append(f"👑 {winners[uid]['username']}")
+            lines.append(f"🆔 {uid}")
+            lines.append("")
 
-        lines.append("")
-        lines.append("👇 Click the button below to claim your prize")
-        lines.append("")
-        lines.append("⏳ Rule: Claim within 24 hours — after that, prize expires.")
+    lines.append("👑 OTHER WINNERS")
+    i = 1
+    for uid, info in winners.items():
+        if info.get("first") is True:
+            continue
+        lines.append(f"{i}️⃣ 👤 {info.get('username','')} | 🆔 {uid} | Pending ⏳")
+        i += 1
 
-        data["pending_winners_text"] = "\n".join(lines)
+    lines.append("")
+    lines.append("👇 Click the button below to claim your prize")
+    lines.append("")
+    lines.append("⏳ Rule: Claim within 24 hours — after that, prize expires.")
+    text = "\n".join(lines)
+
+    with lock:
+        data["pending_winners_text"] = text
         data["winners_preview"] = winners
         save_data()
 
@@ -1020,7 +1409,7 @@ def manual_draw_finalize(context: CallbackContext):
         context.bot,
         admin_chat_id,
         admin_msg_id,
-        data["pending_winners_text"],
+        text,
         reply_markup=winners_approve_markup(),
     )
 
@@ -1039,23 +1428,17 @@ def start_autodraw_channel_progress(context: CallbackContext):
     """
     stop_autodraw_jobs()
 
+    gid = gen_giveaway_id()
     with lock:
-        parts = data.get("participants", {}) or {}
         total_winners = max(1, int(data.get("winner_count", 1) or 1))
         title = data.get("title", HOST_NAME)
         prize = data.get("prize", "")
-
-        gid = gen_giveaway_id()
-        data["latest_gid"] = gid
         data["autodraw_gid"] = gid
         data["autodraw_in_progress"] = True
 
-        # eligible pool: username required
-        eligible = []
-        for uid, info in parts.items():
-            uname = (info or {}).get("username", "")
-            if uname and uname.startswith("@"):
-                eligible.append(uid)
+    with parts_lock:
+        parts = data.get("participants", {}) or {}
+        parts_total = len(parts)
 
         # first winner (if eligible)
         winners = {}
@@ -1066,6 +1449,13 @@ def start_autodraw_channel_progress(context: CallbackContext):
             if fu and fu.startswith("@"):
                 winners[str(first_uid)] = {"username": fu, "first": True, "lucky": False}
 
+        # draw the remaining winners now; ticks only reveal them on schedule
+        picks, seen = reservoir_sample(iter_eligible(parts, exclude=winners), total_winners - len(winners))
+        reveal_plan = plan_reveals(picks)
+
+        show_items = _pick_showcase_items(gid, k=3, used=set())
+
+    with history_lock:
         # snapshot
         snap = {
             "gid": gid,
@@ -1076,8 +1466,8 @@ def start_autodraw_channel_progress(context: CallbackContext):
             "prize": prize,
             "winner_count": total_winners,
 
-            "participants_total": len(parts),
-            "eligible_total": len(eligible),
+            "participants_total": parts_total,
+            "eligible_total": seen + len(winners),
 
             "winners": winners,          # uid -> {"username","first","lucky"}
             "delivered": {},             # uid -> True
@@ -1090,20 +1480,24 @@ def start_autodraw_channel_progress(context: CallbackContext):
             "claim_expires_ts": None,
 
             "lucky_won_by": None,        # uid if lucky clicked first
+
+            "reveal_plan": reveal_plan,  # [[elapsed_sec, uid, username]] not yet revealed
         }
 
         data["history"][gid] = snap
+        data["latest_gid"] = gid
+        view = copy.deepcopy(snap)
         save_data()
 
     # post selection message in channel
-    show_items = _pick_showcase_items(gid, k=3, used=set())
     text = build_selection_post_text(
         gid=gid,
+        snap=view,
         percent=0,
         time_remain=AUTO_SELECT_TOTAL_SECONDS,
         show_items=show_items,
-        winners_selected=len((data["history"][gid].get("winners", {}) or {})),
-        total_winners=int(data["history"][gid].get("winner_count", 1) or 1),
+        winners_selected=len(view.get("winners", {}) or {}),
+        total_winners=int(view.get("winner_count", 1) or 1),
     )
 
     m = context.bot.send_message(
@@ -1118,18 +1512,21 @@ def start_autodraw_channel_progress(context: CallbackContext):
     except Exception:
         pass
 
-    with lock:
+    with history_lock:
         data["history"][gid]["selection_message_id"] = m.message_id
         save_data()
 
     # start tick updates
+    schedule_autodraw_jobs(context.job_queue, gid, AUTO_SELECT_TOTAL_SECONDS)
+
+
+def schedule_autodraw_jobs(job_queue, gid: str, remaining: float):
     ctx = {
         "gid": gid,
         "start_ts": now_ts(),
         "tick": 0,
 
-        # showcase cycle controls
-        "used_show_uids": [],
+        # showcase cycle controls (rotation lives in eligible_index)
         "show_last_1": 0,
         "show_last_2": 0,
         "show_last_3": 0,
@@ -1141,36 +1538,167 @@ def start_autodraw_channel_progress(context: CallbackContext):
     def tick(job_ctx: CallbackContext):
         _autodraw_tick(job_ctx)
 
+    autodraw_tick_stats.update(ticks=0, last_ms=0.0, max_ms=0.0, total_ms=0.0)
+
     global autodraw_tick_job, autodraw_finalize_job
-    autodraw_tick_job = context.job_queue.run_repeating(tick, interval=1, first=0, context=ctx, name="autodraw_tick")
-    autodraw_finalize_job = context.job_queue.run_once(_autodraw_finalize, when=AUTO_SELECT_TOTAL_SECONDS, context=ctx, name="autodraw_finalize")
+    autodraw_tick_job = job_queue.run_repeating(tick, interval=1, first=0, context=ctx, name="autodraw_tick")
+    autodraw_finalize_job = job_queue.run_once(_autodraw_finalize, when=max(0, remaining), context=ctx, name="autodraw_finalize")
 
 
-def _eligible_uids_for_gid(gid: str):
-    snap = (data.get("history", {}) or {}).get(gid, {}) or {}
-    parts = data.get("participants", {}) or {}
-    eligible = []
+def resume_autodraw(job_queue) -> bool:
+    # continue an interrupted selection from its snapshot (same gid, post and
+    # reveal plan); ticks catch up on anything due while the bot was down
+    with lock:
+        gid = data.get("autodraw_gid")
+    with history_lock:
+        snap = (data.get("history", {}) or {}).get(gid or "", {}) or {}
+        if not snap or snap.get("completed") or not snap.get("selection_message_id"):
+            return False
+        start_sel = float(snap.get("selection_start_ts", snap.get("created_ts", 0)) or 0)
+    stop_autodraw_jobs()
+    schedule_autodraw_jobs(job_queue, gid, AUTO_SELECT_TOTAL_SECONDS - (now_ts() - start_sel))
+    return True
+
+
+# no reveals in the first / last seconds of the selection
+AUTO_REVEAL_MARGIN = 10
+
+
+def iter_eligible(parts: dict, exclude=()):
+    # (uid, username) of participants with an @username, lazily
     for uid, info in parts.items():
         uname = (info or {}).get("username", "")
-        if uname and uname.startswith("@"):
-            eligible.append(uid)
-    # keep stable-ish order
-    random.shuffle(eligible)
-    return eligible
+        if uname and uname.startswith("@") and uid not in exclude:
+            yield uid, uname
+
+
+class EligibleIndex:
+    # uids with an @username: array + position map (O(1) add) and a rotating
+    # cursor for the selection showcase; follows data["participants"]. It only
+    # grows: participants are never removed one by one, the dict is replaced
+    # (reset, load) and that triggers a rebuild in sync()
+
+    def __init__(self):
+        self.uids = []
+        self.pos = {}
+        self.cursor = 0
+        self.source = None
+
+    def __len__(self):
+        return len(self.uids)
+
+    def sync(self, parts):
+        # rebuild only when the participants dict itself was replaced (reset, load)
+        if parts is not self.source:
+            self.source = parts
+            self.uids = [uid for uid, _ in iter_eligible(parts or {})]
+            random.shuffle(self.uids)
+            self.pos = {uid: i for i, uid in enumerate(self.uids)}
+            self.cursor = 0
+        return self
+
+    def add(self, uid: str):
+        if uid not in self.pos:
+            self.pos[uid] = len(self.uids)
+            self.uids.append(uid)
+
+    def next_show(self, skip=()):
+        # next uid in rotation not in skip; every uid shows once per round
+        n = len(self.uids)
+        for _ in range(min(n, len(skip) + 1)):
+            self.cursor %= n
+            uid = self.uids[self.cursor]
+            self.cursor += 1
+            if uid not in skip:
+                return uid
+        return None
+
+
+eligible_index = EligibleIndex()
+
+
+class HistoryOrder:
+    # (created_ts, gid) of data["history"] kept sorted, so a /winnerlist page is a
+    # bisect from its cursor instead of a sort of the whole history; re-sorted only
+    # when entries were added/removed or the dict was replaced (load, reset)
+
+    def __init__(self):
+        self.keys = []
+        self.source = None
+
+    def sync(self, hist):
+        if hist is not self.source or len(hist) != len(self.keys):
+            self.source = hist
+            self.keys = sorted(
+                (float((snap or {}).get("created_ts", 0) or 0), gid) for gid, snap in hist.items()
+            )
+        return self
+
+    def page(self, cursor, backward, size):
+        # newest first; cursor excluded. returns (keys, more in the walked direction)
+        if cursor is None:
+            hi = len(self.keys)
+            lo = max(0, hi - size)
+            return self.keys[lo:hi][::-1], lo > 0
+        if backward:
+            lo = bisect.bisect_right(self.keys, cursor)
+            hi = min(len(self.keys), lo + size)
+            return self.keys[lo:hi][::-1], hi < len(self.keys)
+        hi = bisect.bisect_left(self.keys, cursor)
+        lo = max(0, hi - size)
+        return self.keys[lo:hi][::-1], lo > 0
+
+
+history_order = HistoryOrder()
+autodraw_tick_stats = {"ticks": 0, "last_ms": 0.0, "max_ms": 0.0, "total_ms": 0.0}
+
+
+def reservoir_sample(items, k: int):
+    # uniform sample of up to k items in one pass; returns (sample, items seen)
+    k = max(0, k)
+    sample, seen = [], 0
+    for item in items:
+        seen += 1
+        if len(sample) < k:
+            sample.append(item)
+        else:
+            j = random.randrange(seen)
+            if j < k:
+                sample[j] = item
+    random.shuffle(sample)
+    return sample, seen
+
+
+def plan_reveals(picks: list) -> list:
+    lo = AUTO_REVEAL_MARGIN
+    hi = max(lo, AUTO_SELECT_TOTAL_SECONDS - AUTO_REVEAL_MARGIN)
+    offsets = sorted(random.randint(lo, hi) for _ in picks)
+    return [[off, uid, uname] for off, (uid, uname) in zip(offsets, picks)]
+
+
+def reveal_planned(snap: dict, upto: float) -> bool:
+    # move due plan entries into winners; True if anything changed (caller holds lock)
+    plan = snap.get("reveal_plan") or []
+    if not plan or plan[0][0] > upto:
+        return False
+    winners = snap.get("winners", {}) or {}
+    while plan and plan[0][0] <= upto:
+        _, uid, uname = plan.pop(0)
+        if uid not in winners:
+            winners[uid] = {"username": uname, "first": False, "lucky": False}
+    snap["winners"] = winners
+    snap["reveal_plan"] = plan
+    return True
 
 
 def _pick_showcase_items(gid: str, k=3, used=None):
     used = used or set()
-    parts = data.get("participants", {}) or {}
-    eligible = [uid for uid in _eligible_uids_for_gid(gid) if uid not in used]
+    with parts_lock:
+        parts = data.get("participants", {}) or {}
+        picks, _ = reservoir_sample(iter_eligible(parts, exclude=used), k)
 
     items = []
-    for _ in range(k):
-        if not eligible:
-            break
-        uid = eligible.pop(0)
-        info = parts.get(uid, {}) or {}
-        uname = info.get("username", "") or f"User ID: {uid}"
+    for uid, uname in picks:
         emoji = random.choice(COLOR_EMOJIS)
         items.append((emoji, uname, uid))
         used.add(uid)
@@ -1179,66 +1707,55 @@ def _pick_showcase_items(gid: str, k=3, used=None):
 
 
 def _autodraw_tick(context: CallbackContext):
+    t0 = time.perf_counter()
+    try:
+        _autodraw_tick_body(context)
+    finally:
+        ms = (time.perf_counter() - t0) * 1000
+        st = autodraw_tick_stats
+        st["ticks"] += 1
+        st["last_ms"] = ms
+        st["max_ms"] = max(st["max_ms"], ms)
+        st["total_ms"] += ms
+
+
+def _autodraw_tick_body(context: CallbackContext):
     jd = context.job.context
     gid = jd["gid"]
 
-    with lock:
+    with history_lock:
         snap = (data.get("history", {}) or {}).get(gid, {}) or {}
-        if not snap or snap.get("completed") is True:
-            stop_autodraw_jobs()
-            return
-
-        mid = snap.get("selection_message_id")
-        if not mid:
-            return
-
-        start_sel = float(snap.get("selection_start_ts", snap.get("created_ts", 0)) or 0)
-        elapsed = int(now_ts() - start_sel)
-        remain = max(0, AUTO_SELECT_TOTAL_SECONDS - elapsed)
-
-        percent = int(round(min(100, (elapsed / float(AUTO_SELECT_TOTAL_SECONDS)) * 100)))
+        done = not snap or snap.get("completed") is True
+        if not done:
+            mid = snap.get("selection_message_id")
+            start_sel = float(snap.get("selection_start_ts", snap.get("created_ts", 0)) or 0)
+            elapsed = int(now_ts() - start_sel)
+
+            # reveal planned winners whose time has come (no work in between)
+            if reveal_planned(snap, elapsed):
+                save_data()
+            view = {"title": snap.get("title", HOST_NAME), "prize": snap.get("prize", "")}
+            winners_selected = len(snap.get("winners", {}) or {})
+            total_winners = int(snap.get("winner_count", 1) or 1)
 
-        winners = snap.get("winners", {}) or {}
-        total_winners = int(snap.get("winner_count", 1) or 1)
+    if done:
+        stop_autodraw_jobs()
+        return
+    if not mid:
+        return
 
-        # auto add winners gradually (real feel): random chance each tick
-        # (never fixed interval; feels "real")
-        if len(winners) < total_winners:
-            # chance increases with time
-            chance = 0.02 + (elapsed / float(AUTO_SELECT_TOTAL_SECONDS)) * 0.08  # up to ~10%
-            if random.random() < chance:
-                # pick next random eligible not already winner
-                parts = data.get("participants", {}) or {}
-                eligible = [uid for uid in parts.keys()
-                            if (parts.get(uid, {}) or {}).get("username", "").startswith("@")
-                            and uid not in winners]
-                if eligible:
-                    uid = random.choice(eligible)
-                    winners[str(uid)] = {
-                        "username": (parts.get(uid, {}) or {}).get("username", ""),
-                        "first": False,
-                        "lucky": False,
-                    }
-                    snap["winners"] = winners
-                    save_data()
+    remain = max(0, AUTO_SELECT_TOTAL_SECONDS - elapsed)
+    percent = int(round(min(100, (elapsed / float(AUTO_SELECT_TOTAL_SECONDS)) * 100)))
 
+    with parts_lock:
         # showcase timing: 1st changes every 5s; 2nd every 7s; 3rd every 9s
         # keep 3 different emojis each update
-        used_set = set(jd.get("used_show_uids", []) or [])
         parts = data.get("participants", {}) or {}
+        index = eligible_index.sync(data.get("participants"))
 
         def pick_one(exclude_uid=None):
-            eligible = [uid for uid, info in parts.items()
-                        if (info or {}).get("username", "").startswith("@")]
-            eligible = [u for u in eligible if u not in used_set and u != exclude_uid]
-            if not eligible:
-                eligible = [uid for uid, info in parts.items()
-                            if (info or {}).get("username", "").startswith("@") and uid != exclude_uid]
-            if not eligible:
-                return None
-            uid = random.choice(eligible)
-            used_set.add(uid)
-            return uid
+            shown = {jd.get("show1"), jd.get("show2"), jd.get("show3"), exclude_uid}
+            return index.next_show(skip=shown - {None})
 
         # init
         if jd.get("show1") is None:
@@ -1261,8 +1778,6 @@ def _autodraw_tick(context: CallbackContext):
             jd["show3"] = pick_one(exclude_uid=jd.get("show1"))
             jd["show_last_3"] = elapsed
 
-        jd["used_show_uids"] = list(used_set)
-
         # build show items
         def uinfo(uid):
             if not uid:
@@ -1281,14 +1796,15 @@ def _autodraw_tick(context: CallbackContext):
         if s2: show_items.append((ems[1], s2[0], s2[1]))
         if s3: show_items.append((ems[2], s3[0], s3[1]))
 
-        text = build_selection_post_text(
-            gid=gid,
-            percent=percent,
-            time_remain=remain,
-            show_items=show_items,
-            winners_selected=len(winners),
-            total_winners=total_winners,
-        )
+    text = build_selection_post_text(
+        gid=gid,
+        snap=view,
+        percent=percent,
+        time_remain=remain,
+        show_items=show_items,
+        winners_selected=winners_selected,
+        total_winners=total_winners,
+    )
 
     # edit in channel
     safe_edit_text(context.bot, CHANNEL_ID, mid, text, reply_markup=selection_buttons_markup(gid))
@@ -1298,34 +1814,35 @@ def _autodraw_finalize(context: CallbackContext):
     stop_autodraw_jobs()
     gid = context.job.context["gid"]
 
-    with lock:
+    with history_lock:
         snap = (data.get("history", {}) or {}).get(gid, {}) or {}
         if not snap:
             return
 
-        # finalize winners list: ensure total_winners reached if possible
-        parts = data.get("participants", {}) or {}
+        # finalize winners list: planned reveals a missed tick skipped come first
+        reveal_planned(snap, float("inf"))
         winners = snap.get("winners", {}) or {}
         total_winners = int(snap.get("winner_count", 1) or 1)
 
-        # fill remaining winners from eligible pool
+        # fill remaining winners from eligible pool (snapshots without a reveal plan)
         if len(winners) < total_winners:
-            eligible = [uid for uid, info in parts.items()
-                        if (info or {}).get("username", "").startswith("@")
-                        and uid not in winners]
-            random.shuffle(eligible)
-            for uid in eligible:
-                if len(winners) >= total_winners:
-                    break
-                winners[str(uid)] = {
-                    "username": (parts.get(uid, {}) or {}).get("username", ""),
-                    "first": False,
-                    "lucky": False,
-                }
+            with parts_lock:
+                parts = data.get("participants", {}) or {}
+                picks, _ = reservoir_sample(iter_eligible(parts, exclude=winners), total_winners - len(winners))
+            for uid, uname in picks:
+                winners[str(uid)] = {"username": uname, "first": False, "lucky": False}
 
         snap["winners"] = winners
         snap["completed"] = True
 
+        # how long the live ticks took, channel edit included
+        st = autodraw_tick_stats
+        snap["tick_ms"] = {
+            "ticks": st["ticks"],
+            "avg": round(st["total_ms"] / st["ticks"], 2) if st["ticks"] else 0.0,
+            "max": round(st["max_ms"], 2),
+        }
+
         # claim window start
         ts = now_ts()
         snap["claim_start_ts"] = ts
@@ -1333,45 +1850,37 @@ def _autodraw_finalize(context: CallbackContext):
 
         # save
         data["history"][gid] = snap
+        smid = snap.get("selection_message_id")
+        view = copy.deepcopy(snap)
 
+    with lock:
         # stop global autodraw marker
         data["autodraw_in_progress"] = False
         data["autodraw_gid"] = None
-        save_data()
-
-    # delete closed post (requested)
-    try:
         cmid = data.get("closed_message_id")
-        if cmid:
-            context.bot.delete_message(chat_id=CHANNEL_ID, message_id=cmid)
-    except Exception:
-        pass
-    with lock:
         data["closed_message_id"] = None
         save_data()
+    text = build_winners_post_text(gid, view)
 
-    # delete selection post
-    try:
-        smid = (data.get("history", {}) or {}).get(gid, {}).get("selection_message_id")
-        if smid:
-            context.bot.unpin_chat_message(chat_id=CHANNEL_ID, message_id=smid)
-    except Exception:
-        pass
-    try:
-        if smid:
-            context.bot.delete_message(chat_id=CHANNEL_ID, message_id=smid)
-    except Exception:
-        pass
-
-    # post winners announcement
-    text = build_winners_post_text(gid)
-    m = context.bot.send_message(
-        chat_id=CHANNEL_ID,
-        text=text,
-        reply_markup=claim_button_markup(gid),
-        disable_web_page_preview=True,
-    )
-    with lock:
+    # post winners announcement; delete closed post + unpin/delete selection post
+    bot = context.bot
+    calls = [
+        lambda: bot.send_message(
+            chat_id=CHANNEL_ID,
+            text=text,
+            reply_markup=claim_button_markup(gid),
+            disable_web_page_preview=True,
+        )
+    ]
+    if cmid:
+        calls.append(lambda: bot.delete_message(chat_id=CHANNEL_ID, message_id=cmid))
+    if smid:
+        calls.append(lambda: bot.unpin_chat_message(chat_id=CHANNEL_ID, message_id=smid))
+        calls.append(lambda: bot.delete_message(chat_id=CHANNEL_ID, message_id=smid))
+    m = fan_out(*calls)[0]
+    if isinstance(m, Exception):
+        raise m
+    with history_lock:
         data["history"][gid]["winners_message_id"] = m.message_id
         save_data()
 
@@ -1386,7 +1895,7 @@ def schedule_claim_expire(job_queue, gid: str):
     global claim_expire_job
     stop_claim_expire_job()
 
-    with lock:
+    with history_lock:
         snap = (data.get("history", {}) or {}).get(gid, {}) or {}
         exp = snap.get("claim_expires_ts")
         mid = snap.get("winners_message_id")
@@ -1404,11 +1913,10 @@ def schedule_claim_expire(job_queue, gid: str):
 
 def _expire_claim_button(context: CallbackContext):
     gid = context.job.context["gid"]
-    with lock:
-        snap = (data.get("history", {}) or {}).get(gid, {}) or {}
-        mid = snap.get("winners_message_id")
-        if not mid:
-            return
+    with history_lock:
+        mid = ((data.get("history", {}) or {}).get(gid, {}) or {}).get("winners_message_id")
+    if not mid:
+        return
     safe_edit_markup(context.bot, CHANNEL_ID, mid, reply_markup=None)
 
 
@@ -1504,23 +2012,29 @@ def cmd_prizedelivered(update: Update, context: CallbackContext):
     )
 
 
-def cmd_winnerlist(update: Update, context: CallbackContext):
-    if not is_admin(update):
-        return
-    hist = data.get("history", {}) or {}
-    if not hist:
-        update.message.reply_text("No winner history found.")
-        return
+WINNERLIST_PAGE_SIZE = 5
+
 
-    # newest first
-    items = sorted(hist.items(), key=lambda kv: float((kv[1] or {}).get("created_ts", 0) or 0), reverse=True)
+def winnerlist_page(cursor=None, backward=False, page=1):
+    # (text, markup) for one page, newest first; None text = history is empty
+    with history_lock:
+        hist = data.get("history", {}) or {}
+        keys, more = history_order.sync(hist).page(cursor, backward, WINNERLIST_PAGE_SIZE)
+        items = [(gid, copy.deepcopy(hist.get(gid) or {})) for _, gid in keys]
+    if not items and cursor is not None:
+        # the cursor's neighbours are gone (reset): start over
+        return winnerlist_page()
+    if not items:
+        return None, None
+    has_prev = more if backward else cursor is not None
+    has_next = True if backward else more
 
     lines = []
     lines.append("━━━━━━━━━━━━━━━━━━━━")
     lines.append("📜 WINNER LIST (HISTORY)")
     lines.append("━━━━━━━━━━━━━━━━━━━━")
     lines.append("")
-    for gid, snap in items[:20]:
+    for gid, snap in items:
         dt = datetime.utcfromtimestamp(float((snap or {}).get("created_ts", 0) or 0))
         dstr = dt.strftime("%d-%m-%Y")
         prize = (snap or {}).get("prize", "")
@@ -1536,8 +2050,20 @@ def cmd_winnerlist(update: Update, context: CallbackContext):
             st = "Delivered ✅" if delivered.get(uid) is True else "Pending ⏳"
             lines.append(f"• {uname} | {uid} | {st}")
         lines.append("")
+    lines.append(f"Page {page}")
+
+    markup = winnerlist_nav_markup(page, keys[0], keys[-1], has_prev, has_next)
+    return "\n".join(lines), markup
 
-    update.message.reply_text("\n".join(lines))
+
+def cmd_winnerlist(update: Update, context: CallbackContext):
+    if not is_admin(update):
+        return
+    text, markup = winnerlist_page()
+    if text is None:
+        update.message.reply_text("No winner history found.")
+        return
+    update.message.reply_text(text, reply_markup=markup)
 
 
 # =========================================================
@@ -1622,7 +2148,8 @@ def cmd_panel(update: Update, context: CallbackContext):
         "/participants\n"
         "/draw\n"
         "/endgiveaway\n"
-        "/autodraw\n\n"
+        "/autodraw\n"
+        "/refreshrate\n\n"
         "✅ VERIFY SYSTEM\n"
         "/addverifylink\n"
         "/removeverifylink\n\n"
@@ -1648,7 +2175,7 @@ def cmd_newgiveaway(update: Update, context: CallbackContext):
     stop_autodraw_jobs()
     stop_claim_expire_job()
 
-    with lock:
+    with lock, history_lock, parts_lock:
         keep_perma = data.get("permanent_block", {})
         keep_verify = data.get("verify_targets", [])
         keep_old_mode = data.get("old_winner_mode", "skip")
@@ -1680,23 +2207,169 @@ def cmd_newgiveaway(update: Update, context: CallbackContext):
     )
 
 
+PARTICIPANTS_CSV_HEADER = ("user_id", "username", "joined_ts", "joined_utc", "first_join", "status")
+PARTICIPANTS_TEXT_LIMIT = 3800  # Telegram rejects messages over 4096 chars
+
+
+def participant_status(uid, info, blocked, old_block):
+    # same rules as the JOIN gate and iter_eligible
+    uname = (info or {}).get("username", "")
+    if uid in blocked:
+        return "banned"
+    if old_block is not None and uid in old_block:
+        return "old_winner"
+    if not (uname and uname.startswith("@")):
+        return "no_username"
+    return "eligible"
+
+
+def write_participants_csv(parts, path, gz, chunk=5000):
+    # parts: list of (uid, info); rows are written chunk by chunk, never built as one string
+    with lock:
+        blocked = set((data.get("permanent_block", {}) or {}).keys())
+        old_block = set((data.get("old_winners", {}) or {}).keys()) if data.get("old_winner_mode") == "block" else None
+    with parts_lock:
+        first_uid = str(data.get("first_winner_id") or "")
+    opener = gzip.open if gz else open
+    with opener(path, "wt", encoding="utf-8", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(PARTICIPANTS_CSV_HEADER)
+        for i in range(0, len(parts), chunk):
+            rows = []
+            for uid, info in parts[i:i + chunk]:
+                info = info or {}
+                ts = info.get("joined_ts")
+                rows.append((
+                    uid,
+                    info.get("username", ""),
+                    ts or "",
+                    datetime.utcfromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S") if ts else "",
+                    1 if uid == first_uid else 0,
+                    participant_status(uid, info, blocked, old_block),
+                ))
+            w.writerows(rows)
+
+
+def reply_temp_document(update: Update, filename, build):
+    # build(path) writes the file and returns the caption; the file is gone after the upload
+    fd, path = tempfile.mkstemp(suffix="-" + filename)
+    os.close(fd)
+    try:
+        caption = build(path)
+        with open(path, "rb") as f:
+            update.message.reply_document(document=f, filename=filename, caption=caption)
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def send_participants_csv(update: Update, parts, gz):
+    def build(path):
+        write_participants_csv(parts, path, gz)
+        return f"👥 Participants: {len(parts)}"
+
+    reply_temp_document(update, "participants.csv" + (".gz" if gz else ""), build)
+
+
+# same bundle format as main.py's /export (read_archive.py reads both)
+ARCHIVE_FORMAT = "giveaway-archive/1"
+
+
+def write_giveaway_archive(gid, snap, parts, path, chunk=5000):
+    # snap: history snapshot; parts: (uid, info) list when gid is the current giveaway, else []
+    counts = {}
+    with parts_lock:
+        first_uid = str(data.get("first_winner_id") or "")
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        def put(kind, row):
+            f.write(json.dumps(dict(type=kind, **row), ensure_ascii=False) + "\n")
+            counts[kind] = counts.get(kind, 0) + 1
+
+        f.write(json.dumps({"type": "meta", "format": ARCHIVE_FORMAT, "source": "legacy",
+                            "giveaway_id": gid, "exported_ts": int(now_ts())}) + "\n")
+        # message ids, claim window and lucky_won_by ride on the giveaway record
+        put("giveaway", {k: v for k, v in snap.items() if k not in ("winners", "delivered")})
+        delivered = snap.get("delivered", {}) or {}
+        for uid, info in (snap.get("winners", {}) or {}).items():
+            info = info or {}
+            put("winner", {
+                "user_id": uid,
+                "username": info.get("username", ""),
+                "first": bool(info.get("first")),
+                "lucky": bool(info.get("lucky")),
+                "delivered": delivered.get(uid) is True,
+            })
+        for i in range(0, len(parts), chunk):
+            for uid, info in parts[i:i + chunk]:
+                info = info or {}
+                put("participant", {
+                    "user_id": uid,
+                    "username": info.get("username", ""),
+                    "joined_ts": info.get("joined_ts"),
+                    "is_first_join": 1 if uid == first_uid else 0,
+                })
+        f.write(json.dumps({"type": "end", "counts": counts}) + "\n")
+    return counts
+
+
+def cmd_export(update: Update, context: CallbackContext):
+    if not is_admin(update):
+        return
+    args = context.args or []
+    if not args:
+        update.message.reply_text("Usage: /export <giveaway_id>  (or: /export latest)")
+        return
+    with history_lock:
+        latest = data.get("latest_gid")
+        gid = latest if args[0].lower() == "latest" else args[0]
+        snap = history_snapshot(gid) if gid else None
+    if not snap:
+        update.message.reply_text("Giveaway not found in history.")
+        return
+    parts = []
+    if gid == latest:
+        # participants are only kept for the current giveaway
+        with parts_lock:
+            parts = list((data.get("participants", {}) or {}).items())
+
+    def build(path):
+        counts = write_giveaway_archive(gid, snap, parts, path)
+        return f"🗄 Archive: {gid}\n" + ", ".join(f"{k}: {v}" for k, v in counts.items())
+
+    reply_temp_document(update, f"giveaway_{gid}.jsonl.gz", build)
+
+
 def cmd_participants(update: Update, context: CallbackContext):
     if not is_admin(update):
         return
-    parts = data.get("participants", {}) or {}
+    args = [a.lower() for a in (context.args or [])]
+    with parts_lock:
+        parts = list((data.get("participants", {}) or {}).items())
     if not parts:
         update.message.reply_text("👥 Participants list is empty.")
         return
+    if args and args[0] == "export":
+        send_participants_csv(update, parts, "gz" in args[1:])
+        return
     lines = []
     lines.append("━━━━━━━━━━━━━━━━━━━━")
     lines.append("👥 PARTICIPANTS LIST")
     lines.append("━━━━━━━━━━━━━━━━━━━━")
     lines.append(f"Total Participants: {len(parts)}")
     lines.append("")
+    size = sum(len(x) + 1 for x in lines)
     i = 1
-    for uid, info in parts.items():
+    for uid, info in parts:
         uname = (info or {}).get("username", "")
-        lines.append(f"{i}. {uname or 'NO_USERNAME'} | User ID: {uid}")
+        line = f"{i}. {uname or 'NO_USERNAME'} | User ID: {uid}"
+        if size + len(line) > PARTICIPANTS_TEXT_LIMIT:
+            lines.append("")
+            lines.append(f"… and {len(parts) - i + 1} more. Full list: /participants export [gz]")
+            break
+        lines.append(line)
+        size += len(line) + 1
         i += 1
     update.message.reply_text("\n".join(lines))
 
@@ -1730,6 +2403,32 @@ def cmd_draw(update: Update, context: CallbackContext):
     start_manual_draw_progress(context, update.effective_chat.id)
 
 
+def cmd_refreshrate(update: Update, context: CallbackContext):
+    if not is_admin(update):
+        return
+    args = context.args or []
+    if not args:
+        lo, hi = live_refresh_policy()
+        update.message.reply_text(
+            f"⏱ Live post refresh: every {lo}s (near the end) … {hi}s (far from the end)\n\n"
+            "Usage: /refreshrate <min_seconds> <max_seconds>"
+        )
+        return
+    if len(args) != 2 or not all(a.isdigit() and int(a) > 0 for a in args):
+        update.message.reply_text("Usage: /refreshrate <min_seconds> <max_seconds>")
+        return
+    lo = int(args[0])
+    hi = max(lo, int(args[1]))
+    with lock:
+        data["refresh_min"] = lo
+        data["refresh_max"] = hi
+        save_data()
+    if data.get("active"):
+        stop_live_countdown()
+        schedule_live_tick(context.job_queue, 0)
+    update.message.reply_text(f"✅ Refresh rate set: {lo}s … {hi}s")
+
+
 def cmd_addverifylink(update: Update, context: CallbackContext):
     global admin_state
     if not is_admin(update):
@@ -1860,6 +2559,7 @@ def admin_text_handler(update: Update, context: CallbackContext):
             targets.append({"ref": ref, "display": ref})
             data["verify_targets"] = targets
             save_data()
+        invalidate_verify_cache()
         update.message.reply_text(
             f"✅ Verify target added: {ref}\nTotal: {len(data.get('verify_targets',[]) or [])}",
             reply_markup=verify_add_more_done_markup()
@@ -1874,18 +2574,23 @@ def admin_text_handler(update: Update, context: CallbackContext):
         n = int(msg)
         with lock:
             targets = data.get("verify_targets", []) or []
+            removed = None
             if n == 99:
                 data["verify_targets"] = []
                 save_data()
-                admin_state = None
-                update.message.reply_text("✅ All verify targets removed.")
-                return
-            if n < 1 or n > len(targets):
-                update.message.reply_text("Invalid number.")
-                return
-            removed = targets.pop(n - 1)
-            data["verify_targets"] = targets
-            save_data()
+            elif 1 <= n <= len(targets):
+                removed = targets.pop(n - 1)
+                data["verify_targets"] = targets
+                save_data()
+        if n == 99:
+            invalidate_verify_cache()
+            admin_state = None
+            update.message.reply_text("✅ All verify targets removed.")
+            return
+        if removed is None:
+            update.message.reply_text("Invalid number.")
+            return
+        invalidate_verify_cache()
         admin_state = None
         update.message.reply_text(f"✅ Removed: {removed.get('display','')}")
         return
@@ -2029,13 +2734,15 @@ def admin_text_handler(update: Update, context: CallbackContext):
         uid, _ = entries[0]
         with lock:
             perma = data.get("permanent_block", {}) or {}
-            if uid in perma:
+            found = uid in perma
+            if found:
                 del perma[uid]
                 data["permanent_block"] = perma
                 save_data()
-                update.message.reply_text("✅ Unbanned from Permanent Block successfully.")
-            else:
-                update.message.reply_text("This user id is not in Permanent Block list.")
+        if found:
+            update.message.reply_text("✅ Unbanned from Permanent Block successfully.")
+        else:
+            update.message.reply_text("This user id is not in Permanent Block list.")
         admin_state = None
         return
 
@@ -2047,23 +2754,26 @@ def admin_text_handler(update: Update, context: CallbackContext):
         uid, _ = entries[0]
         with lock:
             ow = data.get("old_winners", {}) or {}
-            if uid in ow:
+            found = uid in ow
+            if found:
                 del ow[uid]
                 data["old_winners"] = ow
                 save_data()
-                update.message.reply_text("✅ Unbanned from Old Winner Block successfully.")
-            else:
-                update.message.reply_text("This user id is not in Old Winner Block list.")
+        if found:
+            update.message.reply_text("✅ Unbanned from Old Winner Block successfully.")
+        else:
+            update.message.reply_text("This user id is not in Old Winner Block list.")
         admin_state = None
         return
 
     # prize delivered flow
     if admin_state == "prize_gid":
         gid = msg.strip()
-        if gid.lower() == "latest":
-            gid = data.get("latest_gid") or ""
-        hist = data.get("history", {}) or {}
-        if not gid or gid not in hist:
+        with history_lock:
+            if gid.lower() == "latest":
+                gid = data.get("latest_gid") or ""
+            known = gid in (data.get("history", {}) or {})
+        if not gid or not known:
             update.message.reply_text("❌ Giveaway ID not found. Send correct ID or 'latest'.")
             return
         context.user_data["_prize_target_gid"] = gid
@@ -2089,7 +2799,8 @@ def admin_text_handler(update: Update, context: CallbackContext):
             update.message.reply_text("⚠️ No valid lines found. Send: @username | user_id")
             return
 
-        ok_uids, errors = validate_delivered_list(gid, items)
+        with history_lock:
+            ok_uids, errors = validate_delivered_list(gid, items)
         if not ok_uids:
             text = "⚠️ Delivery list has problems:\n\n" + "\n\n".join(errors[:12])
             if len(errors) > 12:
@@ -2098,21 +2809,22 @@ def admin_text_handler(update: Update, context: CallbackContext):
             update.message.reply_text(text)
             return
 
-        with lock:
+        with history_lock:
             snap = data["history"][gid]
             delivered = snap.get("delivered", {}) or {}
             for uid in ok_uids:
                 delivered[str(uid)] = True
             snap["delivered"] = delivered
             data["history"][gid] = snap
+            view = copy.deepcopy(snap)
             save_data()
 
         # update channel winners post
-        wmid = (data.get("history", {}) or {}).get(gid, {}).get("winners_message_id")
+        wmid = view.get("winners_message_id")
         if wmid:
             safe_edit_text(
                 context.bot, CHANNEL_ID, wmid,
-                build_winners_post_text(gid),
+                build_winners_post_text(gid, view),
                 reply_markup=claim_button_markup(gid)
             )
 
@@ -2133,6 +2845,100 @@ def admin_text_handler(update: Update, context: CallbackContext):
         return
 
 
+# =========================================================
+# CLICK GATE (RATE LIMIT, LOAD SHEDDING)
+# =========================================================
+# Runs before cb_handler does any work. The admin always passes. join_giveaway
+# and luck are never shed: in a storm the earliest clicks are the ones that win
+# the first-join and Lucky Draw prizes. No in-flight dedupe here: callbacks run
+# one at a time on the dispatcher thread, so a click is always finished before
+# the next one is checked.
+SHED_EXEMPT_ACTIONS = frozenset({"join_giveaway", "luck"})
+
+
+class ClickGate:
+    PRUNE_ABOVE = 50000
+
+    def __init__(self, rate, burst, shed_depth):
+        self.rate = rate
+        self.burst = float(burst)
+        self.shed_depth = shed_depth
+        self.mu = threading.Lock()
+        self.buckets = {}  # (uid, action) -> [tokens, ts]
+        self.next_prune = 0.0
+        self.passed = 0
+        self.shed = 0
+        self.limited = 0
+
+    def _take(self, key, now):
+        b = self.buckets.get(key)
+        if b is None:
+            if len(self.buckets) >= self.PRUNE_ABOVE and now >= self.next_prune:
+                # a bucket that has refilled is the same as no bucket; at most
+                # one scan per refill period
+                full = self.burst / self.rate
+                for k in [k for k, v in self.buckets.items() if now - v[1] >= full]:
+                    del self.buckets[k]
+                self.next_prune = now + full
+            b = self.buckets[key] = [self.burst, now]
+        b[0] = min(self.burst, b[0] + (now - b[1]) * self.rate)
+        b[1] = now
+        if b[0] < 1:
+            return False
+        b[0] -= 1
+        return True
+
+    def check(self, key, depth):
+        # None = let it through; else "shed"/"limited"
+        with self.mu:
+            if self.shed_depth and depth > self.shed_depth and key[1] not in SHED_EXEMPT_ACTIONS:
+                self.shed += 1
+                return "shed"
+            if not self._take(key, time.monotonic()):
+                self.limited += 1
+                return "limited"
+            self.passed += 1
+            return None
+
+    def stats_text(self):
+        with self.mu:
+            return (
+                f"Passed: {self.passed}\n"
+                f"Shed (busy): {self.shed}\n"
+                f"Rate limited: {self.limited}"
+            )
+
+
+click_gate = ClickGate(CLICK_RATE, CLICK_BURST, CLICK_SHED_DEPTH)
+
+
+def gated_cb_handler(update: Update, context: CallbackContext):
+    query = update.callback_query
+    if not query or not query.from_user:
+        return
+    if is_admin(update):
+        cb_handler(update, context)
+        return
+    key = (query.from_user.id, (query.data or "").split("|", 1)[0].split(":", 1)[0])
+    verdict = click_gate.check(key, context.dispatcher.update_queue.qsize())
+    if verdict is not None:
+        try:
+            if verdict == "shed":
+                query.answer("⏳ Bot is busy right now, please try again in a moment.", show_alert=True)
+            else:
+                query.answer("⏳ Too many clicks, please slow down.")
+        except Exception:
+            pass
+        return
+    cb_handler(update, context)
+
+
+def cmd_clickstats(update: Update, context: CallbackContext):
+    if not is_admin(update):
+        return
+    update.message.reply_text("🖱 CLICK GATE\n\n" + click_gate.stats_text())
+
+
 # =========================================================
 # CALLBACK HANDLER
 # =========================================================
@@ -2170,6 +2976,27 @@ def cb_handler(update: Update, context: CallbackContext):
             pass
         return
 
+    # winner list pages: edit the same message in place
+    if qd.startswith("winnerlist:"):
+        if uid != str(ADMIN_ID):
+            query.answer("Admin only.", show_alert=True)
+            return
+        query.answer()
+        try:
+            _, way, page, ts, gid = qd.split(":", 4)
+            cursor = (float(ts), gid)
+            page = max(1, int(page))
+        except ValueError:
+            return
+        text, markup = winnerlist_page(cursor, way == "p", page)
+        if text is None:
+            text = "No winner history found."
+        try:
+            query.edit_message_text(text, reply_markup=markup)
+        except Exception:
+            pass
+        return
+
     # preview actions
     if qd.startswith("preview_"):
         if uid != str(ADMIN_ID):
@@ -2186,7 +3013,7 @@ def cb_handler(update: Update, context: CallbackContext):
                     reply_markup=join_button_markup(),
                     disable_web_page_preview=True,
                 )
-                with lock:
+                with lock, parts_lock:
                     data["live_message_id"] = m.message_id
                     data["active"] = True
                     data["closed"] = False
@@ -2224,16 +3051,17 @@ def cb_handler(update: Update, context: CallbackContext):
         query.answer()
 
         with lock:
-            if not data.get("active"):
-                try:
-                    query.edit_message_text("No active giveaway is running right now.")
-                except Exception:
-                    pass
-                return
-
-            data["active"] = False
-            data["closed"] = True
-            save_data()
+            was_active = bool(data.get("active"))
+            if was_active:
+                data["active"] = False
+                data["closed"] = True
+                save_data()
+        if not was_active:
+            try:
+                query.edit_message_text("No active giveaway is running right now.")
+            except Exception:
+                pass
+            return
 
         live_mid = data.get("live_message_id")
         if live_mid:
@@ -2325,7 +3153,7 @@ def cb_handler(update: Update, context: CallbackContext):
             jd = job_ctx.job.context
             step = int(jd.get("step", 0))
             if step >= 10:
-                with lock:
+                with lock, history_lock, parts_lock:
                     keep_perma = data.get("permanent_block", {})
                     keep_verify = data.get("verify_targets", [])
                     data.clear()
@@ -2424,52 +3252,50 @@ def cb_handler(update: Update, context: CallbackContext):
                 query.answer(popup_old_winner_blocked(), show_alert=True)
                 return
 
-        # first winner repeat click
-        with lock:
+        tg_user = query.from_user
+        uname = user_tag(tg_user.username or "")
+        full_name = (tg_user.full_name or "").strip()
+
+        # first winner repeat click / already joined / join: one check-and-set
+        with parts_lock:
             first_uid = data.get("first_winner_id")
+            first_uname = data.get("first_winner_username", "")
+            joined = uid in (data.get("participants", {}) or {})
+            if not joined:
+                if not first_uid:
+                    data["first_winner_id"] = uid
+                    data["first_winner_username"] = uname
+                    data["first_winner_name"] = full_name
+                data["participants"][uid] = {"username": uname, "name": full_name, "joined_ts": int(now_ts())}
+                if uname.startswith("@"):
+                    eligible_index.add(uid)
+                save_data()
+
         if first_uid and uid == str(first_uid):
-            tg_user = query.from_user
-            uname = user_tag(tg_user.username or "") or data.get("first_winner_username", "") or "@username"
-            query.answer(popup_first_join(uname, uid), show_alert=True)
+            query.answer(popup_first_join(uname or first_uname or "@username", uid), show_alert=True)
             return
-
-        # already joined
-        if uid in (data.get("participants", {}) or {}):
+        if joined:
             query.answer(popup_already_joined(), show_alert=True)
             return
 
-        tg_user = query.from_user
-        uname = user_tag(tg_user.username or "")
-        full_name = (tg_user.full_name or "").strip()
-
         with lock:
-            if not data.get("first_winner_id"):
-                data["first_winner_id"] = uid
-                data["first_winner_username"] = uname
-                data["first_winner_name"] = full_name
+            refs = [(t or {}).get("ref", "") for t in (data.get("verify_targets", []) or [])]
 
-            data["participants"][uid] = {"username": uname, "name": full_name}
-            save_data()
+        # passed verification: warm the membership index off the click path
+        if refs:
+            fanout_pool.submit(membership_record_joins, [(uid, now_ts())], refs)
 
-        # update live post
+        # update live post (coalesced with the countdown tick)
         try:
-            live_mid = data.get("live_message_id")
-            start_ts = data.get("start_time")
-            if live_mid and start_ts:
-                start = datetime.utcfromtimestamp(start_ts)
-                duration = int(data.get("duration_seconds", 1) or 1)
-                elapsed = int((utc_now() - start).total_seconds())
-                remaining = max(0, duration - elapsed)
-                safe_edit_text(context.bot, CHANNEL_ID, live_mid, build_live_text(remaining), reply_markup=join_button_markup())
+            request_live_refresh(context.job_queue)
         except Exception:
             pass
 
         # popup
-        with lock:
-            if data.get("first_winner_id") == uid:
-                query.answer(popup_first_join(uname or "@username", uid), show_alert=True)
-            else:
-                query.answer(popup_join_success(uname or "@Username", uid), show_alert=True)
+        if not first_uid:
+            query.answer(popup_first_join(uname or "@username", uid), show_alert=True)
+        else:
+            query.answer(popup_join_success(uname or "@Username", uid), show_alert=True)
         return
 
     # manual winners approve/reject (posts to channel as a new gid snapshot)
@@ -2479,8 +3305,11 @@ def cb_handler(update: Update, context: CallbackContext):
             return
         query.answer()
 
-        text = (data.get("pending_winners_text") or "").strip()
-        winners = data.get("winners_preview", {}) or {}
+        with lock:
+            text = (data.get("pending_winners_text") or "").strip()
+            winners = copy.deepcopy(data.get("winners_preview", {}) or {})
+            prize = data.get("prize", "")
+            winner_count = int(data.get("winner_count", 1) or 1)
         if not text or not winners:
             try:
                 query.edit_message_text("No pending winners preview found.")
@@ -2488,18 +3317,22 @@ def cb_handler(update: Update, context: CallbackContext):
                 pass
             return
 
+        with parts_lock:
+            parts_total = participants_count()
+            eligible_total = sum(1 for _ in iter_eligible(data.get("participants", {}) or {}))
+
         # create snapshot in history
         gid = gen_giveaway_id()
-        with lock:
+        with history_lock:
             snap = {
                 "gid": gid,
                 "created_ts": now_ts(),
                 "selection_start_ts": now_ts(),
                 "title": HOST_NAME,
-                "prize": data.get("prize", ""),
-                "winner_count": int(data.get("winner_count", 1) or 1),
-                "participants_total": participants_count(),
-                "eligible_total": len([1 for _, i in (data.get("participants", {}) or {}).items() if (i or {}).get("username","").startswith("@")]),
+                "prize": prize,
+                "winner_count": winner_count,
+                "participants_total": parts_total,
+                "eligible_total": eligible_total,
                 "winners": winners,
                 "delivered": {},
                 "completed": True,
@@ -2511,27 +3344,31 @@ def cb_handler(update: Update, context: CallbackContext):
             }
             data["history"][gid] = snap
             data["latest_gid"] = gid
+            view = copy.deepcopy(snap)
             save_data()
 
-        # delete closed post if exists
-        try:
-            cmid = data.get("closed_message_id")
-            if cmid:
-                context.bot.delete_message(chat_id=CHANNEL_ID, message_id=cmid)
-        except Exception:
-            pass
         with lock:
+            cmid = data.get("closed_message_id")
             data["closed_message_id"] = None
             save_data()
+        text = build_winners_post_text(gid, view)
 
-        # post winners
-        m = context.bot.send_message(
-            chat_id=CHANNEL_ID,
-            text=build_winners_post_text(gid),
-            reply_markup=claim_button_markup(gid),
-            disable_web_page_preview=True,
-        )
-        with lock:
+        # post winners; delete closed post if exists
+        bot = context.bot
+        calls = [
+            lambda: bot.send_message(
+                chat_id=CHANNEL_ID,
+                text=text,
+                reply_markup=claim_button_markup(gid),
+                disable_web_page_preview=True,
+            )
+        ]
+        if cmid:
+            calls.append(lambda: bot.delete_message(chat_id=CHANNEL_ID, message_id=cmid))
+        m = fan_out(*calls)[0]
+        if isinstance(m, Exception):
+            raise m
+        with history_lock:
             data["history"][gid]["winners_message_id"] = m.message_id
             save_data()
 
@@ -2561,8 +3398,7 @@ def cb_handler(update: Update, context: CallbackContext):
     # claim prize (per giveaway)
     if qd.startswith("claim:"):
         gid = qd.split(":", 1)[1].strip()
-        hist = data.get("history", {}) or {}
-        snap = hist.get(gid, {}) or {}
+        snap = history_snapshot(gid)
         winners = snap.get("winners", {}) or {}
         delivered = snap.get("delivered", {}) or {}
         exp = snap.get("claim_expires_ts")
@@ -2591,7 +3427,7 @@ def cb_handler(update: Update, context: CallbackContext):
     if qd.startswith("rule:"):
         gid = qd.split(":", 1)[1].strip()
         # if delivered/completed for this user => completed popup
-        snap = (data.get("history", {}) or {}).get(gid, {}) or {}
+        snap = history_snapshot(gid)
         delivered = (snap.get("delivered", {}) or {})
         if delivered.get(uid) is True:
             w_uname = ((snap.get("winners", {}) or {}).get(uid, {}) or {}).get("username", "") or "@username"
@@ -2602,14 +3438,18 @@ def cb_handler(update: Update, context: CallbackContext):
 
     if qd.startswith("luck:"):
         gid = qd.split(":", 1)[1].strip()
-        snap = (data.get("history", {}) or {}).get(gid, {}) or {}
+        snap = history_snapshot(gid)
         if not snap:
             query.answer("This selection is not available.", show_alert=True)
             return
 
         winners = snap.get("winners", {}) or {}
         delivered = snap.get("delivered", {}) or {}
-        parts = data.get("participants", {}) or {}
+        with parts_lock:
+            parts = data.get("participants", {}) or {}
+            joined = uid in parts
+            my_uname = (parts.get(uid, {}) or {}).get("username", "")
+            eligible_exist = len(eligible_index.sync(data.get("participants"))) > 0
 
         # delivered/completed: always completed popup
         if delivered.get(uid) is True:
@@ -2618,18 +3458,16 @@ def cb_handler(update: Update, context: CallbackContext):
             return
 
         # must have joined entries
-        if uid not in (data.get("participants", {}) or {}):
+        if not joined:
             query.answer(popup_not_joined_tryluck(), show_alert=True)
             return
 
         # must have valid @username
-        my_uname = (parts.get(uid, {}) or {}).get("username", "")
         if not my_uname or not my_uname.startswith("@"):
             query.answer(popup_not_eligible_username(), show_alert=True)
             return
 
         # must have entries exist
-        eligible_exist = any((info or {}).get("username", "").startswith("@") for _, info in parts.items())
         if not eligible_exist:
             query.answer(popup_tryluck_no_entries(), show_alert=True)
             return
@@ -2639,34 +3477,43 @@ def cb_handler(update: Update, context: CallbackContext):
         elapsed = int(now_ts() - start_sel)
         sec = elapsed % 60
 
-        with lock:
+        with history_lock:
             snap = (data.get("history", {}) or {}).get(gid, {}) or {}
             # already won by someone
             lucky_uid = snap.get("lucky_won_by")
+            lucky_info = (snap.get("winners", {}) or {}).get(str(lucky_uid), {}) or {}
+            if not lucky_uid and sec in (48, 49):
+                # WIN: first click in window
+                snap["lucky_won_by"] = uid
+
+                # add as winner (if not already)
+                if uid not in (snap.get("winners", {}) or {}):
+                    snap["winners"][uid] = {"username": my_uname, "first": False, "lucky": True}
+
+                    # the lucky slot uses up one planned reveal: theirs, else the last one
+                    plan = snap.get("reveal_plan") or []
+                    mine = [e for e in plan if e[1] == uid]
+                    if mine:
+                        plan.remove(mine[0])
+                    elif plan:
+                        plan.pop()
+                    snap["reveal_plan"] = plan
+
+                data["history"][gid] = snap
+                save_data()
 
-            # if already won -> TOO LATE with winner details
-            if lucky_uid:
-                lucky_info = (snap.get("winners", {}) or {}).get(str(lucky_uid), {}) or {}
-                lucky_uname = lucky_info.get("username", "") or "@username"
-                query.answer(popup_too_late(lucky_uname, str(lucky_uid)), show_alert=True)
-                return
-
-            # window open only at 48..49
-            if sec not in (48, 49):
-                # no "Lucky Draw Closed" popup anymore -> use TOO LATE style only if someone already won
-                # otherwise: just show rule (simple)
-                query.answer(popup_lucky_rule(), show_alert=True)
-                return
-
-            # WIN: first click in window
-            snap["lucky_won_by"] = uid
-
-            # add as winner (if not already)
-            if uid not in (snap.get("winners", {}) or {}):
-                snap["winners"][uid] = {"username": my_uname, "first": False, "lucky": True}
+        # if already won -> TOO LATE with winner details
+        if lucky_uid:
+            lucky_uname = lucky_info.get("username", "") or "@username"
+            query.answer(popup_too_late(lucky_uname, str(lucky_uid)), show_alert=True)
+            return
 
-            data["history"][gid] = snap
-            save_data()
+        # window open only at 48..49
+        if sec not in (48, 49):
+            # no "Lucky Draw Closed" popup anymore -> use TOO LATE style only if someone already won
+            # otherwise: just show rule (simple)
+            query.answer(popup_lucky_rule(), show_alert=True)
+            return
 
         query.answer(
             "🌟 CONGRATULATIONS!\n"
@@ -2693,7 +3540,7 @@ def main():
     if not BOT_TOKEN:
         raise SystemExit("BOT_TOKEN missing in .env")
 
-    updater = Updater(BOT_TOKEN, use_context=True)
+    updater = Updater(BOT_TOKEN, use_context=True, base_url=TELEGRAM_BASE_URL)
     dp = updater.dispatcher
 
     # basic
@@ -2706,6 +3553,8 @@ def main():
     dp.add_handler(CommandHandler("endgiveaway", cmd_endgiveaway))
     dp.add_handler(CommandHandler("draw", cmd_draw))
     dp.add_handler(CommandHandler("autodraw", cmd_autodraw))
+    dp.add_handler(CommandHandler("refreshrate", cmd_refreshrate))
+    dp.add_handler(CommandHandler("clickstats", cmd_clickstats))
 
     # verify
     dp.add_handler(CommandHandler("addverifylink", cmd_addverifylink))
@@ -2719,13 +3568,22 @@ def main():
     # delivery / history
     dp.add_handler(CommandHandler("prizedelivered", cmd_prizedelivered))
     dp.add_handler(CommandHandler("winnerlist", cmd_winnerlist))
+    dp.add_handler(CommandHandler("export", cmd_export))
 
     # reset
     dp.add_handler(CommandHandler("reset", cmd_reset))
 
     # handlers
     dp.add_handler(MessageHandler(Filters.text & ~Filters.command, admin_text_handler))
-    dp.add_handler(CallbackQueryHandler(cb_handler))
+    dp.add_handler(CallbackQueryHandler(gated_cb_handler))
+    dp.add_handler(ChatMemberHandler(on_chat_member, ChatMemberHandler.CHAT_MEMBER))
+
+    # data file writes happen on their own thread, outside every data lock
+    start_save_writer()
+
+    # membership index (warm start from current participants)
+    init_membership_index()
+    warm_membership_from_participants()
 
     # resume systems after restart
     if data.get("active"):
@@ -2734,15 +3592,17 @@ def main():
     # ✅ resume autodraw if giveaway closed + autodraw enabled + in_progress true but selection not running
     try:
         if data.get("closed") and data.get("autodraw_enabled"):
-            # if it says in progress but jobs lost -> start again safely
-            if data.get("autodraw_in_progress"):
+            # in progress but jobs lost -> resume the same selection, else start again safely
+            if data.get("autodraw_in_progress") and not resume_autodraw(updater.job_queue):
                 updater.job_queue.run_once(lambda c: start_autodraw_channel_progress(c), when=2)
     except Exception:
         pass
 
     print("Bot is running (PTB v13, non-async) ...")
-    updater.start_polling()
+    # chat_member updates are only delivered when explicitly requested
+    updater.start_polling(allowed_updates=["message", "callback_query", "chat_member"])
     updater.idle()
+    flush_data()
 
 
 if __name__ == "__main__":
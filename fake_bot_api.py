@@ -0,0 +1,513 @@
+# fake_bot_api.py
+# Local stand-in for the Telegram Bot API, for offline end-to-end runs and benchmarks.
+#
+# Speaks the subset main.py / bot.py use (getMe, getUpdates, sendMessage,
+# editMessageText, editMessageReplyMarkup, deleteMessage, pinChatMessage,
+# unpinChatMessage, answerCallbackQuery, getChatMember, sendDocument, webhook calls)
+# with configurable latency, flood-wait (429) injection and a synthetic update feed.
+#
+# Run:
+#   python fake_bot_api.py --port 8081 --latency-ms 40 --jitter-ms 20 --flood-rate 0.01
+# Point the bots at it:
+#   TELEGRAM_BASE_URL=http://127.0.0.1:8081/bot
+#
+# Control endpoints (JSON):
+#   POST /_fake/update   one Update object (or a list); update_id is assigned if missing
+#   POST /_fake/clicks   {"data": "JOIN|<gid>", "users": 500, "rate": 100, "first_user_id": 1000}
+#   POST /_fake/config   {"latency_ms": 40, "jitter_ms": 20, "flood_rate": 0.01, "retry_after": 3, "member_status": "member"}
+#   GET  /_fake/stats    call counts, 429s, answer latency percentiles
+#   GET  /_fake/messages current chat messages
+
+import json
+import time
+import random
+import argparse
+import threading
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Optional
+from urllib.parse import parse_qsl
+
+# =========================================================
+# CORE (IN-PROCESS FAKE TELEGRAM)
+# =========================================================
+WRITE_METHODS = {
+    "sendmessage",
+    "senddocument",
+    "editmessagetext",
+    "editmessagereplymarkup",
+    "deletemessage",
+    "pinchatmessage",
+    "unpinchatmessage",
+}
+
+BOT_USER = {"id": 100000001, "is_bot": True, "first_name": "FakeBot", "username": "fake_giveaway_bot"}
+
+
+def percentile(sorted_vals: list[float], p: float) -> float:
+    if not sorted_vals:
+        return 0.0
+    k = min(len(sorted_vals) - 1, max(0, int(round(p / 100.0 * (len(sorted_vals) - 1)))))
+    return sorted_vals[k]
+
+
+def as_chat_id(v: Any) -> Any:
+    if isinstance(v, str) and v.lstrip("-").isdigit():
+        return int(v)
+    return v
+
+
+def as_json(v: Any) -> Any:
+    # form-encoded requests carry nested objects as JSON strings
+    if isinstance(v, str) and v[:1] in ("{", "["):
+        try:
+            return json.loads(v)
+        except ValueError:
+            return v
+    return v
+
+
+class FakeTelegram:
+    def __init__(
+        self,
+        latency_ms: float = 0.0,
+        jitter_ms: float = 0.0,
+        flood_rate: float = 0.0,
+        retry_after: int = 3,
+        member_status: str = "member",
+        channel_id: int = -1000000000001,
+    ):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.flood_rate = flood_rate
+        self.retry_after = retry_after
+        self.member_status = member_status
+        self.channel_id = channel_id
+
+        self._mu = threading.Condition()
+        self._next_update_id = 1
+        self._updates: list[dict] = []
+        self._next_mid: dict[Any, int] = {}
+        self.messages: dict[tuple[Any, int], dict] = {}
+        self.calls: dict[str, int] = {}
+        self.floods = 0
+        self.errors = 0
+        # callback_query_id -> click ts / list of answer ts
+        self._clicked: dict[str, float] = {}
+        self._answers: dict[str, list[float]] = {}
+        self.answer_texts: dict[str, str] = {}
+        self._cq_seq = 0
+
+    # ---- config / timing ----
+    def configure(self, **kw):
+        with self._mu:
+            for k in ("latency_ms", "jitter_ms", "flood_rate", "retry_after", "member_status", "channel_id"):
+                if k in kw and kw[k] is not None:
+                    setattr(self, k, type(getattr(self, k))(kw[k]))
+
+    def delay_for(self, method: str) -> float:
+        if method.lower() == "getupdates":
+            return 0.0
+        d = self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)
+        return max(0.0, d) / 1000.0
+
+    # ---- synthetic update feed ----
+    def enqueue_update(self, update: dict) -> int:
+        with self._mu:
+            if "update_id" not in update:
+                update = dict(update, update_id=self._next_update_id)
+            self._next_update_id = max(self._next_update_id, int(update["update_id"]) + 1)
+            self._updates.append(update)
+            self._mu.notify_all()
+            return int(update["update_id"])
+
+    def callback_update(self, user_id: int, username: Optional[str], data: str, message_id: int = 1, chat_id: Any = None) -> dict:
+        with self._mu:
+            self._cq_seq += 1
+            cq_id = f"cq{self._cq_seq}"
+            self._clicked[cq_id] = time.time()
+        user = {"id": user_id, "is_bot": False, "first_name": f"User{user_id}"}
+        if username:
+            user["username"] = username
+        chat = chat_id if chat_id is not None else self.channel_id
+        return {
+            "callback_query": {
+                "id": cq_id,
+                "from": user,
+                "chat_instance": "fake",
+                "data": data,
+                "message": {
+                    "message_id": message_id,
+                    "date": int(time.time()),
+                    "chat": {"id": chat, "type": "channel", "title": "Fake Channel"},
+                    "text": "",
+                },
+            }
+        }
+
+    def click(self, user_id: int, username: Optional[str], data: str, message_id: int = 1) -> int:
+        return self.enqueue_update(self.callback_update(user_id, username, data, message_id))
+
+    def feed_clicks(self, data: str, users: int, rate: float, first_user_id: int = 1000, no_username_every: int = 0):
+        # background thread: `users` distinct users click `data` at `rate` per second
+        def run():
+            start = time.time()
+            for i in range(users):
+                if rate > 0:
+                    wait = start + i / rate - time.time()
+                    if wait > 0:
+                        time.sleep(wait)
+                uid = first_user_id + i
+                uname = None if (no_username_every and i % no_username_every == 0) else f"user{uid}"
+                self.click(uid, uname, data)
+
+        t = threading.Thread(target=run, daemon=True)
+        t.start()
+        return t
+
+    # ---- stats ----
+    def stats(self) -> dict:
+        with self._mu:
+            lat = []
+            multi = 0
+            for cq_id, ts in self._answers.items():
+                if len(ts) > 1:
+                    multi += 1
+                clicked = self._clicked.get(cq_id)
+                if clicked is not None:
+                    lat.append(ts[0] - clicked)
+            lat.sort()
+            return {
+                "calls": dict(sorted(self.calls.items())),
+                "floods": self.floods,
+                "errors": self.errors,
+                "clicks": len(self._clicked),
+                "answered": len(self._answers),
+                "answered_more_than_once": multi,
+                "answer_ms": {
+                    "p50": round(percentile(lat, 50) * 1000, 2),
+                    "p95": round(percentile(lat, 95) * 1000, 2),
+                    "p99": round(percentile(lat, 99) * 1000, 2),
+                    "max": round((lat[-1] if lat else 0) * 1000, 2),
+                },
+                "pending_updates": len(self._updates),
+            }
+
+    def dump_messages(self) -> list[dict]:
+        with self._mu:
+            return [dict(m) for m in self.messages.values()]
+
+    # ---- Bot API ----
+    def get_updates(self, params: dict) -> list[dict]:
+        offset = int(params.get("offset") or 0)
+        timeout = float(params.get("timeout") or 0)
+        limit = int(params.get("limit") or 100)
+        deadline = time.time() + timeout
+        with self._mu:
+            if offset:
+                self._updates = [u for u in self._updates if int(u["update_id"]) >= offset]
+            while not self._updates and time.time() < deadline:
+                self._mu.wait(deadline - time.time())
+            return self._updates[:limit]
+
+    def handle(self, method: str, params: dict) -> tuple[int, dict]:
+        m = method.lower()
+        with self._mu:
+            self.calls[method] = self.calls.get(method, 0) + 1
+            flood = m in WRITE_METHODS and self.flood_rate > 0 and random.random() < self.flood_rate
+            if flood:
+                self.floods += 1
+        if flood:
+            return 429, {
+                "ok": False,
+                "error_code": 429,
+                "description": f"Too Many Requests: retry after {self.retry_after}",
+                "parameters": {"retry_after": self.retry_after},
+            }
+
+        fn = getattr(self, f"m_{m}", None)
+        if fn is None:
+            return 200, {"ok": True, "result": True}
+        try:
+            return 200, {"ok": True, "result": fn(params)}
+        except LookupError as e:
+            with self._mu:
+                self.errors += 1
+            return 400, {"ok": False, "error_code": 400, "description": f"Bad Request: {e}"}
+
+    def _message(self, chat_id: Any, mid: int, text: Optional[str], markup: Any) -> dict:
+        msg = {
+            "message_id": mid,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "channel" if isinstance(chat_id, int) and chat_id < 0 else "private"},
+        }
+        if isinstance(chat_id, int) and chat_id > 0:
+            msg["chat"]["first_name"] = "Admin"
+            msg["from"] = BOT_USER
+        if text is not None:
+            msg["text"] = text
+        if markup:
+            msg["reply_markup"] = markup
+        return msg
+
+    def m_getme(self, params: dict):
+        return BOT_USER
+
+    def m_getupdates(self, params: dict):
+        return self.get_updates(params)
+
+    def m_sendmessage(self, params: dict):
+        chat_id = as_chat_id(params.get("chat_id"))
+        with self._mu:
+            mid = self._next_mid.get(chat_id, 0) + 1
+            self._next_mid[chat_id] = mid
+            msg = self._message(chat_id, mid, params.get("text", ""), as_json(params.get("reply_markup")))
+            self.messages[(chat_id, mid)] = msg
+        return msg
+
+    def m_senddocument(self, params: dict):
+        chat_id = as_chat_id(params.get("chat_id"))
+        with self._mu:
+            mid = self._next_mid.get(chat_id, 0) + 1
+            self._next_mid[chat_id] = mid
+            msg = self._message(chat_id, mid, None, None)
+            msg["document"] = {
+                "file_id": f"doc{mid}",
+                "file_unique_id": f"doc{mid}",
+                "file_name": params.get("_filename", "document"),
+                "file_size": int(params.get("_size", 0)),
+            }
+            if params.get("caption"):
+                msg["caption"] = params["caption"]
+            self.messages[(chat_id, mid)] = msg
+        return msg
+
+    def m_editmessagetext(self, params: dict):
+        key = (as_chat_id(params.get("chat_id")), int(params.get("message_id") or 0))
+        markup = as_json(params.get("reply_markup"))
+        with self._mu:
+            msg = self.messages.get(key)
+            if msg is None:
+                raise LookupError("message to edit not found")
+            if msg.get("text") == params.get("text") and msg.get("reply_markup") == markup:
+                raise LookupError(
+                    "message is not modified: specified new message content and reply markup "
+                    "are exactly the same as a current content and reply markup of the message"
+                )
+            msg["text"] = params.get("text", "")
+            if markup:
+                msg["reply_markup"] = markup
+            else:
+                msg.pop("reply_markup", None)
+            msg["edit_date"] = int(time.time())
+            return dict(msg)
+
+    def m_editmessagereplymarkup(self, params: dict):
+        key = (as_chat_id(params.get("chat_id")), int(params.get("message_id") or 0))
+        markup = as_json(params.get("reply_markup"))
+        with self._mu:
+            msg = self.messages.get(key)
+            if msg is None:
+                raise LookupError("message to edit not found")
+            if msg.get("reply_markup") == markup:
+                raise LookupError("message is not modified")
+            if markup:
+                msg["reply_markup"] = markup
+            else:
+                msg.pop("reply_markup", None)
+            return dict(msg)
+
+    def m_deletemessage(self, params: dict):
+        key = (as_chat_id(params.get("chat_id")), int(params.get("message_id") or 0))
+        with self._mu:
+            if self.messages.pop(key, None) is None:
+                raise LookupError("message to delete not found")
+        return True
+
+    def m_pinchatmessage(self, params: dict):
+        key = (as_chat_id(params.get("chat_id")), int(params.get("message_id") or 0))
+        with self._mu:
+            if key not in self.messages:
+                raise LookupError("message to pin not found")
+            self.messages[key]["pinned"] = True
+        return True
+
+    def m_unpinchatmessage(self, params: dict):
+        key = (as_chat_id(params.get("chat_id")), int(params.get("message_id") or 0))
+        with self._mu:
+            if key in self.messages:
+                self.messages[key].pop("pinned", None)
+        return True
+
+    def m_answercallbackquery(self, params: dict):
+        cq_id = str(params.get("callback_query_id") or "")
+        with self._mu:
+            self._answers.setdefault(cq_id, []).append(time.time())
+            self.answer_texts.setdefault(cq_id, str(params.get("text") or ""))
+            if len(self._answers[cq_id]) > 1:
+                raise LookupError("query is too old and response timeout expired or query id is invalid")
+        return True
+
+    def m_getchatmember(self, params: dict):
+        uid = int(params.get("user_id") or 0)
+        return {
+            "status": self.member_status,
+            "user": {"id": uid, "is_bot": False, "first_name": f"User{uid}"},
+        }
+
+    def m_setwebhook(self, params: dict):
+        return True
+
+    def m_deletewebhook(self, params: dict):
+        return True
+
+    def m_getwebhookinfo(self, params: dict):
+        return {"url": "", "has_custom_certificate": False, "pending_update_count": len(self._updates)}
+
+
+# =========================================================
+# HTTP SERVER
+# =========================================================
+def parse_params(content_type: str, body: bytes, query: str) -> dict:
+    params: dict[str, Any] = dict(parse_qsl(query))
+    ctype = (content_type or "").lower()
+    if not body:
+        return params
+    if ctype.startswith("application/json"):
+        obj = json.loads(body)
+        if isinstance(obj, dict):
+            params.update(obj)
+    elif ctype.startswith("multipart/form-data"):
+        msg = BytesParser(policy=HTTP).parsebytes(
+            b"Content-Type: " + content_type.encode("latin-1") + b"\r\n\r\n" + body
+        )
+        for part in msg.iter_parts():
+            name = part.get_param("name", header="content-disposition")
+            if not name:
+                continue
+            payload = part.get_payload(decode=True) or b""
+            filename = part.get_filename()
+            if filename:
+                params["_filename"] = filename
+                params["_size"] = len(payload)
+            else:
+                params[name] = payload.decode("utf-8", "replace")
+    else:
+        params.update(parse_qsl(body.decode("utf-8", "replace"), keep_blank_values=True))
+    return params
+
+
+def make_handler(fake: FakeTelegram):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, fmt, *args):
+            pass
+
+        def _send(self, status: int, payload: Any):
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _body(self) -> bytes:
+            n = int(self.headers.get("Content-Length") or 0)
+            return self.rfile.read(n) if n > 0 else b""
+
+        def _route(self):
+            path, _, query = self.path.partition("?")
+            body = self._body()
+
+            if path.startswith("/_fake/"):
+                return self._control(path[len("/_fake/"):], body)
+
+            # /bot<token>/<method>
+            parts = path.strip("/").split("/")
+            if len(parts) != 2 or not parts[0].startswith("bot"):
+                return self._send(404, {"ok": False, "error_code": 404, "description": "Not Found"})
+            method = parts[1]
+            try:
+                params = parse_params(self.headers.get("Content-Type", ""), body, query)
+            except Exception as e:
+                return self._send(400, {"ok": False, "error_code": 400, "description": f"Bad Request: {e}"})
+
+            delay = fake.delay_for(method)
+            if delay > 0:
+                time.sleep(delay)
+            status, payload = fake.handle(method, params)
+            self._send(status, payload)
+
+        def _control(self, name: str, body: bytes):
+            obj = json.loads(body) if body else {}
+            if name == "update":
+                items = obj if isinstance(obj, list) else [obj]
+                ids = [fake.enqueue_update(u) for u in items]
+                return self._send(200, {"ok": True, "update_ids": ids})
+            if name == "clicks":
+                fake.feed_clicks(
+                    data=str(obj["data"]),
+                    users=int(obj.get("users", 100)),
+                    rate=float(obj.get("rate", 0)),
+                    first_user_id=int(obj.get("first_user_id", 1000)),
+                    no_username_every=int(obj.get("no_username_every", 0)),
+                )
+                return self._send(200, {"ok": True})
+            if name == "config":
+                fake.configure(**obj)
+                return self._send(200, {"ok": True})
+            if name == "stats":
+                return self._send(200, fake.stats())
+            if name == "messages":
+                return self._send(200, fake.dump_messages())
+            return self._send(404, {"ok": False})
+
+        def do_POST(self):
+            self._route()
+
+        def do_GET(self):
+            self._route()
+
+    return Handler
+
+
+def serve(fake: FakeTelegram, host: str = "127.0.0.1", port: int = 8081) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer((host, port), make_handler(fake))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Local fake Telegram Bot API server.")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8081)
+    ap.add_argument("--latency-ms", type=float, default=0.0)
+    ap.add_argument("--jitter-ms", type=float, default=0.0)
+    ap.add_argument("--flood-rate", type=float, default=0.0, help="probability of a 429 on write methods")
+    ap.add_argument("--retry-after", type=int, default=3)
+    ap.add_argument("--member-status", default="member", help="getChatMember status for every user")
+    ap.add_argument("--channel-id", type=int, default=-1000000000001)
+    args = ap.parse_args()
+
+    fake = FakeTelegram(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        flood_rate=args.flood_rate,
+        retry_after=args.retry_after,
+        member_status=args.member_status,
+        channel_id=args.channel_id,
+    )
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(fake))
+    server.daemon_threads = True
+    print(f"Fake Bot API on http://{args.host}:{args.port}/bot<token>/<method>")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,403 @@
+# loadtest.py
+# Join-storm load generator for the JOIN path, run fully offline.
+#
+# N synthetic users click JOIN at a fixed arrival rate against the in-process
+# fake Bot API (fake_bot_api.FakeTelegram) and a throwaway DB / data file.
+#
+#   main.py (PTB 21, async):  on_callback, temp SQLite DB; clicks reach it through
+#                             --mode queue (straight into update_queue), polling
+#                             (fake getUpdates) or webhook (HTTP POSTs to PTB's webhook server)
+#   bot.py  (PTB 13, sync):   cb_handler via Dispatcher.update_queue, temp JSON data file
+#
+# Usage:
+#   python loadtest.py --users 2000 --rate 200 --latency-ms 40 --jitter-ms 20
+#   python loadtest.py --mode polling --users 1000 --rate 200
+#   python loadtest.py --mode webhook --users 1000 --rate 200
+#   python loadtest.py --target legacy --users 500 --rate 50 --verify-targets 2
+#
+# Reports answer latency p50/p95/p99 (click -> answerCallbackQuery), throughput,
+# DB commits (main) / data file saves (legacy), channel edits, and checks that
+# there is exactly one first-join champion and no duplicate participants.
+
+import os
+import sys
+import json
+import time
+import socket
+import random
+import asyncio
+import argparse
+import tempfile
+import threading
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from fake_bot_api import FakeTelegram, percentile
+
+CHANNEL_ID = -1000000000001
+
+
+def click_plan(args) -> list[tuple[float, int, str]]:
+    # (offset seconds, user_id, username) sorted by arrival; --dup-rate users click twice
+    plan = []
+    for i in range(args.users):
+        uid = args.first_user_id + i
+        uname = None if (args.no_username_every and i % args.no_username_every == 0) else f"user{uid}"
+        at = i / args.rate if args.rate > 0 else 0.0
+        plan.append((at, uid, uname))
+        if args.dup_rate > 0 and random.random() < args.dup_rate:
+            plan.append((at + random.uniform(0, 0.5), uid, uname))
+    plan.sort(key=lambda x: x[0])
+    return plan
+
+
+def report(args, fake: FakeTelegram, wall: float, cq_user: dict[str, int], writes_label: str, writes: int,
+           participants: int, distinct: int, champion_popups: set[int], champions_stored: int):
+    st = fake.stats()
+    lat = []
+    for cq_id, ts in fake._answers.items():
+        if cq_id in fake._clicked:
+            lat.append(ts[0] - fake._clicked[cq_id])
+    lat.sort()
+    clicks = len(cq_user)
+    ok_unique = participants == distinct == args.users
+    ok_champion = len(champion_popups) == 1 and champions_stored == 1
+
+    print(f"target:            {args.target}" + (f" ({args.mode})" if args.target == "main" else ""))
+    print(f"users / clicks:    {args.users} / {clicks} (rate {args.rate or 'max'}/s)")
+    print(f"answered:          {st['answered']} (more than once: {st['answered_more_than_once']})")
+    print(f"wall:              {wall:.2f}s  throughput {st['answered'] / wall if wall else 0:.1f} answers/s")
+    print(
+        "answer ms:         p50={:.1f} p95={:.1f} p99={:.1f} max={:.1f}".format(
+            percentile(lat, 50) * 1000,
+            percentile(lat, 95) * 1000,
+            percentile(lat, 99) * 1000,
+            (lat[-1] if lat else 0) * 1000,
+        )
+    )
+    print(f"{writes_label + ':':<19}{writes}")
+    print(f"channel edits:     {st['calls'].get('editMessageText', 0)}")
+    print(f"getChatMember:     {st['calls'].get('getChatMember', 0)}")
+    print(f"429s injected:     {st['floods']}")
+    print(f"participants:      {participants} stored, {distinct} distinct -> {'OK' if ok_unique else 'FAIL'}")
+    print(
+        f"first-join:        {len(champion_popups)} user(s) shown champion popup, "
+        f"{champions_stored} stored -> {'OK' if ok_champion else 'FAIL'}"
+    )
+    return 0 if (ok_unique and ok_champion and st["answered"] == clicks) else 1
+
+
+# =========================================================
+# main.py (PTB 21)
+# =========================================================
+def run_main(args, fake: FakeTelegram, tmp: str) -> int:
+    os.environ.setdefault("BOT_TOKEN", "1:loadtest")
+    os.environ["MAIN_CHANNEL_ID"] = str(CHANNEL_ID)
+    os.environ["DB_PATH"] = os.path.join(tmp, "giveaway.db")
+
+    import aiosqlite
+    from telegram import Update
+    from telegram.ext import Application, CallbackQueryHandler
+    from telegram.request import BaseRequest, RequestData
+
+    import main as bot_main
+
+    commits = [0]
+    real_commit = aiosqlite.Connection.commit
+
+    async def counted_commit(self):
+        commits[0] += 1
+        return await real_commit(self)
+
+    aiosqlite.Connection.commit = counted_commit
+
+    class FakeRequest(BaseRequest):
+        async def initialize(self):
+            pass
+
+        async def shutdown(self):
+            pass
+
+        async def do_request(self, url, method, request_data: RequestData = None, read_timeout=None,
+                             write_timeout=None, connect_timeout=None, pool_timeout=None):
+            api_method = url.rsplit("/", 1)[1]
+            delay = fake.delay_for(api_method)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            params = request_data.parameters if request_data else {}
+            if api_method == "getUpdates":
+                # long poll blocks on the fake's condition: keep it off the event loop
+                status, payload = await asyncio.to_thread(fake.handle, api_method, dict(params))
+            else:
+                status, payload = fake.handle(api_method, dict(params))
+            return status, json.dumps(payload).encode("utf-8")
+
+    webhook_secret = "loadtest-secret"
+    webhook_pool = ThreadPoolExecutor(max_workers=16, thread_name_prefix="post")
+    webhook_url = [""]
+
+    def post_update(u: dict):
+        req = urllib.request.Request(
+            webhook_url[0],
+            data=json.dumps(u).encode("utf-8"),
+            headers={"Content-Type": "application/json", "X-Telegram-Bot-Api-Secret-Token": webhook_secret},
+        )
+        urllib.request.urlopen(req, timeout=30).read()
+
+    async def start_ingest(app):
+        if args.mode == "polling":
+            await app.updater.start_polling(poll_interval=0, timeout=10)
+        elif args.mode == "webhook":
+            with socket.socket() as sock:
+                sock.bind(("127.0.0.1", 0))
+                port = sock.getsockname()[1]
+            webhook_url[0] = f"http://127.0.0.1:{port}/telegram"
+            await app.updater.start_webhook(
+                listen="127.0.0.1", port=port, url_path="telegram",
+                webhook_url=webhook_url[0], secret_token=webhook_secret,
+            )
+
+    async def inject(app, u: dict):
+        # the click timestamp is taken in fake.callback_update(), before any of these
+        if args.mode == "polling":
+            fake.enqueue_update(u)
+        elif args.mode == "webhook":
+            asyncio.get_running_loop().run_in_executor(webhook_pool, post_update, u)
+        else:
+            await app.update_queue.put(Update.de_json(u, app.bot))
+
+    async def storm(app):
+        gid = bot_main.gen_giveaway_id()
+        post = fake.m_sendmessage({"chat_id": CHANNEL_ID, "text": "join post"})
+        now = bot_main.now_ts()
+        await bot_main.db.create_giveaway(
+            {
+                "giveaway_id": gid,
+                "title": "LOAD TEST",
+                "prize": "Test prize",
+                "total_winners": 3,
+                "duration_seconds": args.duration,
+                "hosted_by": "loadtest",
+                "rules": "",
+                "created_ts": now,
+                "ends_ts": now + args.duration,
+                "status": "ACTIVE",
+                "autodraw": 0,
+                "old_winner_mode": "SKIP",
+                "channel_post_msg_id": post["message_id"],
+            }
+        )
+        await bot_main.schedule_giveaway_jobs(app, gid)
+        commits[0] = 0
+
+        plan = click_plan(args)
+        cq_user: dict[str, int] = {}
+        start = time.time()
+        for at, uid, uname in plan:
+            wait = start + at - time.time()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            u = fake.callback_update(uid, uname, f"JOIN|{gid}", message_id=post["message_id"])
+            u["update_id"] = len(cq_user) + 1
+            cq_user[u["callback_query"]["id"]] = uid
+            await inject(app, u)
+
+        deadline = time.time() + args.timeout
+        while len(fake._answers) < len(plan) and time.time() < deadline:
+            await asyncio.sleep(0.01)
+        wall = time.time() - start
+        await asyncio.sleep(0.2)  # let background refreshes settle
+
+        async with aiosqlite.connect(bot_main.CFG.DB_PATH) as conn:
+            cur = await conn.execute(
+                "SELECT COUNT(*), COUNT(DISTINCT user_id), COALESCE(SUM(is_first_join), 0) "
+                "FROM participants WHERE giveaway_id=?",
+                (gid,),
+            )
+            n, distinct, firsts = await cur.fetchone()
+
+        champions = set()
+        for cq_id, uid in cq_user.items():
+            text = fake.answer_texts.get(cq_id, "")
+            if text in (
+                bot_main.popup_first_join(f"@user{uid}", uid, bot_main.CFG.GROUP_USERNAME),
+                bot_main.popup_first_join("User", uid, bot_main.CFG.GROUP_USERNAME),
+            ):
+                champions.add(uid)
+
+        bot_main.TICKER.cancel_giveaway(gid)
+        return wall, cq_user, "DB commits", commits[0], n, distinct, champions, firsts
+
+    async def go() -> int:
+        await bot_main.db.init()
+        app = (
+            Application.builder()
+            .token(bot_main.CFG.BOT_TOKEN)
+            .request(FakeRequest())
+            .get_updates_request(FakeRequest())
+            .concurrent_updates(bot_main.GaugedUpdateProcessor(bot_main.CFG.CONCURRENT_UPDATES))
+            .build()
+        )
+        app.add_handler(CallbackQueryHandler(bot_main.on_callback))
+
+        async with app:
+            await app.start()
+            await start_ingest(app)
+            try:
+                result = await storm(app)
+            finally:
+                if app.updater.running:
+                    await app.updater.stop()
+                await app.stop()
+                webhook_pool.shutdown(wait=False)
+        return report(args, fake, *result)
+
+    return asyncio.run(go())
+
+
+# =========================================================
+# bot.py (PTB 13)
+# =========================================================
+def run_legacy(args, fake: FakeTelegram, tmp: str) -> int:
+    os.environ.setdefault("BOT_TOKEN", "1:loadtest")
+    os.environ["CHANNEL_ID"] = str(CHANNEL_ID)
+    os.environ["DATA_FILE"] = os.path.join(tmp, "giveaway_data.json")
+    os.environ["MEMBERSHIP_DB"] = os.path.join(tmp, "membership.db")
+
+    from telegram import Bot, Update
+    from telegram.error import BadRequest, RetryAfter
+    from telegram.ext import Updater, CallbackQueryHandler
+    from telegram.utils.request import Request
+
+    import bot as legacy
+
+    # count real file writes; save_data() only wakes the writer thread
+    saves = [0]
+    real_write = legacy.write_data_file
+
+    def counted_write(text):
+        saves[0] += 1
+        real_write(text)
+
+    legacy.write_data_file = counted_write
+    legacy.start_save_writer()
+    legacy.init_membership_index()
+
+    class FakeRequest(Request):
+        def post(self, url, data, timeout=None):
+            api_method = url.rsplit("/", 1)[1]
+            delay = fake.delay_for(api_method)
+            if delay > 0:
+                time.sleep(delay)
+            status, payload = fake.handle(api_method, dict(data or {}))
+            if status == 429:
+                raise RetryAfter(payload["parameters"]["retry_after"])
+            if not payload.get("ok"):
+                raise BadRequest(payload.get("description", ""))
+            return payload["result"]
+
+    bot = Bot(os.environ["BOT_TOKEN"], request=FakeRequest(con_pool_size=8))
+    updater = Updater(bot=bot, use_context=True)
+    dp = updater.dispatcher
+    dp.add_handler(CallbackQueryHandler(legacy.gated_cb_handler))
+    updater.job_queue.start()
+    threading.Thread(target=dp.start, daemon=True).start()
+
+    post = fake.m_sendmessage({"chat_id": CHANNEL_ID, "text": "live post"})
+    with legacy.lock, legacy.parts_lock:
+        legacy.data.update(
+            {
+                "active": True,
+                "closed": False,
+                "title": "LOAD TEST",
+                "prize": "Test prize",
+                "winner_count": 3,
+                "duration_seconds": args.duration,
+                "start_time": legacy.now_ts(),
+                "live_message_id": post["message_id"],
+                "participants": {},
+                "verify_targets": [{"ref": f"@verify{i}", "display": f"@verify{i}"} for i in range(args.verify_targets)],
+                "first_winner_id": None,
+                "first_winner_username": "",
+                "first_winner_name": "",
+            }
+        )
+        legacy.save_data()
+    legacy.start_live_countdown(updater.job_queue)
+    saves[0] = 0
+
+    plan = click_plan(args)
+    cq_user: dict[str, int] = {}
+    start = time.time()
+    for at, uid, uname in plan:
+        wait = start + at - time.time()
+        if wait > 0:
+            time.sleep(wait)
+        u = fake.callback_update(uid, uname, "join_giveaway", message_id=post["message_id"])
+        u["update_id"] = len(cq_user) + 1
+        cq_user[u["callback_query"]["id"]] = uid
+        dp.update_queue.put(Update.de_json(u, bot))
+
+    deadline = time.time() + args.timeout
+    while len(fake._answers) < len(plan) and time.time() < deadline:
+        time.sleep(0.01)
+    wall = time.time() - start
+
+    with legacy.parts_lock:
+        parts = dict(legacy.data.get("participants", {}) or {})
+        first = legacy.data.get("first_winner_id")
+
+    champions = set()
+    for cq_id, uid in cq_user.items():
+        text = fake.answer_texts.get(cq_id, "")
+        if text in (legacy.popup_first_join(f"@user{uid}", str(uid)), legacy.popup_first_join("@username", str(uid))):
+            champions.add(uid)
+
+    legacy.stop_live_countdown()
+    dp.stop()
+    updater.job_queue.stop()
+
+    return report(
+        args, fake, wall, cq_user, "data file saves", saves[0],
+        len(parts), len(set(parts)), champions, 1 if first and str(first) in parts else 0,
+    )
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Offline JOIN storm against main.py or bot.py.")
+    ap.add_argument("--target", choices=("main", "legacy"), default="main", help="main = main.py, legacy = bot.py")
+    ap.add_argument("--mode", choices=("queue", "polling", "webhook"), default="queue",
+                    help="main: how clicks reach the bot (webhook needs python-telegram-bot[webhooks])")
+    ap.add_argument("--users", type=int, default=1000)
+    ap.add_argument("--rate", type=float, default=100.0, help="clicks per second (0 = all at once)")
+    ap.add_argument("--dup-rate", type=float, default=0.05, help="fraction of users that click twice")
+    ap.add_argument("--no-username-every", type=int, default=0, help="every Nth user has no @username")
+    ap.add_argument("--first-user-id", type=int, default=100000)
+    ap.add_argument("--duration", type=int, default=3600, help="giveaway duration (s)")
+    ap.add_argument("--latency-ms", type=float, default=30.0)
+    ap.add_argument("--jitter-ms", type=float, default=10.0)
+    ap.add_argument("--flood-rate", type=float, default=0.0)
+    ap.add_argument("--retry-after", type=int, default=1)
+    ap.add_argument("--verify-targets", type=int, default=0, help="legacy: verify channels checked per join")
+    ap.add_argument("--timeout", type=float, default=120.0, help="max wait for all answers (s)")
+    ap.add_argument("--seed", type=int, default=None)
+    args = ap.parse_args()
+
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    fake = FakeTelegram(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        flood_rate=args.flood_rate,
+        retry_after=args.retry_after,
+        channel_id=CHANNEL_ID,
+    )
+    with tempfile.TemporaryDirectory(prefix="loadtest-") as tmp:
+        if args.target == "main":
+            return run_main(args, fake, tmp)
+        return run_legacy(args, fake, tmp)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
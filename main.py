@@ -7,9 +7,23 @@ import os
 import re
 import json
 import time
+import math
+import csv
+import zlib
+import gzip
+import heapq
+import bisect
+import inspect
+import functools
 import random
+import secrets
 import asyncio
-from dataclasses import dataclass
+import itertools
+import tempfile
+import threading
+import contextlib
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from typing import Optional, Any
 
 import aiosqlite
@@ -20,15 +34,17 @@ from telegram import (
     InlineKeyboardButton,
     InlineKeyboardMarkup,
 )
-from telegram.error import BadRequest
+from telegram.error import BadRequest, TimedOut
 from telegram.ext import (
     Application,
     CommandHandler,
     ContextTypes,
     MessageHandler,
     CallbackQueryHandler,
+    SimpleUpdateProcessor,
     filters,
 )
+from telegram.request import HTTPXRequest
 
 # =========================================================
 # ENV / CONFIG
@@ -47,17 +63,134 @@ class Config:
     )
     OFFICIAL_CHANNEL_USERNAME: str = os.getenv("OFFICIAL_CHANNEL_USERNAME", "@PowerPointBreak").strip()
     DB_PATH: str = os.getenv("DB_PATH", "giveaway.db").strip()
+    # join post refresh cadence (seconds); per giveaway override via /refreshrate
+    JOIN_REFRESH_MIN: int = max(1, int(os.getenv("JOIN_REFRESH_MIN", "1")))
+    JOIN_REFRESH_MAX: int = max(1, int(os.getenv("JOIN_REFRESH_MAX", "60")))
+    # update ingestion: "polling" (default) or "webhook"
+    UPDATE_MODE: str = os.getenv("UPDATE_MODE", "polling").strip().lower()
+    WEBHOOK_URL: str = os.getenv("WEBHOOK_URL", "").strip()  # public base URL (required for webhook mode)
+    WEBHOOK_LISTEN: str = os.getenv("WEBHOOK_LISTEN", "127.0.0.1").strip()
+    WEBHOOK_PORT: int = int(os.getenv("WEBHOOK_PORT", "8443"))
+    WEBHOOK_PATH: str = os.getenv("WEBHOOK_PATH", "telegram").strip().strip("/")
+    WEBHOOK_SECRET: str = os.getenv("WEBHOOK_SECRET", "").strip()  # empty = random per run
+    WEBHOOK_MAX_CONNECTIONS: int = max(1, min(100, int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "40"))))
+    # max updates processed at once (1 = strictly sequential)
+    CONCURRENT_UPDATES: int = max(1, int(os.getenv("CONCURRENT_UPDATES", "64")))
+    # selections over more participants than this stream the draw (bounded memory)
+    DRAW_STREAM_ABOVE: int = max(0, int(os.getenv("DRAW_STREAM_ABOVE", "100000")))
+    # max selection post edits per second (frames are whole seconds apart)
+    SELECTION_MAX_FPS: float = max(0.01, float(os.getenv("SELECTION_MAX_FPS", "1")))
+    # per-user click limits (token bucket per action) and load shedding;
+    # CLICK_SHED_DEPTH = queued updates above which non-admin clicks get "busy" (0 = off)
+    CLICK_RATE: float = max(0.01, float(os.getenv("CLICK_RATE", "1")))
+    CLICK_BURST: int = max(1, int(os.getenv("CLICK_BURST", "4")))
+    CLICK_SHED_DEPTH: int = max(0, int(os.getenv("CLICK_SHED_DEPTH", "500")))
+    # max independent Telegram calls in flight per fan-out
+    FANOUT_LIMIT: int = max(1, int(os.getenv("FANOUT_LIMIT", "8")))
+    # Bot API endpoint; point at fake_bot_api.py for offline runs (e.g. http://127.0.0.1:8081/bot)
+    TELEGRAM_BASE_URL: str = os.getenv("TELEGRAM_BASE_URL", "").strip()
+    # Bot API HTTP client: API calls and long-polling getUpdates get separate pools
+    TELEGRAM_POOL_SIZE: int = max(1, int(os.getenv("TELEGRAM_POOL_SIZE", "64")))
+    TELEGRAM_POOL_TIMEOUT: float = float(os.getenv("TELEGRAM_POOL_TIMEOUT", "3"))
+    TELEGRAM_CONNECT_TIMEOUT: float = float(os.getenv("TELEGRAM_CONNECT_TIMEOUT", "5"))
+    TELEGRAM_READ_TIMEOUT: float = float(os.getenv("TELEGRAM_READ_TIMEOUT", "10"))
+    TELEGRAM_WRITE_TIMEOUT: float = float(os.getenv("TELEGRAM_WRITE_TIMEOUT", "10"))
+    TELEGRAM_HTTP_VERSION: str = os.getenv("TELEGRAM_HTTP_VERSION", "1.1").strip()  # "1.1" or "2" (needs httpx[http2])
+    TELEGRAM_UPDATES_POOL_SIZE: int = max(1, int(os.getenv("TELEGRAM_UPDATES_POOL_SIZE", "2")))
+    TELEGRAM_UPDATES_READ_TIMEOUT: float = float(os.getenv("TELEGRAM_UPDATES_READ_TIMEOUT", "30"))
+    # Prometheus text endpoint (GET /metrics); METRICS_PORT=0 disables it
+    METRICS_LISTEN: str = os.getenv("METRICS_LISTEN", "127.0.0.1").strip()
+    METRICS_PORT: int = int(os.getenv("METRICS_PORT", "0"))
 
 CFG = Config()
 if not CFG.BOT_TOKEN:
     raise SystemExit("Missing BOT_TOKEN in environment.")
 if CFG.MAIN_CHANNEL_ID == 0:
     raise SystemExit("Missing MAIN_CHANNEL_ID in environment.")
+if CFG.UPDATE_MODE not in ("polling", "webhook"):
+    raise SystemExit("UPDATE_MODE must be 'polling' or 'webhook'.")
+if CFG.UPDATE_MODE == "webhook" and not CFG.WEBHOOK_URL:
+    raise SystemExit("UPDATE_MODE=webhook needs WEBHOOK_URL (the public base URL Telegram posts to).")
+if CFG.TELEGRAM_HTTP_VERSION not in ("1.1", "2", "2.0"):
+    raise SystemExit("TELEGRAM_HTTP_VERSION must be '1.1' or '2'.")
 if not CFG.ADMIN_IDS and CFG.OWNER_USER_ID > 0:
     # if ADMIN_IDS not set, fallback to owner as admin
     CFG = Config(ADMIN_IDS=(CFG.OWNER_USER_ID,))
 
 
+# =========================================================
+# METRICS (PROMETHEUS TEXT FORMAT)
+# =========================================================
+# Observations only touch plain lists/dicts (a bisect and two adds); the text
+# is built when /metrics is scraped (see METRICS ENDPOINT near the end).
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def label_value(v: str) -> str:
+    return v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+class HistogramFamily:
+    def __init__(self, name: str, label: str, help_text: str, buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.label = label
+        self.help = help_text
+        self.buckets = buckets
+        self.children: dict[str, list] = {}  # label value -> [per-bucket counts..., +Inf count, sum]
+
+    def observe(self, key: str, value: float):
+        c = self.children.get(key)
+        if c is None:
+            c = self.children[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        c[bisect.bisect_left(self.buckets, value)] += 1
+        c[-1] += value
+
+    def render(self, out: list[str]):
+        out.append(f"# HELP {self.name} {self.help}")
+        out.append(f"# TYPE {self.name} histogram")
+        for key, c in sorted(self.children.items()):
+            key = label_value(key)
+            total = 0
+            for bound, n in zip(self.buckets, c):
+                total += n
+                out.append(f'{self.name}_bucket{{{self.label}="{key}",le="{bound}"}} {total}')
+            total += c[-2]
+            out.append(f'{self.name}_bucket{{{self.label}="{key}",le="+Inf"}} {total}')
+            out.append(f'{self.name}_sum{{{self.label}="{key}"}} {c[-1]:.6f}')
+            out.append(f'{self.name}_count{{{self.label}="{key}"}} {total}')
+
+class CounterFamily:
+    def __init__(self, name: str, label: str, help_text: str):
+        self.name = name
+        self.label = label
+        self.help = help_text
+        self.children: dict[str, int] = {}
+
+    def inc(self, key: str):
+        self.children[key] = self.children.get(key, 0) + 1
+
+    def render(self, out: list[str]):
+        out.append(f"# HELP {self.name} {self.help}")
+        out.append(f"# TYPE {self.name} counter")
+        for key, n in sorted(self.children.items()):
+            out.append(f'{self.name}{{{self.label}="{label_value(key)}"}} {n}')
+
+M_CALLBACK = HistogramFamily("giveaway_callback_seconds", "action", "on_callback latency by callback_data prefix.")
+M_TEXT = HistogramFamily("giveaway_text_seconds", "flow", "on_text latency by admin flow.")
+M_DB = HistogramFamily("giveaway_db_seconds", "method", "DB method latency.")
+M_TG = HistogramFamily("giveaway_telegram_seconds", "method", "Bot API call latency (including pool wait).")
+M_TG_ERRORS = CounterFamily("giveaway_telegram_errors_total", "method", "Bot API calls that raised or returned HTTP >= 400.")
+M_JOB_LAG = HistogramFamily("giveaway_job_lag_seconds", "job", "Ticker deadline to actual fire time, by job kind.")
+METRIC_FAMILIES = (M_CALLBACK, M_TEXT, M_DB, M_TG, M_TG_ERRORS, M_JOB_LAG)
+
+def timed_db_method(name: str, fn):
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        t0 = time.perf_counter()
+        try:
+            return await fn(*args, **kwargs)
+        finally:
+            M_DB.observe(name, time.perf_counter() - t0)
+    return wrapper
+
 # =========================================================
 # DATABASE
 # =========================================================
@@ -141,6 +274,13 @@ class DB:
                     winner_ts INTEGER,
                     locked INTEGER NOT NULL DEFAULT 0
                 );
+
+                CREATE INDEX IF NOT EXISTS idx_participants_joined ON participants(giveaway_id, joined_ts, user_id);
+                CREATE INDEX IF NOT EXISTS idx_winner_history_user ON winner_history(user_id);
+                CREATE INDEX IF NOT EXISTS idx_winner_history_ts ON winner_history(ts, id);
+                CREATE INDEX IF NOT EXISTS idx_bans_ts ON bans(ts, user_id);
+
+                UPDATE bans SET ts=0 WHERE ts IS NULL;
                 """
             )
             await db.commit()
@@ -159,6 +299,11 @@ class DB:
             row = await cur.fetchone()
             return row[0] if row else default
 
+    async def delete_setting(self, key: str):
+        async with aiosqlite.connect(self.path) as db:
+            await db.execute("DELETE FROM settings WHERE key=?", (key,))
+            await db.commit()
+
     async def reset_all(self):
         async with aiosqlite.connect(self.path) as db:
             await db.executescript(
@@ -194,6 +339,47 @@ class DB:
             row = await cur.fetchone()
             return bool(row)
 
+    async def banned_user_ids(self) -> set[int]:
+        async with aiosqlite.connect(self.path) as db:
+            cur = await db.execute("SELECT user_id FROM bans")
+            return {int(r[0]) for r in await cur.fetchall()}
+
+    # ---- keyset pages (admin lists) ----
+    # kind -> (select, fixed WHERE with ? params, (key1, key2) cursor columns, newest first)
+    PAGES = {
+        "W": ("SELECT id, giveaway_id, user_id, username, prize, ts FROM winner_history", "", ("ts", "id"), True),
+        "B": ("SELECT user_id, username, reason, ts FROM bans", "", ("ts", "user_id"), True),
+        "P": (
+            "SELECT user_id, username, joined_ts, is_first_join FROM participants",
+            "giveaway_id=?", ("joined_ts", "user_id"), False,
+        ),
+    }
+
+    async def page(
+        self, kind: str, params: tuple, cursor: Optional[tuple[int, int]], backward: bool, limit: int
+    ) -> tuple[list[dict[str, Any]], bool]:
+        # one index range scan from the cursor row (exclusive), never an OFFSET;
+        # returns (rows in display order, whether more rows lie in the walked direction)
+        select, where, (k1, k2), newest_first = self.PAGES[kind]
+        down = newest_first != backward
+        conds = [where] if where else []
+        args = list(params)
+        if cursor is not None:
+            conds.append(f"({k1}, {k2}) {'<' if down else '>'} (?, ?)")
+            args += list(cursor)
+        order = "DESC" if down else "ASC"
+        sql = select + (" WHERE " + " AND ".join(conds) if conds else "")
+        sql += f" ORDER BY {k1} {order}, {k2} {order} LIMIT ?"
+        async with aiosqlite.connect(self.path) as db:
+            db.row_factory = aiosqlite.Row
+            cur = await db.execute(sql, (*args, limit + 1))
+            rows = [dict(r) for r in await cur.fetchall()]
+        more = len(rows) > limit
+        rows = rows[:limit]
+        if backward:
+            rows.reverse()
+        return rows, more
+
     async def list_bans(self) -> list[tuple[int, Optional[str], str, int]]:
         async with aiosqlite.connect(self.path) as db:
             cur = await db.execute("SELECT user_id,username,reason,ts FROM bans ORDER BY ts DESC")
@@ -262,6 +448,13 @@ class DB:
             rows = await cur.fetchall()
             return [dict(r) for r in rows]
 
+    async def list_selecting_giveaways(self) -> list[dict[str, Any]]:
+        async with aiosqlite.connect(self.path) as db:
+            db.row_factory = aiosqlite.Row
+            cur = await db.execute("SELECT * FROM giveaways WHERE status='SELECTING' ORDER BY created_ts DESC")
+            rows = await cur.fetchall()
+            return [dict(r) for r in rows]
+
     # ---- participants ----
     async def count_participants(self, giveaway_id: str) -> int:
         async with aiosqlite.connect(self.path) as db:
@@ -291,6 +484,17 @@ class DB:
             row = await cur.fetchone()
             return dict(row) if row else None
 
+    async def participant_ids(self, giveaway_id: str) -> tuple[set[int], Optional[int]]:
+        # (all joined user_ids, first-join user_id)
+        async with aiosqlite.connect(self.path) as db:
+            cur = await db.execute(
+                "SELECT user_id, is_first_join FROM participants WHERE giveaway_id=?",
+                (giveaway_id,),
+            )
+            rows = await cur.fetchall()
+        first = next((int(u) for u, f in rows if int(f or 0) == 1), None)
+        return {int(u) for u, _ in rows}, first
+
     async def list_participants(self, giveaway_id: str) -> list[dict[str, Any]]:
         async with aiosqlite.connect(self.path) as db:
             db.row_factory = aiosqlite.Row
@@ -301,6 +505,101 @@ class DB:
             rows = await cur.fetchall()
             return [dict(r) for r in rows]
 
+    @staticmethod
+    def eligible_sql(skip_old: bool) -> str:
+        # WHERE clause (alias p, one ? for giveaway_id): username set, not banned,
+        # not a winner of another giveaway in SKIP mode
+        cond = (
+            "p.giveaway_id=? AND p.username IS NOT NULL AND p.username != '' "
+            "AND NOT EXISTS (SELECT 1 FROM bans b WHERE b.user_id=p.user_id)"
+        )
+        if skip_old:
+            cond += (
+                " AND NOT EXISTS (SELECT 1 FROM winner_history h "
+                "WHERE h.user_id=p.user_id AND h.giveaway_id != p.giveaway_id)"
+            )
+        return cond
+
+    async def iter_eligible_participants(self, giveaway_id: str, skip_old: bool, chunk: int = 5000):
+        # streams (user_id, username) in chunks; memory stays at one chunk
+        async with aiosqlite.connect(self.path) as db:
+            cur = await db.execute(
+                f"SELECT p.user_id, p.username FROM participants p WHERE {self.eligible_sql(skip_old)}",
+                (giveaway_id,),
+            )
+            while True:
+                rows = await cur.fetchmany(chunk)
+                if not rows:
+                    break
+                for user_id, username in rows:
+                    yield int(user_id), username
+
+    async def iter_participant_audit(self, giveaway_id: str, skip_old: bool, chunk: int = 5000):
+        # streams batches of (user_id, username, joined_ts, is_first_join, status) in join order;
+        # status mirrors eligible_sql: banned / no_username / old_winner / eligible
+        old = (
+            "EXISTS (SELECT 1 FROM winner_history h WHERE h.user_id=p.user_id AND h.giveaway_id != p.giveaway_id)"
+            if skip_old else "0"
+        )
+        async with aiosqlite.connect(self.path) as db:
+            cur = await db.execute(
+                "SELECT p.user_id, p.username, p.joined_ts, p.is_first_join, "
+                "CASE WHEN EXISTS (SELECT 1 FROM bans b WHERE b.user_id=p.user_id) THEN 'banned' "
+                "WHEN p.username IS NULL OR p.username = '' THEN 'no_username' "
+                f"WHEN {old} THEN 'old_winner' ELSE 'eligible' END "
+                "FROM participants p WHERE p.giveaway_id=? ORDER BY p.joined_ts, p.user_id",
+                (giveaway_id,),
+            )
+            while True:
+                rows = await cur.fetchmany(chunk)
+                if not rows:
+                    break
+                yield rows
+
+    async def iter_rows(self, sql: str, params: tuple = (), chunk: int = 5000):
+        # streams dict rows in fetchmany batches; memory stays at one batch
+        async with aiosqlite.connect(self.path) as db:
+            db.row_factory = aiosqlite.Row
+            cur = await db.execute(sql, params)
+            while True:
+                rows = await cur.fetchmany(chunk)
+                if not rows:
+                    break
+                yield [dict(r) for r in rows]
+
+    async def get_first_joiner(self, giveaway_id: str) -> Optional[dict[str, Any]]:
+        async with aiosqlite.connect(self.path) as db:
+            db.row_factory = aiosqlite.Row
+            cur = await db.execute(
+                "SELECT * FROM participants WHERE giveaway_id=? AND is_first_join=1 LIMIT 1",
+                (giveaway_id,),
+            )
+            row = await cur.fetchone()
+            return dict(row) if row else None
+
+    async def showcase_page(self, giveaway_id: str, from_user_id: Optional[int], limit: int, skip_old: bool) -> list[tuple[int, str]]:
+        # showcase-eligible participants in join order, starting at from_user_id (wraps to the start)
+        cond = self.eligible_sql(skip_old)
+        out: list[tuple[int, str]] = []
+        async with aiosqlite.connect(self.path) as db:
+            if from_user_id is not None:
+                cur = await db.execute(
+                    f"SELECT p.user_id, p.username FROM participants p WHERE {cond} "
+                    "AND (p.joined_ts, p.user_id) >= (SELECT joined_ts, user_id FROM participants "
+                    "WHERE giveaway_id=? AND user_id=?) ORDER BY p.joined_ts, p.user_id LIMIT ?",
+                    (giveaway_id, giveaway_id, from_user_id, limit),
+                )
+                out = [(int(r[0]), r[1]) for r in await cur.fetchall()]
+            if len(out) < limit:
+                seen = {u for u, _ in out}
+                cur = await db.execute(
+                    f"SELECT p.user_id, p.username FROM participants p WHERE {cond} "
+                    "ORDER BY p.joined_ts, p.user_id LIMIT ?",
+                    (giveaway_id, limit - len(out)),
+                )
+                out += [(int(r[0]), r[1]) for r in await cur.fetchall() if int(r[0]) not in seen]
+        return out
+
     # ---- winners ----
     async def add_winner(self, giveaway_id: str, user_id: int, username: Optional[str], rank: int):
         async with aiosqlite.connect(self.path) as db:
@@ -361,6 +660,16 @@ class DB:
             rows = await cur.fetchall()
             return [dict(r) for r in rows]
 
+    async def winner_history_user_ids(self) -> set[int]:
+        async with aiosqlite.connect(self.path) as db:
+            cur = await db.execute("SELECT DISTINCT user_id FROM winner_history")
+            return {int(r[0]) for r in await cur.fetchall()}
+
+    async def has_won_before(self, user_id: int) -> bool:
+        async with aiosqlite.connect(self.path) as db:
+            cur = await db.execute("SELECT 1 FROM winner_history WHERE user_id=? LIMIT 1", (user_id,))
+            return await cur.fetchone() is not None
+
     # ---- lucky draw ----
     async def lucky_init(self, giveaway_id: str):
         async with aiosqlite.connect(self.path) as db:
@@ -388,6 +697,11 @@ class DB:
             return cur.rowcount > 0
 
 
+# every coroutine method feeds giveaway_db_seconds (streaming iterators are left as is)
+for _name, _fn in list(vars(DB).items()):
+    if inspect.iscoroutinefunction(_fn):
+        setattr(DB, _name, timed_db_method(_name, _fn))
+
 db = DB(CFG.DB_PATH)
 
 # =========================================================
@@ -400,10 +714,13 @@ def fmt_mmss(seconds: int) -> str:
     s = seconds % 60
     return f"{m:02d}:{s:02d}"
 
-def progress_bar(pct: int, blocks: int = 10) -> str:
+def progress_filled(pct: int, blocks: int = 10) -> int:
     pct = max(0, min(100, pct))
     filled = round((pct / 100) * blocks)
-    filled = max(0, min(blocks, filled))
+    return max(0, min(blocks, filled))
+
+def progress_bar(pct: int, blocks: int = 10) -> str:
+    filled = progress_filled(pct, blocks)
     return "▰" * filled + "▱" * (blocks - filled)
 
 def giveaway_post(
@@ -736,8 +1053,10 @@ def parse_delivered_lines(text: str) -> list[tuple[str, int]]:
         out.append((left, int(right)))
     return out
 
+SHOWCASE_COLORS = ["🟡", "🟠", "⚫", "🟣", "🔵", "🟢", "🟤", "⚪", "🔴"]
+
 def pick_three_distinct_colors() -> list[str]:
-    colors = ["🟡", "🟠", "⚫", "🟣", "🔵", "🟢", "🟤", "⚪", "🔴"]
+    colors = list(SHOWCASE_COLORS)
     random.shuffle(colors)
     return colors[:3]
 
@@ -806,6 +1125,20 @@ async def safe_edit_message(app: Application, chat_id: int, message_id: int, tex
             return
         raise
 
+# =========================================================
+# FAN-OUT (INDEPENDENT TELEGRAM CALLS)
+# =========================================================
+async def fan_out(*calls, limit: Optional[int] = None) -> list[Any]:
+    # Awaits independent coroutines concurrently, at most `limit` at a time.
+    # Results come back in call order; a failed call yields its exception.
+    sem = asyncio.Semaphore(limit or CFG.FANOUT_LIMIT)
+
+    async def one(c):
+        async with sem:
+            return await c
+
+    return await asyncio.gather(*(one(c) for c in calls), return_exceptions=True)
+
 # =========================================================
 # CLAIM POSTS (KEEP LAST 5)
 # =========================================================
@@ -869,15 +1202,15 @@ async def create_claim_post_and_keep_last_5(context: ContextTypes.DEFAULT_TYPE,
     to_delete = slots[5:]
     slots = slots[:5]
 
-    for it in to_delete:
-        mid = it.get("message_id")
-        if mid:
-            try:
-                await context.application.bot.delete_message(chat_id=CFG.MAIN_CHANNEL_ID, message_id=int(mid))
-            except Exception:
-                pass
-
-    await save_claim_slots(slots)
+    bot = context.application.bot
+    await fan_out(
+        save_claim_slots(slots),
+        *(
+            bot.delete_message(chat_id=CFG.MAIN_CHANNEL_ID, message_id=int(it["message_id"]))
+            for it in to_delete
+            if it.get("message_id")
+        ),
+    )
 
 # =========================================================
 # STATE (ADMIN FLOWS)
@@ -905,69 +1238,391 @@ async def owner_notify_unauthorized(user, app: Application):
         pass
 
 # =========================================================
-# JOBS (LIVE COUNTDOWN + CLOSE)
+# CONCURRENCY (PARALLEL UPDATES, PER-GIVEAWAY SERIALIZATION)
+# =========================================================
+class KeyedLocks:
+    # One asyncio.Lock per key, created on demand and dropped when unused.
+    # Re-entrant per task, so a locked transition may call another one
+    # (close -> start selection, finish selection -> post winners).
+
+    def __init__(self):
+        self._locks: dict[str, list] = {}  # key -> [lock, users, owner_task]
+
+    @contextlib.asynccontextmanager
+    async def hold(self, key: str):
+        ent = self._locks.get(key)
+        me = asyncio.current_task()
+        if ent is not None and ent[2] is me:
+            yield
+            return
+        if ent is None:
+            ent = self._locks[key] = [asyncio.Lock(), 0, None]
+        ent[1] += 1
+        try:
+            async with ent[0]:
+                ent[2] = me
+                try:
+                    yield
+                finally:
+                    ent[2] = None
+        finally:
+            ent[1] -= 1
+            if ent[1] == 0 and self._locks.get(key) is ent:
+                del self._locks[key]
+
+# join insert, close, selection start/finish, winner + lucky slot writes
+GW_LOCKS = KeyedLocks()
+
+class GaugedUpdateProcessor(SimpleUpdateProcessor):
+    # SimpleUpdateProcessor plus counters for the admin /stats gauge
+
+    def __init__(self, max_concurrent_updates: int):
+        super().__init__(max_concurrent_updates)
+        self.waiting = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.processed = 0
+
+    # process_update is @final for typing only; wrapping it is the one place
+    # that sees an update before it waits for a free slot
+    async def process_update(self, update, coroutine):  # type: ignore[misc]
+        started = [False]
+        self.waiting += 1
+        try:
+            await super().process_update(update, self._run(coroutine, started))
+        finally:
+            if not started[0]:
+                self.waiting -= 1
+
+    async def _run(self, coroutine, started: list):
+        started[0] = True
+        self.waiting -= 1
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            await coroutine
+        finally:
+            self.in_flight -= 1
+            self.processed += 1
+
+    async def do_process_update(self, update, coroutine):
+        await coroutine
+
+def queue_depth(app: Application) -> int:
+    # fetched but not yet running: still in update_queue or waiting for a slot
+    proc = app.update_processor
+    waiting = proc.waiting if isinstance(proc, GaugedUpdateProcessor) else 0
+    return app.update_queue.qsize() + waiting
+
+# =========================================================
+# TELEGRAM HTTP CLIENT (POOLS + CONNECTION-WAIT GAUGE)
+# =========================================================
+class PooledRequest(HTTPXRequest):
+    # HTTPXRequest whose connection slots are handed out by our own semaphore
+    # (same size as the httpx pool), so time spent waiting for a free
+    # connection is measured instead of hidden inside httpx.
+
+    def __init__(self, name: str, pool_size: int, pool_timeout: float, **kwargs):
+        super().__init__(connection_pool_size=pool_size, pool_timeout=None, **kwargs)
+        self.name = name
+        self.pool_size = pool_size
+        self.wait_timeout = pool_timeout
+        self._slots = asyncio.Semaphore(pool_size)
+        self.requests = 0
+        self.waited = 0          # requests that found the pool full
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.pool_timeouts = 0
+        self.in_use = 0
+        self.peak_in_use = 0
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None,
+                         write_timeout=None, connect_timeout=None, pool_timeout=None):
+        # explicit per-call pool_timeout wins; otherwise the configured one
+        limit = pool_timeout if isinstance(pool_timeout, (int, float)) else self.wait_timeout
+        t0 = time.perf_counter()
+        if self._slots.locked():
+            self.waited += 1
+            try:
+                await asyncio.wait_for(self._slots.acquire(), timeout=limit)
+            except asyncio.TimeoutError:
+                self.pool_timeouts += 1
+                raise TimedOut(f"Pool timeout: all {self.pool_size} {self.name} connections busy") from None
+        else:
+            await self._slots.acquire()
+        waited = time.perf_counter() - t0
+        self.requests += 1
+        self.wait_total += waited
+        self.wait_max = max(self.wait_max, waited)
+        self.in_use += 1
+        self.peak_in_use = max(self.peak_in_use, self.in_use)
+        api_method = url.rsplit("/", 1)[-1]
+        failed = True
+        try:
+            result = await super().do_request(
+                url, method, request_data=request_data, read_timeout=read_timeout,
+                write_timeout=write_timeout, connect_timeout=connect_timeout, pool_timeout=pool_timeout,
+            )
+            failed = result[0] >= 400
+            return result
+        finally:
+            self.in_use -= 1
+            self._slots.release()
+            M_TG.observe(api_method, time.perf_counter() - t0)
+            if failed:
+                M_TG_ERRORS.inc(api_method)
+
+    def stats_line(self) -> str:
+        avg_ms = (self.wait_total / self.requests * 1000) if self.requests else 0.0
+        return (
+            f"{self.name}: {self.in_use}/{self.pool_size} busy (peak {self.peak_in_use}), "
+            f"{self.requests} req, waited {self.waited}, "
+            f"wait avg {avg_ms:.1f}ms max {self.wait_max * 1000:.0f}ms, timeouts {self.pool_timeouts}"
+        )
+
+HTTP_POOLS: list[PooledRequest] = []
+
+def build_requests() -> tuple[PooledRequest, PooledRequest]:
+    http_version = "2" if CFG.TELEGRAM_HTTP_VERSION.startswith("2") else "1.1"
+    try:
+        api = PooledRequest(
+            "api",
+            CFG.TELEGRAM_POOL_SIZE,
+            CFG.TELEGRAM_POOL_TIMEOUT,
+            connect_timeout=CFG.TELEGRAM_CONNECT_TIMEOUT,
+            read_timeout=CFG.TELEGRAM_READ_TIMEOUT,
+            write_timeout=CFG.TELEGRAM_WRITE_TIMEOUT,
+            http_version=http_version,
+        )
+        updates = PooledRequest(
+            "getUpdates",
+            CFG.TELEGRAM_UPDATES_POOL_SIZE,
+            CFG.TELEGRAM_POOL_TIMEOUT,
+            connect_timeout=CFG.TELEGRAM_CONNECT_TIMEOUT,
+            read_timeout=CFG.TELEGRAM_UPDATES_READ_TIMEOUT,
+            write_timeout=CFG.TELEGRAM_WRITE_TIMEOUT,
+            http_version=http_version,
+        )
+    except RuntimeError as e:
+        # HTTP/2 without the h2 extra
+        raise SystemExit(f"{e} Or set TELEGRAM_HTTP_VERSION=1.1.")
+    HTTP_POOLS[:] = [api, updates]
+    return api, updates
+
+# =========================================================
+# TICKER (ONE DEADLINE HEAP FOR ALL GIVEAWAYS + SELECTIONS)
 # =========================================================
-def job_name_tick(gid: str) -> str:
-    return f"GW_TICK|{gid}"
+TICK_JOIN = "tick"
+TICK_CLOSE = "close"
+TICK_SELECTION = "sel"
+
+class Ticker:
+    # One task sleeps until the earliest deadline and fires it. Entries are
+    # keyed by (kind, giveaway_id); cancel/reschedule is O(1) (the stale heap
+    # entry is just marked dead and skipped when it surfaces).
+
+    def __init__(self):
+        self._heap: list[list] = []  # [due, seq, key, callback, alive]
+        self._entries: dict[tuple[str, str], list] = {}
+        self._seq = itertools.count()
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._running: set[asyncio.Task] = set()
+        self.app: Optional[Application] = None
+
+    def start(self, app: Application):
+        self.app = app
+        if self._task is None:
+            self._wake = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def schedule(self, kind: str, giveaway_id: str, due: float, callback):
+        key = (kind, giveaway_id)
+        old = self._entries.get(key)
+        if old is not None:
+            old[4] = False
+        entry = [due, next(self._seq), key, callback, True]
+        self._entries[key] = entry
+        heapq.heappush(self._heap, entry)
+        if self._wake is not None and self._heap[0] is entry:
+            self._wake.set()
+
+    def due(self, kind: str, giveaway_id: str) -> Optional[float]:
+        entry = self._entries.get((kind, giveaway_id))
+        return entry[0] if entry is not None else None
+
+    def cancel(self, kind: str, giveaway_id: str):
+        entry = self._entries.pop((kind, giveaway_id), None)
+        if entry is not None:
+            entry[4] = False
+
+    def cancel_giveaway(self, giveaway_id: str):
+        for kind in (TICK_JOIN, TICK_CLOSE, TICK_SELECTION):
+            self.cancel(kind, giveaway_id)
+
+    async def _run(self):
+        while True:
+            while self._heap and not self._heap[0][4]:
+                heapq.heappop(self._heap)
+            timeout = (self._heap[0][0] - time.time()) if self._heap else None
+            if timeout is None or timeout > 0:
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
 
-def job_name_close(gid: str) -> str:
-    return f"GW_CLOSE|{gid}"
+            entry = heapq.heappop(self._heap)
+            key = entry[2]
+            M_JOB_LAG.observe(key[0], time.time() - entry[0])
+            if self._entries.get(key) is entry:
+                del self._entries[key]
+            task = asyncio.get_running_loop().create_task(self._fire(key, entry[3]))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _fire(self, key: tuple[str, str], callback):
+        try:
+            await callback(self.app, key[1])
+        except Exception as exc:
+            # hand it to the app's error handlers (PTB logs the traceback when none are registered)
+            try:
+                await self.app.process_error(None, exc)
+            except Exception:
+                pass
+
+TICKER = Ticker()
+
+def tick_context(app: Application) -> ContextTypes.DEFAULT_TYPE:
+    return app.context_types.context(application=app)
+
+def spread_due(giveaway_id: str, delay: float) -> float:
+    # fixed per-giveaway phase inside the second, so concurrent giveaways
+    # don't all edit at the same instant
+    phase = (zlib.crc32(giveaway_id.encode()) % 1000) / 1000
+    now = time.time()
+    due = math.floor(now + delay) + phase
+    return due if due >= now else due + 1
+
+# ---- adaptive refresh policy ----
+# The join post is refreshed slowly while the end is far away and every second
+# near the end. A refresh is never delayed past the next progress-bar block, and
+# joins pull the next refresh forward (at most one edit per min interval).
+JOIN_REFRESH_POLICY: dict[str, tuple[int, int]] = {}
+JOIN_POST_LAST_TS: dict[str, float] = {}
+
+def refresh_policy_key(gid: str) -> str:
+    return f"refresh:{gid}"
+
+def parse_refresh_policy(raw: Optional[str]) -> tuple[int, int]:
+    lo, hi = CFG.JOIN_REFRESH_MIN, CFG.JOIN_REFRESH_MAX
+    if raw:
+        try:
+            a, b = [int(x) for x in raw.split(",", 1)]
+            lo, hi = a, b
+        except ValueError:
+            pass
+    lo = max(1, lo)
+    return lo, max(lo, hi)
+
+def join_bar_blocks(elapsed: int, total: int) -> int:
+    total = total if total > 0 else 1
+    elapsed = max(0, min(total, elapsed))
+    return progress_filled(int((elapsed / total) * 100), 10)
+
+def join_refresh_delay(remaining: int, total: int, lo: int, hi: int) -> int:
+    if remaining <= 0:
+        return 1
+    # ~30 refreshes over the remaining time: per minute far out, per second at the end
+    delay = max(lo, min(hi, remaining // 30))
+    delay = max(1, min(delay, remaining))
+
+    # bring it forward to the exact second the progress bar gains a block
+    elapsed = total - remaining
+    cur = join_bar_blocks(elapsed, total)
+    if join_bar_blocks(elapsed + delay, total) != cur:
+        a, b = 1, delay
+        while a < b:
+            mid = (a + b) // 2
+            if join_bar_blocks(elapsed + mid, total) != cur:
+                b = mid
+            else:
+                a = mid + 1
+        delay = a
+    return delay
+
+def schedule_join_tick(app: Application, giveaway_id: str, delay: float):
+    due = spread_due(giveaway_id, delay) if delay > 0 else time.time()
+    pending = TICKER.due(TICK_JOIN, giveaway_id)
+    if pending is not None and pending <= due:
+        return  # an earlier refresh is already pending
+    TICKER.schedule(TICK_JOIN, giveaway_id, due, giveaway_tick)
+
+def drop_join_tick(giveaway_id: str):
+    TICKER.cancel(TICK_JOIN, giveaway_id)
+    JOIN_POST_LAST_TS.pop(giveaway_id, None)
+    JOIN_REFRESH_POLICY.pop(giveaway_id, None)
+
+async def load_refresh_policy(giveaway_id: str) -> tuple[int, int]:
+    pol = JOIN_REFRESH_POLICY.get(giveaway_id)
+    if pol is None:
+        pol = parse_refresh_policy(await db.get_setting(refresh_policy_key(giveaway_id), None))
+        JOIN_REFRESH_POLICY[giveaway_id] = pol
+    return pol
+
+async def request_join_refresh(context: ContextTypes.DEFAULT_TYPE, giveaway_id: str):
+    # participant count changed: refresh now unless the post was edited < min interval ago
+    lo, _ = await load_refresh_policy(giveaway_id)
+    wait = lo - (time.time() - JOIN_POST_LAST_TS.get(giveaway_id, 0))
+    if wait <= 0:
+        JOIN_POST_LAST_TS[giveaway_id] = time.time()  # claim the slot before awaiting
+        await refresh_join_post(context, giveaway_id)
+    else:
+        schedule_join_tick(context.application, giveaway_id, wait)
 
 async def schedule_giveaway_jobs(app: Application, giveaway_id: str):
     g = await db.get_giveaway(giveaway_id)
     if not g or g["status"] != "ACTIVE":
         return
 
-    # Remove old jobs with same names (best effort)
-    for j in list(app.job_queue.jobs()):
-        if j.name in (job_name_tick(giveaway_id), job_name_close(giveaway_id)):
-            try:
-                j.schedule_removal()
-            except Exception:
-                pass
+    TICKER.start(app)
 
-    # Tick update every 5 seconds
-    app.job_queue.run_repeating(
-        giveaway_tick_job,
-        interval=5,
-        first=0,
-        name=job_name_tick(giveaway_id),
-        data={"giveaway_id": giveaway_id},
-    )
+    # Replaces any pending tick/close for this giveaway
+    drop_join_tick(giveaway_id)
 
-    # Close at remaining time
-    remaining = int(g["ends_ts"]) - now_ts()
-    if remaining < 0:
-        remaining = 0
-    app.job_queue.run_once(
-        giveaway_close_job,
-        when=remaining,
-        name=job_name_close(giveaway_id),
-        data={"giveaway_id": giveaway_id},
-    )
+    # Tick update (adaptive, reschedules itself)
+    await load_refresh_policy(giveaway_id)
+    schedule_join_tick(app, giveaway_id, 0)
 
-async def giveaway_tick_job(context: ContextTypes.DEFAULT_TYPE):
-    gid = context.job.data["giveaway_id"]
+    # Close exactly at ends_ts
+    TICKER.schedule(TICK_CLOSE, giveaway_id, float(g["ends_ts"]), giveaway_close)
+
+async def giveaway_tick(app: Application, gid: str):
     g = await db.get_giveaway(gid)
     if not g or g["status"] != "ACTIVE":
-        try:
-            context.job.schedule_removal()
-        except Exception:
-            pass
+        drop_join_tick(gid)
         return
-    await refresh_join_post(context, gid)
+    try:
+        await refresh_join_post(tick_context(app), gid, g=g)
+    finally:
+        lo, hi = await load_refresh_policy(gid)
+        remaining = int(g["ends_ts"]) - now_ts()
+        if remaining > 0:
+            schedule_join_tick(app, gid, join_refresh_delay(remaining, int(g["duration_seconds"]), lo, hi))
 
-async def giveaway_close_job(context: ContextTypes.DEFAULT_TYPE):
-    gid = context.job.data["giveaway_id"]
-    await close_giveaway_and_maybe_start_selection(context, gid, forced=False)
+async def giveaway_close(app: Application, gid: str):
+    await close_giveaway_and_maybe_start_selection(tick_context(app), gid, forced=False)
 
 # =========================================================
 # REFRESH JOIN POST (LIVE)
 # =========================================================
-async def refresh_join_post(context: ContextTypes.DEFAULT_TYPE, giveaway_id: str):
-    g = await db.get_giveaway(giveaway_id)
+async def refresh_join_post(context: ContextTypes.DEFAULT_TYPE, giveaway_id: str, g: Optional[dict[str, Any]] = None):
+    if g is None:
+        g = await db.get_giveaway(giveaway_id)
     if not g or not g.get("channel_post_msg_id"):
         return
+    JOIN_POST_LAST_TS[giveaway_id] = time.time()
 
     participants = await db.count_participants(giveaway_id)
     now = now_ts()
@@ -1003,187 +1658,545 @@ async def refresh_join_post(context: ContextTypes.DEFAULT_TYPE, giveaway_id: str
 # SELECTION ENGINE (10 MINUTES, 5/7/9 SHOW, RANDOM WINNERS)
 # =========================================================
 async def start_selection(context: ContextTypes.DEFAULT_TYPE, giveaway_id: str, manual_flow: bool):
-    g = await db.get_giveaway(giveaway_id)
-    if not g:
-        return
+    async with GW_LOCKS.hold(giveaway_id):
+        g = await db.get_giveaway(giveaway_id)
+        if not g or giveaway_id in SELECTIONS:
+            return
 
-    await db.update_giveaway_fields(giveaway_id, status="SELECTING")
+        await db.update_giveaway_fields(giveaway_id, status="SELECTING")
+        drop_joined(giveaway_id)
 
-    participants = await db.list_participants(giveaway_id)
+        duration = 10 * 60
+        sel_end_ts = now_ts() + duration
+        await db.set_setting(f"sel_end:{giveaway_id}", str(sel_end_ts))
+        await db.set_setting(f"manual_flow:{giveaway_id}", "1" if manual_flow else "0")
+        await db.lucky_init(giveaway_id)
 
-    # Username required
-    eligible = [p for p in participants if p.get("username")]
+        # initial selection post
+        show_lines = [
+            "🟡 Now Showing → @username | 🆔 0000000000  ",
+            "🟠 Now Showing → @username | 🆔 0000000000  ",
+            "⚫ Now Showing → @username | 🆔 0000000000  ",
+        ]
+        text = selection_post(
+            hosted_title=g["hosted_by"],
+            prize=g["prize"],
+            winners_selected=0,
+            total_winners=int(g["total_winners"]),
+            pct=0,
+            bar=progress_bar(0, 10),
+            time_remaining=fmt_mmss(duration),
+            show_lines=show_lines,
+        )
+        msg = await context.application.bot.send_message(
+            chat_id=CFG.MAIN_CHANNEL_ID,
+            text=text,
+            reply_markup=kb_selection_buttons(giveaway_id),
+            disable_web_page_preview=True,
+        )
+        try:
+            await context.application.bot.pin_chat_message(
+                chat_id=CFG.MAIN_CHANNEL_ID,
+                message_id=msg.message_id,
+                disable_notification=True,
+            )
+        except Exception:
+            pass
 
-    # Old winner SKIP mode
-    if g["old_winner_mode"] == "SKIP":
-        hist = await db.list_winner_history(limit=2000)
-        old_ids = {h["user_id"] for h in hist}
-        eligible = [p for p in eligible if p["user_id"] not in old_ids]
+        await db.update_giveaway_fields(giveaway_id, selection_post_msg_id=msg.message_id)
 
-    # Strict cycle list (one-by-one)
-    cycle = [{"user_id": p["user_id"], "username": p["username"]} for p in eligible]
+        LUCKY_SLOTS.pop(giveaway_id, None)
+        await load_lucky_slot(giveaway_id)
 
-    duration = 10 * 60
-    sel_end_ts = now_ts() + duration
-    await db.set_setting(f"sel_end:{giveaway_id}", str(sel_end_ts))
-    await db.set_setting(f"manual_flow:{giveaway_id}", "1" if manual_flow else "0")
-    await db.lucky_init(giveaway_id)
+        # frames are driven by the shared ticker
+        run = await new_selection_run(g, sel_end_ts)
+        await save_selection_state(run)
+        SELECTIONS[giveaway_id] = run
+        TICKER.start(context.application)
+        schedule_selection_frame(giveaway_id, 0)
 
-    # initial selection post
-    show_lines = [
-        "🟡 Now Showing → @username | 🆔 0000000000  ",
-        "🟠 Now Showing → @username | 🆔 0000000000  ",
-        "⚫ Now Showing → @username | 🆔 0000000000  ",
-    ]
-    text = selection_post(
-        hosted_title=g["hosted_by"],
+async def new_selection_run(g: dict[str, Any], sel_end_ts: int) -> "SelectionRun":
+    # eligible pool + showcase cycle, built once for the whole selection
+    giveaway_id = g["giveaway_id"]
+    winners = await db.list_winners(giveaway_id)
+    others = sum(1 for w in winners if int(w["rank"]) >= 1)
+    pool, cycle, first = await build_eligible_pool(g, int(g["total_winners"]) - others)
+    # all remaining winners are drawn now; frames only reveal them on schedule
+    plan = plan_reveals(pool, int(g["total_winners"]) - others, now_ts(), sel_end_ts)
+    return SelectionRun(
+        giveaway_id,
+        cycle,
+        sel_end_ts,
+        pool=pool,
+        first=first,
         prize=g["prize"],
-        winners_selected=0,
+        skip_old=(g["old_winner_mode"] == "SKIP"),
+        winner_ids={int(w["user_id"]) for w in winners},
+        next_rank=max([int(w["rank"]) for w in winners], default=0) + 1,
+        plan=plan,
+        selected=others,
+        title=g["hosted_by"],
         total_winners=int(g["total_winners"]),
-        pct=0,
-        bar=progress_bar(0, 10),
-        time_remaining=fmt_mmss(duration),
-        show_lines=show_lines,
-    )
-    msg = await context.application.bot.send_message(
-        chat_id=CFG.MAIN_CHANNEL_ID,
-        text=text,
-        reply_markup=kb_selection_buttons(giveaway_id),
-        disable_web_page_preview=True,
     )
-    try:
-        await context.application.bot.pin_chat_message(
-            chat_id=CFG.MAIN_CHANNEL_ID,
-            message_id=msg.message_id,
-            disable_notification=True,
-        )
-    except Exception:
-        pass
-
-    await db.update_giveaway_fields(giveaway_id, selection_post_msg_id=msg.message_id)
-
-    # run loop as background task
-    context.application.create_task(selection_loop(context, giveaway_id, cycle, sel_end_ts))
-
-async def selection_loop(context: ContextTypes.DEFAULT_TYPE, giveaway_id: str, cycle: list[dict], sel_end_ts: int):
-    idx = 0
-
-    last1 = 0
-    last2 = 0
-    last3 = 0
-    row1 = None
-    row2 = None
-    row3 = None
-
-    total = 10 * 60
-
-    while True:
-        now = now_ts()
-        remaining = sel_end_ts - now
-        if remaining <= 0:
-            break
-
-        elapsed = total - remaining
-        pct = int((elapsed / total) * 100)
-        bar = progress_bar(pct, 10)
-
-        # rotate rows
-        if now - last1 >= 5:
-            row1, idx = next_cycle_item(cycle, idx)
-            last1 = now
-        if now - last2 >= 7:
-            row2, idx = next_cycle_item(cycle, idx)
-            last2 = now
-        if now - last3 >= 9:
-            row3, idx = next_cycle_item(cycle, idx)
-            last3 = now
-
-        colors = pick_three_distinct_colors()
-        show_lines = []
-        if row1:
-            show_lines.append(f"{colors[0]} Now Showing → {row1[0]} | 🆔 {row1[1]}  ")
-        if row2:
-            show_lines.append(f"{colors[1]} Now Showing → {row2[0]} | 🆔 {row2[1]}  ")
-        if row3:
-            show_lines.append(f"{colors[2]} Now Showing → {row3[0]} | 🆔 {row3[1]}  ")
-
-        # keep exactly 3 lines in display (if cycle empty, show placeholders)
-        while len(show_lines) < 3:
-            pad = pick_three_distinct_colors()[0]
-            show_lines.append(f"{pad} Now Showing → @username | 🆔 0000000000  ")
-
-        # pick winners progressively with real random timing
-        await maybe_pick_next_winner(context, giveaway_id)
-
-        await refresh_selection_post(
-            context,
-            giveaway_id,
-            pct=pct,
-            bar=bar,
-            remaining=remaining,
-            show_lines=show_lines,
-        )
 
-        await asyncio.sleep(1)
+class EligiblePool:
+    # (user_id, username) entries with O(1) add, remove and uniform random pick
+    # (swap-with-last removal keeps the list dense)
 
-    await finish_selection(context, giveaway_id)
+    def __init__(self, entries=()):
+        self.items: list[tuple[int, str]] = []
+        self.pos: dict[int, int] = {}
+        for user_id, username in entries:
+            self.add(user_id, username)
 
-def next_cycle_item(cycle: list[dict], idx: int):
-    if not cycle:
-        return None, idx
-    if idx >= len(cycle):
-        idx = 0
-    item = cycle[idx]
-    idx += 1
-    return (item["username"], int(item["user_id"])), idx
+    def __len__(self) -> int:
+        return len(self.items)
 
-async def maybe_pick_next_winner(context: ContextTypes.DEFAULT_TYPE, giveaway_id: str):
-    g = await db.get_giveaway(giveaway_id)
-    if not g:
-        return
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self.pos
 
+    def add(self, user_id: int, username: str):
+        if user_id in self.pos:
+            return
+        self.pos[user_id] = len(self.items)
+        self.items.append((user_id, username))
+
+    def discard(self, user_id: int) -> bool:
+        i = self.pos.pop(user_id, None)
+        if i is None:
+            return False
+        last = self.items.pop()
+        if i < len(self.items):
+            self.items[i] = last
+            self.pos[last[0]] = i
+        return True
+
+    def pop_random(self) -> Optional[tuple[int, str]]:
+        if not self.items:
+            return None
+        item = self.items[random.randrange(len(self.items))]
+        self.discard(item[0])
+        return item
+
+class Reservoir:
+    # uniform sample of up to `size` items from a stream of unknown length (Algorithm R)
+
+    def __init__(self, size: int):
+        self.size = size
+        self.items: list = []
+        self.seen = 0
+
+    def offer(self, item):
+        self.seen += 1
+        if len(self.items) < self.size:
+            self.items.append(item)
+            return
+        j = random.randrange(self.seen)
+        if j < self.size:
+            self.items[j] = item
+
+# streamed pools keep this many spare entries beyond the winners to draw
+# (ban redraws, lucky-slot returns)
+POOL_SPARE = 256
+
+async def build_eligible_pool(g: dict[str, Any], k: int = 0):
+    # eligible: has @username, not banned, not an old winner (SKIP mode), not already a winner.
+    # Returns (pool, showcase cycle, first-join champion still to be added or None).
+    # Big giveaways stream instead; their pool is a uniform sample of k + POOL_SPARE.
+    giveaway_id = g["giveaway_id"]
+    if await db.count_participants(giveaway_id) > CFG.DRAW_STREAM_ABOVE:
+        return await stream_eligible_pool(g, k)
+    participants = await db.list_participants(giveaway_id)
+    banned = await db.banned_user_ids()
+    old_ids = await db.winner_history_user_ids() if g["old_winner_mode"] == "SKIP" else set()
     winners = await db.list_winners(giveaway_id)
+    w_ids = {int(w["user_id"]) for w in winners}
 
-    # ensure first join champion (rank 0) if exists AND has username
-    participants = await db.list_participants(giveaway_id)
     first = next((p for p in participants if int(p.get("is_first_join", 0)) == 1 and p.get("username")), None)
-    if first:
-        exists = any(w["rank"] == 0 and w["user_id"] == first["user_id"] for w in winners)
-        if not exists:
-            await db.add_winner(giveaway_id, int(first["user_id"]), first["username"], rank=0)
-            await db.insert_winner_history(giveaway_id, int(first["user_id"]), first["username"], g["prize"])
+    first_entry = (int(first["user_id"]), first["username"]) if first else None
+    if first_entry and any(int(w["rank"]) == 0 and int(w["user_id"]) == first_entry[0] for w in winners):
+        first_entry = None
+
+    cycle = [
+        (int(p["user_id"]), p["username"])
+        for p in participants
+        if p.get("username") and int(p["user_id"]) not in banned and int(p["user_id"]) not in old_ids
+    ]
+    champion_id = int(first["user_id"]) if first else None
+    pool = EligiblePool(e for e in cycle if e[0] not in w_ids and e[0] != champion_id)
+    return pool, cycle, first_entry
 
+async def stream_eligible_pool(g: dict[str, Any], k: int):
+    # same rules as build_eligible_pool, one pass over a DB cursor, bounded memory
+    giveaway_id = g["giveaway_id"]
     winners = await db.list_winners(giveaway_id)
+    w_ids = {int(w["user_id"]) for w in winners}
 
-    # total winners for OTHER winners = total_winners
-    other = [w for w in winners if int(w["rank"]) >= 1]
-    if len(other) >= int(g["total_winners"]):
-        return
+    first = await db.get_first_joiner(giveaway_id)
+    if first and not first.get("username"):
+        first = None
+    first_entry = (int(first["user_id"]), first["username"]) if first else None
+    if first_entry and any(int(w["rank"]) == 0 and int(w["user_id"]) == first_entry[0] for w in winners):
+        first_entry = None
+    champion_id = int(first["user_id"]) if first else None
+
+    picks = Reservoir(max(0, k) + POOL_SPARE)
+    show = Reservoir(SHOWCASE_PAGE)
+    async for entry in db.iter_eligible_participants(giveaway_id, g["old_winner_mode"] == "SKIP"):
+        show.offer(entry)
+        if entry[0] not in w_ids and entry[0] != champion_id:
+            picks.offer(entry)
+    return EligiblePool(picks.items), show.items, first_entry
+
+# no reveals in the first / last seconds of the selection
+REVEAL_MARGIN = 10
+
+def plan_reveals(pool: EligiblePool, k: int, start_ts: int, end_ts: int) -> list[tuple[int, int, str]]:
+    # sample k winners without replacement (they leave the pool) and give each a
+    # random reveal time; returns [(reveal_ts, user_id, username)] sorted by time
+    picks = [pool.pop_random() for _ in range(max(0, min(k, len(pool))))]
+    lo = start_ts + REVEAL_MARGIN
+    hi = max(lo, end_ts - REVEAL_MARGIN)
+    times = sorted(random.randint(lo, hi) for _ in picks)
+    return [(t, user_id, username) for t, (user_id, username) in zip(times, picks)]
+
+@dataclass
+class SelectionRun:
+    giveaway_id: str
+    cycle: list[tuple[int, str]]
+    sel_end_ts: int
+    pool: Optional[EligiblePool] = field(default_factory=EligiblePool)  # None after a resume until needed
+    first: Optional[tuple[int, str]] = None  # champion not yet written as rank 0
+    prize: str = ""
+    skip_old: bool = False
+    winner_ids: set[int] = field(default_factory=set)
+    next_rank: int = 1
+    plan: list[tuple[int, int, str]] = field(default_factory=list)  # (reveal_ts, user_id, username)
+    revealed: int = 0     # plan[:revealed] are written
+    saved_ts: int = 0
+    idx: int = 0
+    last: list[int] = field(default_factory=lambda: [0, 0, 0])
+    rows: list = field(default_factory=lambda: [None, None, None])
+    colors: list[str] = field(default_factory=pick_three_distinct_colors)  # kept until the row rotates
+    selected: int = 0         # winners with rank >= 1 written so far
+    title: str = ""
+    total_winners: int = 0
+    post_msg_id: int = 0      # looked up on the first frame
+    frame: Optional[tuple] = None  # visible state of the last edit
+    edit_ts: int = 0
+
+SELECTIONS: dict[str, SelectionRun] = {}
 
-    # random timing probability per second (finishes naturally within 10 minutes)
-    target = max(1, int(g["total_winners"]))
-    p = min(0.30, max(0.03, target / 600))
+# =========================================================
+# SELECTION STATE (PERSIST + RESUME)
+# =========================================================
+# settings["sel_state:<gid>"] holds everything a restart needs except the pool:
+# deadline, reveal plan, revealed count, ranks, pending champion, showcase cursor.
+SHOWCASE_PAGE = 400          # enough rows to rotate through a whole selection
+SEL_STATE_SAVE_EVERY = 30    # seconds between cursor-only saves
+
+def sel_state_key(giveaway_id: str) -> str:
+    return f"sel_state:{giveaway_id}"
+
+async def save_selection_state(run: SelectionRun):
+    show_uid = run.cycle[run.idx % len(run.cycle)][0] if run.cycle else None
+    state = {
+        "v": 1,
+        "sel_end": run.sel_end_ts,
+        "prize": run.prize,
+        "skip_old": run.skip_old,
+        "first": run.first,
+        "next_rank": run.next_rank,
+        "plan": run.plan,
+        "revealed": run.revealed,
+        "show_uid": show_uid,
+    }
+    run.saved_ts = now_ts()
+    await db.set_setting(sel_state_key(run.giveaway_id), json.dumps(state, ensure_ascii=False, separators=(",", ":")))
+
+async def restore_selection_run(g: dict[str, Any]) -> Optional[SelectionRun]:
+    giveaway_id = g["giveaway_id"]
+    raw = await db.get_setting(sel_state_key(giveaway_id), None)
+    if not raw:
+        return None
+    st = json.loads(raw)
+    winners = await db.list_winners(giveaway_id)
+    winner_ids = {int(w["user_id"]) for w in winners}
+    plan = [(int(t), int(u), n) for t, u, n in st.get("plan", [])]
+    revealed = int(st.get("revealed", 0))
+    # a crash between writing a winner and saving the state must not reveal twice
+    while revealed < len(plan) and plan[revealed][1] in winner_ids:
+        revealed += 1
+    first = tuple(st["first"]) if st.get("first") else None
+    if first and any(int(w["rank"]) == 0 for w in winners):
+        first = None
+    skip_old = bool(st.get("skip_old"))
+    cycle = await db.showcase_page(giveaway_id, st.get("show_uid"), SHOWCASE_PAGE, skip_old)
+    return SelectionRun(
+        giveaway_id,
+        cycle,
+        int(st["sel_end"]),
+        pool=None,
+        first=first,
+        prize=st.get("prize", g["prize"]),
+        skip_old=skip_old,
+        winner_ids=winner_ids,
+        next_rank=max(int(st.get("next_rank", 1)), max([int(w["rank"]) for w in winners], default=0) + 1),
+        plan=plan,
+        revealed=revealed,
+        selected=sum(1 for w in winners if int(w["rank"]) >= 1),
+        title=g["hosted_by"],
+        total_winners=int(g["total_winners"]),
+    )
+
+async def ensure_pool(run: SelectionRun) -> EligiblePool:
+    # resumed runs rebuild the pool only when something needs it (a ban redraw)
+    if run.pool is None:
+        g = await db.get_giveaway(run.giveaway_id)
+        pool, _, _ = await build_eligible_pool(g)
+        for _, uid, _ in run.plan[run.revealed:]:
+            pool.discard(uid)
+        run.pool = pool
+    return run.pool
+
+async def resume_selection(app: Application, g: dict[str, Any]):
+    giveaway_id = g["giveaway_id"]
+    async with GW_LOCKS.hold(giveaway_id):
+        if giveaway_id in SELECTIONS:
+            return
+        run = await restore_selection_run(g)
+        if run is None:
+            # no saved state: draw again, keeping the original deadline and post
+            sel_end = int(await db.get_setting(f"sel_end:{giveaway_id}", "0") or 0) or now_ts() + 10 * 60
+            run = await new_selection_run(g, sel_end)
+            await save_selection_state(run)
+        SELECTIONS[giveaway_id] = run
+        await load_lucky_slot(giveaway_id)
+    TICKER.start(app)
+    schedule_selection_frame(giveaway_id, 0)
+
+def schedule_selection_frame(giveaway_id: str, delay: float = 1):
+    TICKER.schedule(TICK_SELECTION, giveaway_id, spread_due(giveaway_id, delay), selection_frame)
+
+# ---- frame renderer ----
+# A frame is the visible state of the selection post. The post is edited only
+# when the frame differs from the last one sent, and frames are scheduled at
+# the next moment something can change: a showcase row rotation, the next
+# progress percent, a planned reveal. The clock is not part of the frame
+# (it refreshes with every edit), except around the Lucky Draw mark where
+# people time their clicks by it.
+SELECTION_SECONDS = 10 * 60
+SHOWCASE_EVERY = (5, 7, 9)   # seconds between rotations of showcase rows 1..3
+LUCKY_REMAINING = 355        # Lucky Draw opens at Time Remaining 05:55
+LUCKY_CLOCK_LEAD = 15        # seconds before it during which the clock ticks every second
+
+def frame_interval() -> int:
+    return max(1, math.ceil(1 / CFG.SELECTION_MAX_FPS))
+
+def selection_pct(remaining: int) -> int:
+    return int(((SELECTION_SECONDS - remaining) / SELECTION_SECONDS) * 100)
+
+def clock_in_frame(remaining: int) -> bool:
+    return LUCKY_REMAINING - 2 <= remaining <= LUCKY_REMAINING + LUCKY_CLOCK_LEAD
+
+def frame_key(run: SelectionRun, remaining: int) -> tuple:
+    clock = remaining if clock_in_frame(remaining) else None
+    return (selection_pct(remaining), run.selected, tuple(run.rows), tuple(run.colors), clock)
+
+def next_frame_at(run: SelectionRun, now: int) -> int:
+    # earliest second at which the frame can differ from the current one
+    remaining = run.sel_end_ts - now
+    start = run.sel_end_ts - SELECTION_SECONDS
+    cands = [run.last[i] + every for i, every in enumerate(SHOWCASE_EVERY)]
+    cands.append(start + math.ceil((selection_pct(remaining) + 1) * SELECTION_SECONDS / 100))
+    if run.revealed < len(run.plan):
+        cands.append(run.plan[run.revealed][0])
+    cands.append(run.sel_end_ts - LUCKY_REMAINING - LUCKY_CLOCK_LEAD)
+    if clock_in_frame(remaining - 1):
+        cands.append(now + 1)
+    cands.append(run.sel_end_ts)
+    return min([c for c in cands if c > now], default=now + 1)
+
+def rotate_showcase(run: SelectionRun, now: int):
+    # rows whose time has come move on; a moved row gets a color the others don't show
+    for i, every in enumerate(SHOWCASE_EVERY):
+        if now - run.last[i] >= every:
+            run.rows[i], run.idx = next_cycle_item(run.cycle, run.idx)
+            run.colors[i] = random.choice([c for c in SHOWCASE_COLORS if c not in run.colors])
+            run.last[i] = now
+
+def selection_frame_text(run: SelectionRun, remaining: int) -> str:
+    pct = selection_pct(remaining)
+    show_lines = []
+    for color, row in zip(run.colors, run.rows):
+        if row:
+            show_lines.append(f"{color} Now Showing → {row[0]} | 🆔 {row[1]}  ")
+        else:
+            show_lines.append(f"{color} Now Showing → @username | 🆔 0000000000  ")
+    return selection_post(
+        hosted_title=run.title,
+        prize=run.prize,
+        winners_selected=run.selected,
+        total_winners=run.total_winners,
+        pct=pct,
+        bar=progress_bar(pct, 10),
+        time_remaining=fmt_mmss(max(0, remaining)),
+        show_lines=show_lines,
+    )
 
-    if random.random() > p:
+async def emit_selection_frame(context: ContextTypes.DEFAULT_TYPE, run: SelectionRun, remaining: int):
+    frame = frame_key(run, remaining)
+    if frame == run.frame:
         return
+    if not run.post_msg_id:
+        g = await db.get_giveaway(run.giveaway_id)
+        run.post_msg_id = int((g or {}).get("selection_post_msg_id") or 0)
+        if not run.post_msg_id:
+            return
+    await safe_edit_message(
+        context.application,
+        chat_id=CFG.MAIN_CHANNEL_ID,
+        message_id=run.post_msg_id,
+        text=selection_frame_text(run, remaining),
+        reply_markup=kb_selection_buttons(run.giveaway_id),
+    )
+    run.frame = frame
+    run.edit_ts = now_ts()
 
-    participants = await db.list_participants(giveaway_id)
+def request_selection_frame(giveaway_id: str):
+    # visible state changed off schedule (lucky winner): next frame as soon as the rate allows
+    run = SELECTIONS.get(giveaway_id)
+    if run is None:
+        return
+    delay = max(0, frame_interval() - (now_ts() - run.edit_ts))
+    due = TICKER.due(TICK_SELECTION, giveaway_id)
+    if due is None or due > time.time() + delay:
+        schedule_selection_frame(giveaway_id, delay)
 
-    eligible = [p for p in participants if p.get("username")]  # username required
-    if g["old_winner_mode"] == "SKIP":
-        hist = await db.list_winner_history(limit=5000)
-        old_ids = {h["user_id"] for h in hist}
-        eligible = [p for p in eligible if int(p["user_id"]) not in old_ids]
+async def selection_frame(app: Application, giveaway_id: str):
+    run = SELECTIONS.get(giveaway_id)
+    if run is None:
+        return
+    context = tick_context(app)
 
-    w_ids = {int(w["user_id"]) for w in winners}
-    eligible = [p for p in eligible if int(p["user_id"]) not in w_ids]
-    if not eligible:
+    now = now_ts()
+    remaining = run.sel_end_ts - now
+    if remaining <= 0:
+        # anything a missed frame did not reveal still makes the list
+        await reveal_due_winners(context, giveaway_id, upto=math.inf)
+        SELECTIONS.pop(giveaway_id, None)
+        await db.delete_setting(sel_state_key(giveaway_id))
+        await finish_selection(context, giveaway_id)
         return
 
-    pick = random.choice(eligible)
-    next_rank = max([int(w["rank"]) for w in winners], default=0) + 1
-    await db.add_winner(giveaway_id, int(pick["user_id"]), pick["username"], rank=next_rank)
-    await db.insert_winner_history(giveaway_id, int(pick["user_id"]), pick["username"], g["prize"])
+    delay = 1
+    try:
+        rotate_showcase(run, now)
+
+        # reveal winners whose planned time has come
+        await reveal_due_winners(context, giveaway_id)
+        if now - run.saved_ts >= SEL_STATE_SAVE_EVERY:
+            await save_selection_state(run)
+
+        edited = run.edit_ts
+        await emit_selection_frame(context, run, remaining)
+        delay = next_frame_at(run, now) - now
+        if run.edit_ts != edited:
+            delay = max(delay, frame_interval())
+    finally:
+        if giveaway_id in SELECTIONS:
+            # keep an earlier frame someone requested while this one ran
+            due = TICKER.due(TICK_SELECTION, giveaway_id)
+            if due is None or due > time.time() + delay:
+                schedule_selection_frame(giveaway_id, delay)
+
+def next_cycle_item(cycle: list[tuple[int, str]], idx: int):
+    if not cycle:
+        return None, idx
+    if idx >= len(cycle):
+        idx = 0
+    user_id, username = cycle[idx]
+    idx += 1
+    return (username, user_id), idx
+
+async def reveal_due_winners(context: ContextTypes.DEFAULT_TYPE, giveaway_id: str, upto: Optional[float] = None):
+    run = SELECTIONS.get(giveaway_id)
+    if run is None:
+        return
+    upto = now_ts() if upto is None else upto
+    due = run.revealed < len(run.plan) and run.plan[run.revealed][0] <= upto
+    if run.first is None and not due:
+        return  # nothing scheduled yet: no lock, no DB
+
+    async with GW_LOCKS.hold(giveaway_id):
+        # first join champion (rank 0) if exists AND has username
+        if run.first is not None:
+            user_id, username = run.first
+            run.first = None
+            await db.add_winner(giveaway_id, user_id, username, rank=0)
+            await db.insert_winner_history(giveaway_id, user_id, username, run.prize)
+            run.winner_ids.add(user_id)
+
+        while run.revealed < len(run.plan) and run.plan[run.revealed][0] <= upto:
+            _, user_id, username = run.plan[run.revealed]
+            run.revealed += 1
+            rank = run.next_rank
+            run.next_rank += 1
+            run.selected += 1
+            run.winner_ids.add(user_id)
+            await db.add_winner(giveaway_id, user_id, username, rank=rank)
+            await db.insert_winner_history(giveaway_id, user_id, username, run.prize)
+
+        await save_selection_state(run)
+
+def plan_take_slot(run: SelectionRun, user_id: int):
+    # a lucky winner uses up one planned slot: their own if they were planned,
+    # otherwise the last unrevealed one (that user goes back to the pool)
+    pending = run.plan[run.revealed:]
+    for i, (_, uid, _) in enumerate(pending):
+        if uid == user_id:
+            del run.plan[run.revealed + i]
+            return
+    if pending:
+        _, uid, uname = run.plan.pop()
+        if run.pool is not None:
+            run.pool.add(uid, uname)
+
+async def pool_discard_everywhere(user_id: int):
+    # banned mid-selection: no longer eligible in any running selection;
+    # an unrevealed planned win is redrawn for the same reveal time
+    for run in list(SELECTIONS.values()):
+        if run.pool is not None:
+            run.pool.discard(user_id)
+        for i in range(run.revealed, len(run.plan)):
+            ts, uid, _ = run.plan[i]
+            if uid != user_id:
+                continue
+            pool = await ensure_pool(run)
+            pool.discard(user_id)
+            repl = pool.pop_random()
+            if repl is None:
+                del run.plan[i]
+            else:
+                run.plan[i] = (ts, repl[0], repl[1])
+            await save_selection_state(run)
+            break
+
+async def pool_restore_everywhere(user_id: int):
+    # unbanned mid-selection: eligible again if the usual rules allow it
+    for gid, run in list(SELECTIONS.items()):
+        if run.pool is None:
+            continue  # a lazily rebuilt pool already applies the current bans
+        if user_id in run.winner_ids or user_id in run.pool:
+            continue
+        if any(uid == user_id for _, uid, _ in run.plan[run.revealed:]):
+            continue
+        p = await db.get_participant(gid, user_id)
+        if not p or not p.get("username"):
+            continue
+        if run.skip_old and await db.has_won_before(user_id):
+            continue
+        run.pool.add(user_id, p["username"])
 
 async def refresh_selection_post(
     context: ContextTypes.DEFAULT_TYPE,
@@ -1221,26 +2234,27 @@ async def refresh_selection_post(
     )
 
 async def finish_selection(context: ContextTypes.DEFAULT_TYPE, giveaway_id: str):
-    manual_flow = (await db.get_setting(f"manual_flow:{giveaway_id}", "0")) == "1"
+    async with GW_LOCKS.hold(giveaway_id):
+        manual_flow = (await db.get_setting(f"manual_flow:{giveaway_id}", "0")) == "1"
 
-    if manual_flow:
-        kb = InlineKeyboardMarkup(
-            [
+        if manual_flow:
+            kb = InlineKeyboardMarkup(
                 [
-                    InlineKeyboardButton("✅ APPROVE & POST WINNERS", callback_data=f"MANUALAPPROVE|{giveaway_id}"),
-                    InlineKeyboardButton("❌ REJECT", callback_data=f"MANUALREJECT|{giveaway_id}"),
+                    [
+                        InlineKeyboardButton("✅ APPROVE & POST WINNERS", callback_data=f"MANUALAPPROVE|{giveaway_id}"),
+                        InlineKeyboardButton("❌ REJECT", callback_data=f"MANUALREJECT|{giveaway_id}"),
+                    ]
                 ]
-            ]
-        )
-        admin_id = CFG.ADMIN_IDS[0]
-        await context.application.bot.send_message(
-            chat_id=admin_id,
-            text=f"Manual selection finished for Giveaway ID: {giveaway_id}\n\nChoose what to do:",
-            reply_markup=kb,
-        )
-        return
+            )
+            admin_id = CFG.ADMIN_IDS[0]
+            await context.application.bot.send_message(
+                chat_id=admin_id,
+                text=f"Manual selection finished for Giveaway ID: {giveaway_id}\n\nChoose what to do:",
+                reply_markup=kb,
+            )
+            return
 
-    await post_winners_and_cleanup(context, giveaway_id)
+        await post_winners_and_cleanup(context, giveaway_id)
 
 # =========================================================
 # WINNERS POST + CLEANUP + CLAIM POSTS
@@ -1283,66 +2297,200 @@ async def build_winners_post_text_and_kb(giveaway_id: str):
     return text, kb_claim(giveaway_id, 1)
 
 async def post_winners_and_cleanup(context: ContextTypes.DEFAULT_TYPE, giveaway_id: str):
-    g = await db.get_giveaway(giveaway_id)
-    if not g:
-        return
-
-    # delete close + selection posts
-    if g.get("close_post_msg_id"):
-        try:
-            await context.application.bot.delete_message(chat_id=CFG.MAIN_CHANNEL_ID, message_id=int(g["close_post_msg_id"]))
-        except Exception:
-            pass
-    if g.get("selection_post_msg_id"):
-        try:
-            await context.application.bot.delete_message(chat_id=CFG.MAIN_CHANNEL_ID, message_id=int(g["selection_post_msg_id"]))
-        except Exception:
-            pass
+    async with GW_LOCKS.hold(giveaway_id):
+        g = await db.get_giveaway(giveaway_id)
+        if not g or g["status"] == "ANNOUNCED":
+            return
 
-    txt, kb = await build_winners_post_text_and_kb(giveaway_id)
-    msg = await context.application.bot.send_message(
-        chat_id=CFG.MAIN_CHANNEL_ID,
-        text=txt,
-        reply_markup=kb,
-        disable_web_page_preview=True,
-    )
-    try:
-        await context.application.bot.pin_chat_message(chat_id=CFG.MAIN_CHANNEL_ID, message_id=msg.message_id, disable_notification=True)
-    except Exception:
-        pass
+        bot = context.application.bot
+        txt, kb = await build_winners_post_text_and_kb(giveaway_id)
 
-    await db.update_giveaway_fields(giveaway_id, winners_post_msg_id=msg.message_id, status="ANNOUNCED")
+        # round 1: winners post + delete close/selection posts
+        calls = [
+            bot.send_message(
+                chat_id=CFG.MAIN_CHANNEL_ID,
+                text=txt,
+                reply_markup=kb,
+                disable_web_page_preview=True,
+            )
+        ]
+        for key in ("close_post_msg_id", "selection_post_msg_id"):
+            if g.get(key):
+                calls.append(bot.delete_message(chat_id=CFG.MAIN_CHANNEL_ID, message_id=int(g[key])))
+        msg = (await fan_out(*calls))[0]
+        if isinstance(msg, Exception):
+            raise msg
+
+        # round 2: pin it, save it, separate claim post (keeps only last 5);
+        # the claim post goes after the winners post so channel order is kept
+        results = await fan_out(
+            bot.pin_chat_message(chat_id=CFG.MAIN_CHANNEL_ID, message_id=msg.message_id, disable_notification=True),
+            db.update_giveaway_fields(giveaway_id, winners_post_msg_id=msg.message_id, status="ANNOUNCED"),
+            create_claim_post_and_keep_last_5(context, giveaway_id),
+        )
+        for err in results[1:]:
+            if isinstance(err, Exception):
+                raise err
 
-    # create separate claim post and keep only last 5
-    await create_claim_post_and_keep_last_5(context, giveaway_id)
+# =========================================================
+# JOINED INDEX (REPEAT JOIN CLICKS FROM MEMORY)
+# =========================================================
+# While a giveaway is ACTIVE its joined user_ids live here, so repeat JOIN
+# clicks (people checking it worked) are answered without touching the DB.
+# Loaded under the giveaway lock, which also serializes inserts.
+@dataclass
+class JoinedSet:
+    user_ids: set[int] = field(default_factory=set)
+    first_id: Optional[int] = None
+    count: int = 0  # participant rows; unlike user_ids, not reduced by bans
+
+JOINED: dict[str, JoinedSet] = {}
+JOIN_STATS = {"hits": 0, "misses": 0}
+
+async def load_joined(giveaway_id: str):
+    async with GW_LOCKS.hold(giveaway_id):
+        ids, first = await db.participant_ids(giveaway_id)
+        JOINED[giveaway_id] = JoinedSet(ids, first, len(ids))
+
+def drop_joined(giveaway_id: str):
+    JOINED.pop(giveaway_id, None)
+
+def joined_forget(user_id: int):
+    # banned: their next click takes the DB path (and gets the ban popup)
+    for js in JOINED.values():
+        js.user_ids.discard(user_id)
+
+def join_stats_line() -> str:
+    hits, misses = JOIN_STATS["hits"], JOIN_STATS["misses"]
+    total = hits + misses
+    rate = (100 * hits / total) if total else 0.0
+    return f"JOIN clicks from memory: {hits}/{total} ({rate:.1f}%)"
 
 # =========================================================
 # CLOSE GIVEAWAY
 # =========================================================
 async def close_giveaway_and_maybe_start_selection(context: ContextTypes.DEFAULT_TYPE, giveaway_id: str, forced: bool):
-    g = await db.get_giveaway(giveaway_id)
-    if not g:
-        return
-    if g["status"] != "ACTIVE":
-        return
+    async with GW_LOCKS.hold(giveaway_id):
+        g = await db.get_giveaway(giveaway_id)
+        if not g:
+            return
+        if g["status"] != "ACTIVE":
+            return
 
-    # mark closed
-    await db.update_giveaway_fields(giveaway_id, status="CLOSED")
+        # mark closed
+        await db.update_giveaway_fields(giveaway_id, status="CLOSED")
+        drop_joined(giveaway_id)
+        drop_join_tick(giveaway_id)
+        TICKER.cancel(TICK_CLOSE, giveaway_id)
 
-    # post close summary
-    participants_count = await db.count_participants(giveaway_id)
-    close_text = giveaway_closed_post(g["prize"], participants_count, int(g["total_winners"]))
-    msg = await context.application.bot.send_message(
-        chat_id=CFG.MAIN_CHANNEL_ID,
-        text=close_text,
-        disable_web_page_preview=True,
-    )
-    await db.update_giveaway_fields(giveaway_id, close_post_msg_id=msg.message_id)
+        # post close summary
+        participants_count = await db.count_participants(giveaway_id)
+        close_text = giveaway_closed_post(g["prize"], participants_count, int(g["total_winners"]))
+        msg = await context.application.bot.send_message(
+            chat_id=CFG.MAIN_CHANNEL_ID,
+            text=close_text,
+            disable_web_page_preview=True,
+        )
+        await db.update_giveaway_fields(giveaway_id, close_post_msg_id=msg.message_id)
 
-    # If AutoDraw ON -> start selection automatically
-    g2 = await db.get_giveaway(giveaway_id)
-    if g2 and int(g2["autodraw"]) == 1:
-        await start_selection(context, giveaway_id, manual_flow=False)
+        # If AutoDraw ON -> start selection automatically
+        g2 = await db.get_giveaway(giveaway_id)
+        if g2 and int(g2["autodraw"]) == 1:
+            await start_selection(context, giveaway_id, manual_flow=False)
+
+# =========================================================
+# PAGED ADMIN LISTS (KEYSET CURSORS IN CALLBACK DATA)
+# =========================================================
+# callback_data: PG|<kind>|<n=next/p=prev>|<page>|<key1>|<key2>|<giveaway_id or "">
+# The cursor is the last (next) or first (prev) row shown, so every page is one
+# indexed range query and one message is edited in place.
+LIST_PAGE_SIZE = 15
+LIST_TITLES = {"W": "📜 WINNER LIST", "B": "🔒 BLOCK LIST", "P": "👥 PARTICIPANTS"}
+LIST_EMPTY = {"W": "✅ Winner history is empty.", "B": "✅ Block list is empty.", "P": "👥 Participants list is empty."}
+
+def list_row_text(kind: str, n: int, r: dict[str, Any]) -> str:
+    uname = r["username"] or "(no username)"
+    if kind == "W":
+        t = time.localtime(r["ts"])
+        return (
+            f"• Giveaway: {r['giveaway_id']}\n"
+            f"  Prize: {r['prize']}\n"
+            f"  Winner: {uname} | {r['user_id']}\n"
+            f"  Date: {t.tm_mday:02d}-{t.tm_mon:02d}-{t.tm_year}\n"
+        )
+    if kind == "B":
+        return f"• {uname} | {r['user_id']} | {r['reason']}"
+    first = " 🥇" if int(r["is_first_join"] or 0) == 1 else ""
+    return f"{n}. {uname} | User ID: {r['user_id']}{first}"
+
+def list_cursor(kind: str, r: dict[str, Any]) -> str:
+    k1, k2 = DB.PAGES[kind][2]
+    return f"{int(r[k1] or 0)}|{int(r[k2])}"
+
+async def list_page(
+    kind: str, gid: str = "", cursor: Optional[tuple[int, int]] = None, backward: bool = False, page: int = 1
+) -> tuple[str, Optional[InlineKeyboardMarkup]]:
+    rows, more = await db.page(kind, (gid,) if gid else (), cursor, backward, LIST_PAGE_SIZE)
+    if not rows and cursor is not None:
+        # rows around the cursor are gone (unban, reset): start over
+        return await list_page(kind, gid)
+    if not rows:
+        return LIST_EMPTY[kind], None
+    has_prev = more if backward else cursor is not None
+    has_next = True if backward else more
+
+    head = LIST_TITLES[kind] + (f" — {gid}" if gid else "")
+    base = (page - 1) * LIST_PAGE_SIZE
+    body = "\n".join(list_row_text(kind, base + i + 1, r) for i, r in enumerate(rows))
+    text = f"━━━━━━━━━━━━━━━━━━━━\n{head}\n━━━━━━━━━━━━━━━━━━━━\n\n{body}\n\nPage {page}"
+
+    buttons = []
+    if has_prev:
+        buttons.append(InlineKeyboardButton(
+            "⬅️ Prev", callback_data=f"PG|{kind}|p|{page - 1}|{list_cursor(kind, rows[0])}|{gid}"
+        ))
+    if has_next:
+        buttons.append(InlineKeyboardButton(
+            "Next ➡️", callback_data=f"PG|{kind}|n|{page + 1}|{list_cursor(kind, rows[-1])}|{gid}"
+        ))
+    return text, (InlineKeyboardMarkup([buttons]) if buttons else None)
+
+# =========================================================
+# GIVEAWAY ARCHIVE (JSONL.GZ BUNDLE)
+# =========================================================
+# One JSON object per line: a "meta" header, then records tagged by "type",
+# then an "end" trailer with per-type counts (read_archive.py checks them).
+# Tables are streamed batch by batch straight into the gzip file.
+ARCHIVE_FORMAT = "giveaway-archive/1"
+ARCHIVE_QUERIES = (
+    ("participant", "SELECT * FROM participants WHERE giveaway_id=? ORDER BY joined_ts, user_id"),
+    ("winner", "SELECT * FROM winners WHERE giveaway_id=? ORDER BY rank"),
+    ("winner_history", "SELECT * FROM winner_history WHERE giveaway_id=? ORDER BY id"),
+    ("lucky_draw", "SELECT * FROM lucky_draw WHERE giveaway_id=?"),
+    # per-giveaway settings: sel_end / manual_flow / sel_state / refresh
+    ("setting", "SELECT key, value FROM settings WHERE substr(key, instr(key, ':') + 1)=?"),
+)
+
+async def write_giveaway_archive(g: dict[str, Any], path: str) -> dict[str, int]:
+    gid = g["giveaway_id"]
+    counts: dict[str, int] = {}
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        def put(kind: str, row: dict[str, Any]):
+            f.write(json.dumps({"type": kind, **row}, ensure_ascii=False) + "\n")
+            counts[kind] = counts.get(kind, 0) + 1
+
+        f.write(json.dumps({"type": "meta", "format": ARCHIVE_FORMAT, "source": "main",
+                            "giveaway_id": gid, "exported_ts": now_ts()}) + "\n")
+        put("giveaway", g)  # includes the channel/close/selection/winners post message ids
+        for kind, sql in ARCHIVE_QUERIES:
+            async for rows in db.iter_rows(sql, (gid,)):
+                for r in rows:
+                    put(kind, r)
+        for slot in await load_claim_slots():
+            if slot.get("giveaway_id") == gid:
+                put("claim_post", slot)
+        f.write(json.dumps({"type": "end", "counts": counts}) + "\n")
+    return counts
 
 # =========================================================
 # COMMANDS
@@ -1396,6 +2544,59 @@ async def cmd_autodraw(update: Update, context: ContextTypes.DEFAULT_TYPE):
     is_on = bool(int(g["autodraw"]))
     await update.message.reply_text("⚙️ AUTO DRAW", reply_markup=kb_autodraw_toggle(is_on))
 
+async def cmd_refreshrate(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user = update.effective_user
+    if not user or not update.message:
+        return
+    if not is_admin(user.id):
+        return
+    g = await db.get_latest_giveaway()
+    if not g:
+        await update.message.reply_text("No giveaways found.")
+        return
+    gid = g["giveaway_id"]
+    if not context.args:
+        lo, hi = await load_refresh_policy(gid)
+        await update.message.reply_text(
+            f"⏱️ Join post refresh: every {lo}s (near the end) … {hi}s (far from the end)\n"
+            f"Giveaway ID: {gid}\n\n"
+            "Usage: /refreshrate <min_seconds> <max_seconds>"
+        )
+        return
+    if len(context.args) != 2 or not all(a.isdigit() and int(a) > 0 for a in context.args):
+        await update.message.reply_text("Usage: /refreshrate <min_seconds> <max_seconds>")
+        return
+    lo, hi = parse_refresh_policy(f"{context.args[0]},{context.args[1]}")
+    await db.set_setting(refresh_policy_key(gid), f"{lo},{hi}")
+    JOIN_REFRESH_POLICY[gid] = (lo, hi)
+    if g["status"] == "ACTIVE":
+        schedule_join_tick(context.application, gid, 0)
+    await update.message.reply_text(f"✅ Refresh rate set: {lo}s … {hi}s\nGiveaway ID: {gid}")
+
+async def cmd_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user = update.effective_user
+    if not user or not update.message:
+        return
+    if not is_admin(user.id):
+        return
+    app = context.application
+    proc = app.update_processor
+    lines = [
+        "📈 BOT STATS",
+        "",
+        f"Concurrency cap: {proc.max_concurrent_updates}",
+        f"Queue depth: {queue_depth(app)}",
+    ]
+    if isinstance(proc, GaugedUpdateProcessor):
+        lines.append(f"In flight: {proc.in_flight} (peak {proc.peak_in_flight})")
+        lines.append(f"Processed: {proc.processed}")
+    for req in HTTP_POOLS:
+        lines.append(req.stats_line())
+    lines.append(join_stats_line())
+    lines.append(CLICK_GATE.stats_line())
+    lines.append(f"Active selections: {len(SELECTIONS)}")
+    await update.message.reply_text("\n".join(lines))
+
 async def cmd_draw(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
     if not user or not update.message:
@@ -1435,12 +2636,86 @@ async def cmd_participants(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     if not is_admin(user.id):
         return
-    g = await db.get_latest_giveaway()
+    args = list(context.args or [])
+    export = bool(args) and args[0].lower() == "export"
+    if export:
+        args = args[1:]
+    gz = "gz" in (a.lower() for a in args)
+    args = [a for a in args if a.lower() != "gz"]
+    g = await db.get_giveaway(args[0]) if args else await db.get_latest_giveaway()
     if not g:
-        await update.message.reply_text("No giveaways found.")
+        await update.message.reply_text("Giveaway not found." if args else "No giveaways found.")
+        return
+    if export:
+        await send_participants_csv(update, g, gz)
         return
     n = await db.count_participants(g["giveaway_id"])
-    await update.message.reply_text(f"👥 Total Participants: {n}\nGiveaway ID: {g['giveaway_id']}")
+    await update.message.reply_text(
+        f"👥 Total Participants: {n}\nGiveaway ID: {g['giveaway_id']}\n\n"
+        "Full list: /participants export [giveaway_id] [gz]"
+    )
+    if n:
+        text, kb = await list_page("P", g["giveaway_id"])
+        await update.message.reply_text(text, reply_markup=kb)
+
+PARTICIPANTS_CSV_HEADER = ("user_id", "username", "joined_ts", "joined_utc", "first_join", "status")
+
+async def write_participants_csv(g: dict[str, Any], path: str, gz: bool) -> int:
+    # one DB batch in memory at a time; rows go straight to the (gzip) file
+    opener = gzip.open if gz else open
+    n = 0
+    with opener(path, "wt", encoding="utf-8", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(PARTICIPANTS_CSV_HEADER)
+        async for rows in db.iter_participant_audit(g["giveaway_id"], g["old_winner_mode"] == "SKIP"):
+            w.writerows(
+                (uid, uname or "", ts, time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(ts)), first, status)
+                for uid, uname, ts, first, status in rows
+            )
+            n += len(rows)
+    return n
+
+async def reply_temp_document(update: Update, filename: str, build):
+    # build(path) writes the file and returns the caption; the file is gone after the upload
+    fd, path = tempfile.mkstemp(suffix="-" + filename)
+    os.close(fd)
+    try:
+        caption = await build(path)
+        with open(path, "rb") as f:
+            await update.message.reply_document(document=f, filename=filename, caption=caption)
+    finally:
+        with contextlib.suppress(OSError):
+            os.remove(path)
+
+async def send_participants_csv(update: Update, g: dict[str, Any], gz: bool):
+    gid = g["giveaway_id"]
+
+    async def build(path: str) -> str:
+        n = await write_participants_csv(g, path, gz)
+        return f"👥 Participants: {n}\nGiveaway ID: {gid}"
+
+    await reply_temp_document(update, f"participants_{gid}.csv" + (".gz" if gz else ""), build)
+
+async def cmd_export(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user = update.effective_user
+    if not user or not update.message:
+        return
+    if not is_admin(user.id):
+        return
+    if not context.args:
+        await update.message.reply_text("Usage: /export <giveaway_id>")
+        return
+    g = await db.get_giveaway(context.args[0])
+    if not g:
+        await update.message.reply_text("Giveaway not found.")
+        return
+    gid = g["giveaway_id"]
+
+    async def build(path: str) -> str:
+        counts = await write_giveaway_archive(g, path)
+        return f"🗄 Archive: {gid}\n" + ", ".join(f"{k}: {v}" for k, v in counts.items())
+
+    await reply_temp_document(update, f"giveaway_{gid}.jsonl.gz", build)
 
 # ---- block system ----
 async def cmd_blockpermanent(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -1472,6 +2747,8 @@ async def cmd_unban(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     uid = int(context.args[0])
     ok = await db.remove_ban(uid)
+    if ok:
+        await pool_restore_everywhere(uid)
     await update.message.reply_text("✅ Unbanned." if ok else "⚠️ User was not banned.")
 
 async def cmd_blocklist(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -1480,15 +2757,8 @@ async def cmd_blocklist(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     if not is_admin(user.id):
         return
-    bans = await db.list_bans()
-    if not bans:
-        await update.message.reply_text("✅ Block list is empty.")
-        return
-    lines = []
-    for uid, uname, reason, ts in bans[:80]:
-        uname = uname or "(no username)"
-        lines.append(f"• {uname} | {uid} | {reason}")
-    await update.message.reply_text("━━━━━━━━━━━━━━━━━━━━\n🔒 BLOCK LIST\n━━━━━━━━━━━━━━━━━━━━\n\n" + "\n".join(lines))
+    text, kb = await list_page("B")
+    await update.message.reply_text(text, reply_markup=kb)
 
 async def cmd_removeban(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await cmd_unban(update, context)
@@ -1516,25 +2786,8 @@ async def cmd_winnerlist(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     if not is_admin(user.id):
         return
-    hist = await db.list_winner_history(limit=50)
-    if not hist:
-        await update.message.reply_text("✅ Winner history is empty.")
-        return
-
-    def fmt_date(ts: int) -> str:
-        t = time.localtime(ts)
-        return f"{t.tm_mday:02d}-{t.tm_mon:02d}-{t.tm_year}"
-
-    lines = []
-    for r in hist:
-        uname = r["username"] or "(no username)"
-        lines.append(
-            f"• Giveaway: {r['giveaway_id']}\n"
-            f"  Prize: {r['prize']}\n"
-            f"  Winner: {uname} | {r['user_id']}\n"
-            f"  Date: {fmt_date(r['ts'])}\n"
-        )
-    await update.message.reply_text("━━━━━━━━━━━━━━━━━━━━\n📜 WINNER LIST (LAST 50)\n━━━━━━━━━━━━━━━━━━━━\n\n" + "\n".join(lines))
+    text, kb = await list_page("W")
+    await update.message.reply_text(text, reply_markup=kb)
 
 # ---- reset ----
 async def cmd_reset(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -1560,9 +2813,29 @@ async def cmd_reset(update: Update, context: ContextTypes.DEFAULT_TYPE):
 # =========================================================
 # TEXT HANDLER (ADMIN FLOWS)
 # =========================================================
+def text_flow(user_id: int) -> str:
+    # which admin flow a text message feeds (same order as handle_text)
+    if STATE_BLOCKWAIT.get(user_id):
+        return "block"
+    if user_id in STATE_RESET:
+        return "reset"
+    if user_id in STATE_DELIVERY:
+        return "delivery"
+    if user_id in STATE_NEW:
+        return "newgiveaway"
+    return "none"
+
 async def on_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not update.message or not update.effective_user:
         return
+    flow = text_flow(update.effective_user.id)
+    t0 = time.perf_counter()
+    try:
+        await handle_text(update, context)
+    finally:
+        M_TEXT.observe(flow, time.perf_counter() - t0)
+
+async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
     text = (update.message.text or "").strip()
 
@@ -1572,6 +2845,8 @@ async def on_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
         added = 0
         for uname, uid in entries:
             await db.add_ban(uid, uname, "Permanent block")
+            joined_forget(uid)
+            await pool_discard_everywhere(uid)
             added += 1
         STATE_BLOCKWAIT.pop(user.id, None)
         await update.message.reply_text(f"✅ Added to permanent block list: {added}")
@@ -1587,6 +2862,8 @@ async def on_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 await safe_edit_message(context.application, msg.chat_id, msg.message_id, f"🧹 Resetting: {pct}%\n📊 Progress: {bar}")
                 await asyncio.sleep(1)
             await db.reset_all()
+            LUCKY_SLOTS.clear()
+            JOINED.clear()
             STATE_RESET.pop(user.id, None)
             await update.message.reply_text("✅ Reset completed successfully. Bot is now fully clean.")
         else:
@@ -1762,21 +3039,167 @@ async def on_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
             return
 
 # =========================================================
-# CALLBACK HANDLER
+# CLICK GATE (RATE LIMIT, IN-FLIGHT DEDUPE, LOAD SHEDDING)
 # =========================================================
+# Runs before on_callback does any work. Admins always pass. JOIN and TRYLUCK
+# are never shed: they are answered from memory, and in a storm the earliest
+# clicks are the ones that win the first-join and Lucky Draw prizes.
+SHED_EXEMPT_ACTIONS = frozenset({"JOIN", "TRYLUCK"})
+
+class ClickGate:
+    PRUNE_ABOVE = 50_000
+
+    def __init__(self, rate: float, burst: int, shed_depth: int):
+        self.rate = rate
+        self.burst = float(burst)
+        self.shed_depth = shed_depth
+        self.buckets: dict[tuple[int, str], list[float]] = {}  # (uid, action) -> [tokens, ts]
+        self.next_prune = 0.0
+        self.in_flight: set[tuple[int, str]] = set()
+        self.passed = 0
+        self.shed = 0
+        self.limited = 0
+        self.dupes = 0
+
+    def _take(self, key: tuple[int, str], now: float) -> bool:
+        b = self.buckets.get(key)
+        if b is None:
+            if len(self.buckets) >= self.PRUNE_ABOVE and now >= self.next_prune:
+                self._prune(now)
+            b = self.buckets[key] = [self.burst, now]
+        b[0] = min(self.burst, b[0] + (now - b[1]) * self.rate)
+        b[1] = now
+        if b[0] < 1:
+            return False
+        b[0] -= 1
+        return True
+
+    def _prune(self, now: float):
+        # a bucket that has refilled is the same as no bucket; at most one scan
+        # per refill period, so a storm of new users doesn't rescan on every click
+        full = (self.burst / self.rate)
+        for key in [k for k, b in self.buckets.items() if now - b[1] >= full]:
+            del self.buckets[key]
+        self.next_prune = now + full
+
+    def check(self, key: tuple[int, str], depth: int) -> Optional[str]:
+        # None = let it through (caller must release(key)); else "shed"/"dupe"/"limited"
+        if self.shed_depth and depth > self.shed_depth and key[1] not in SHED_EXEMPT_ACTIONS:
+            self.shed += 1
+            return "shed"
+        if key in self.in_flight:
+            self.dupes += 1
+            return "dupe"
+        if not self._take(key, time.monotonic()):
+            self.limited += 1
+            return "limited"
+        self.in_flight.add(key)
+        self.passed += 1
+        return None
+
+    def release(self, key: tuple[int, str]):
+        self.in_flight.discard(key)
+
+    def stats_line(self) -> str:
+        return f"Clicks: passed {self.passed} · shed {self.shed} · limited {self.limited} · dupes {self.dupes}"
+
+CLICK_GATE = ClickGate(CFG.CLICK_RATE, CFG.CLICK_BURST, CFG.CLICK_SHED_DEPTH)
+
+# callback_data is client-sent: anything unknown is one "other" action, so it can
+# neither mint new gate buckets/metric labels nor leak into the metrics text
+CALLBACK_ACTIONS = frozenset({
+    "ADMIN_AUTODRAW", "ADMIN_DRAW", "ADMIN_NEWGIVEAWAY", "ADMIN_PRIZEDELIVERY", "ADMIN_RESET",
+    "ADMIN_WINNERLIST", "AUTODRAW_OFF", "AUTODRAW_ON", "CLAIM", "ENTRYRULE", "GW_APPROVE",
+    "GW_REJECT", "JOIN", "MANUALAPPROVE", "MANUALREJECT", "PG", "TRYLUCK",
+})
+
+def click_action(data: str) -> str:
+    action = data.split("|", 1)[0]
+    return action if action in CALLBACK_ACTIONS else "other"
+
 async def on_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     q = update.callback_query
     if not q or not q.from_user:
         return
-    data = q.data or ""
-    user = q.from_user
+    t0 = time.perf_counter()
+    try:
+        await gated_callback(update, context)
+    finally:
+        M_CALLBACK.observe(click_action(q.data or ""), time.perf_counter() - t0)
+
+async def gated_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    q = update.callback_query
+    if is_admin(q.from_user.id):
+        await handle_callback(update, context)
+        return
+    key = (q.from_user.id, click_action(q.data or ""))
+    verdict = CLICK_GATE.check(key, queue_depth(context.application))
+    if verdict is not None:
+        try:
+            if verdict == "shed":
+                await q.answer("⏳ Bot is busy right now, please try again in a moment.", show_alert=True)
+            elif verdict == "limited":
+                await q.answer("⏳ Too many clicks, please slow down.")
+            else:
+                await q.answer()  # the first click's answer is on its way
+        except Exception:
+            pass
+        return
+    try:
+        await handle_callback(update, context)
+    finally:
+        CLICK_GATE.release(key)
+
+# =========================================================
+# CALLBACK HANDLER
+# =========================================================
+# Telegram accepts one answer per callback query. These actions answer with
+# an alert as soon as its text is known; slow follow-up work (post refresh,
+# winner/history writes) runs after the answer as a background task.
+POPUP_ACTIONS = ("JOIN|", "CLAIM|", "ENTRYRULE|", "TRYLUCK|")
 
-    # Default answer
+async def answer_popup(q, text: str):
     try:
-        await q.answer()
+        await q.answer(text, show_alert=True)
     except Exception:
         pass
 
+def after_answer(context: ContextTypes.DEFAULT_TYPE, coro):
+    context.application.create_task(coro)
+
+async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    q = update.callback_query
+    if not q or not q.from_user:
+        return
+    data = q.data or ""
+    user = q.from_user
+
+    # Popup actions answer exactly once, with their alert; everything else is acknowledged now
+    if not data.startswith(POPUP_ACTIONS):
+        try:
+            await q.answer()
+        except Exception:
+            pass
+
+    # Paged admin lists: edit the same message in place
+    if data.startswith("PG|"):
+        if not is_admin(user.id):
+            return
+        try:
+            _, kind, way, page, k1, k2, gid = data.split("|", 6)
+            cursor = (int(k1), int(k2))
+            page_no = max(1, int(page))
+        except ValueError:
+            return
+        if kind not in DB.PAGES:
+            return
+        text, kb = await list_page(kind, gid, cursor, way == "p", page_no)
+        try:
+            await q.edit_message_text(text, reply_markup=kb)
+        except Exception:
+            pass
+        return
+
     # Admin panel buttons
     if data == "ADMIN_NEWGIVEAWAY":
         if not is_admin(user.id):
@@ -1876,6 +3299,7 @@ async def on_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
         await db.create_giveaway(gdata)
         await db.lucky_init(gid)
+        JOINED[gid] = JoinedSet()
 
         # post join message to main channel
         rules_lines = [x.strip() for x in st["rules"].splitlines() if x.strip()]
@@ -1938,56 +3362,85 @@ async def on_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # Join
     if data.startswith("JOIN|"):
         gid = data.split("|", 1)[1]
+
+        # repeat click on an ACTIVE giveaway: answered from memory
+        js = JOINED.get(gid)
+        if js is not None and user.id in js.user_ids:
+            JOIN_STATS["hits"] += 1
+            if user.id == js.first_id:
+                uname = f"@{user.username}" if user.username else "User"
+                await answer_popup(q, popup_first_join(uname, user.id, CFG.GROUP_USERNAME))
+            else:
+                await answer_popup(q, popup_already_joined())
+            return
+        JOIN_STATS["misses"] += 1
+
         g = await db.get_giveaway(gid)
         if not g or g["status"] != "ACTIVE":
-            await q.answer("This giveaway is not active.", show_alert=True)
+            await answer_popup(q, "This giveaway is not active.")
             return
 
         # Ban check
         if await db.is_banned(user.id):
-            await q.answer("⛔ You are permanently blocked from this system.", show_alert=True)
+            await answer_popup(q, "⛔ You are permanently blocked from this system.")
             return
 
         # Old winner BLOCK mode (by history)
         if g["old_winner_mode"] == "BLOCK":
             hist = await db.list_winner_history(limit=5000)
             if any(int(h["user_id"]) == user.id for h in hist):
-                await q.answer(
+                await answer_popup(
+                    q,
                     "🚫You have already won a previous giveaway.\n"
                     "To keep the giveaway fair for everyone,\n"
                     "repeat winners are restricted from participating.\n"
                     "🙏Please wait for the next Giveaway",
-                    show_alert=True
                 )
                 return
 
         already = await db.get_participant(gid, user.id)
         if already:
+            if js is not None:
+                js.user_ids.add(user.id)
             # if user is first join champion, show first join pop-up again
             if int(already.get("is_first_join", 0)) == 1:
                 uname = f"@{user.username}" if user.username else "User"
-                await q.answer(popup_first_join(uname, user.id, CFG.GROUP_USERNAME), show_alert=True)
+                await answer_popup(q, popup_first_join(uname, user.id, CFG.GROUP_USERNAME))
             else:
-                await q.answer(popup_already_joined(), show_alert=True)
+                await answer_popup(q, popup_already_joined())
             return
 
         uname = f"@{user.username}" if user.username else None
         # allow join even without username (but they will be excluded from selection as rule says)
-        pcount = await db.count_participants(gid)
-        is_first = (pcount == 0)
-
-        ok = await db.add_participant(gid, user.id, uname, is_first=is_first)
+        async with GW_LOCKS.hold(gid):
+            # serialized with close: re-check status, then first-join + insert
+            g = await db.get_giveaway(gid)
+            if not g or g["status"] != "ACTIVE":
+                await answer_popup(q, "This giveaway is not active.")
+                return
+            js = JOINED.get(gid)
+            if js is not None:
+                is_first = js.first_id is None and not js.user_ids
+            else:
+                is_first = (await db.count_participants(gid)) == 0
+
+            ok = await db.add_participant(gid, user.id, uname, is_first=is_first)
+            if ok and js is not None:
+                js.user_ids.add(user.id)
+                js.count += 1
+                if is_first:
+                    js.first_id = user.id
         if not ok:
-            await q.answer(popup_already_joined(), show_alert=True)
+            await answer_popup(q, popup_already_joined())
             return
 
-        # refresh join post right now
-        await refresh_join_post(context, gid)
-
         if is_first:
-            await q.answer(popup_first_join(uname or "User", user.id, CFG.GROUP_USERNAME), show_alert=True)
+            await answer_popup(q, popup_first_join(uname or "User", user.id, CFG.GROUP_USERNAME))
         else:
-            await q.answer(popup_join_success(), show_alert=True)
+            await answer_popup(q, popup_join_success())
+
+        # participant count changed -> refresh join post (coalesced)
+        after_answer(context, request_join_refresh(context, gid))
         return
 
     # Claim
@@ -1995,7 +3448,7 @@ async def on_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         _, gid, slot = data.split("|", 2)
         g = await db.get_giveaway(gid)
         if not g:
-            await q.answer("Invalid giveaway.", show_alert=True)
+            await answer_popup(q, "Invalid giveaway.")
             return
 
         now = now_ts()
@@ -2007,97 +3460,151 @@ async def on_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
         if expired_24h:
             if w:
-                await q.answer(popup_expired(CFG.OWNER_USERNAME), show_alert=True)
+                await answer_popup(q, popup_expired(CFG.OWNER_USERNAME))
             else:
-                await q.answer(popup_giveaway_completed(CFG.OWNER_USERNAME), show_alert=True)
+                await answer_popup(q, popup_giveaway_completed(CFG.OWNER_USERNAME))
             return
 
         if not w:
-            await q.answer(popup_not_winner(), show_alert=True)
+            await answer_popup(q, popup_not_winner())
             return
 
         uname = w.get("username") or (f"@{user.username}" if user.username else "User")
 
         if int(w.get("delivered", 0)) == 1:
-            await q.answer(popup_prize_delivered(uname, user.id, CFG.OWNER_USERNAME), show_alert=True)
+            await answer_popup(q, popup_prize_delivered(uname, user.id, CFG.OWNER_USERNAME))
             return
 
-        await db.set_claimed_ts(gid, user.id)
-        await q.answer(popup_claim_ok(uname, user.id, CFG.OWNER_USERNAME), show_alert=True)
+        await answer_popup(q, popup_claim_ok(uname, user.id, CFG.OWNER_USERNAME))
+        after_answer(context, db.set_claimed_ts(gid, user.id))
         return
 
     # Entry Rule
     if data.startswith("ENTRYRULE|"):
-        await q.answer(entry_rule_popup(), show_alert=True)
+        await answer_popup(q, entry_rule_popup())
         return
 
     # Try Your Luck
     if data.startswith("TRYLUCK|"):
         gid = data.split("|", 1)[1]
-        g = await db.get_giveaway(gid)
-        if not g:
-            await q.answer("Invalid giveaway.", show_alert=True)
+        slot = LUCKY_SLOTS.get(gid) or await load_lucky_slot(gid)
+        if slot is None:
+            await answer_popup(q, "Invalid giveaway.")
             return
 
-        participants = await db.list_participants(gid)
-        if not participants:
-            await q.answer(lucky_no_participants(), show_alert=True)
+        if not slot.has_entries:
+            await answer_popup(q, lucky_no_participants())
             return
 
         uname = f"@{user.username}" if user.username else None
         if not uname:
-            await q.answer("A valid @username is required for Lucky Draw.", show_alert=True)
+            await answer_popup(q, "A valid @username is required for Lucky Draw.")
             return
 
-        sel_end = await db.get_setting(f"sel_end:{gid}", None)
-        if not sel_end:
-            await q.answer("Lucky Draw is not available right now.", show_alert=True)
+        if slot.open_ts is None:
+            await answer_popup(q, "Lucky Draw is not available right now.")
             return
 
         # Lucky Draw must be at Time Remaining 05:55 (355 seconds)
-        remaining = int(sel_end) - now_ts()
-
         # Robust: allow remaining 355 or 354 (network delays) while still being "05:55"
-        allowed_window = remaining in (355, 354)
+        allowed_window = slot.open_ts <= now_ts() <= slot.open_ts + 1
 
-        lucky = await db.lucky_get(gid)
         if not allowed_window:
             # if already winner exists, show TOO LATE with winner
-            if lucky and lucky.get("winner_user_id"):
-                await q.answer(too_late_popup(lucky["winner_username"], int(lucky["winner_user_id"])), show_alert=True)
+            if slot.winner:
+                await answer_popup(q, too_late_popup(slot.winner[1], slot.winner[0]))
             else:
-                await q.answer(try_luck_not_time(), show_alert=True)
+                await answer_popup(q, try_luck_not_time())
             return
 
-        ok = await db.lucky_set_winner(gid, user.id, uname)
-        lucky = await db.lucky_get(gid)
-
-        if ok:
-            # add as extra winner (last rank)
-            winners = await db.list_winners(gid)
-            max_rank = max([int(w["rank"]) for w in winners], default=0)
-            await db.add_winner(gid, user.id, uname, rank=max_rank + 1)
-            await db.insert_winner_history(gid, user.id, uname, g["prize"])
-
-            # refresh selection post instantly
-            try:
-                await force_refresh_selection_display(context, gid)
-            except Exception:
-                pass
-
-            await q.answer(lucky_winner_popup(uname, user.id), show_alert=True)
+        # compare-and-set with no await in between: exactly one click wins
+        if slot.winner is None:
+            slot.winner = (user.id, uname)
+            await answer_popup(q, lucky_winner_popup(uname, user.id))
+            after_answer(context, persist_lucky_winner(context, slot, user.id, uname))
             return
 
         # too late
-        if lucky and lucky.get("winner_user_id"):
-            await q.answer(too_late_popup(lucky["winner_username"], int(lucky["winner_user_id"])), show_alert=True)
-        else:
-            await q.answer("⚠️ TOO LATE\n\nSomeone already won the Lucky Draw slot.", show_alert=True)
+        await answer_popup(q, too_late_popup(slot.winner[1], slot.winner[0]))
         return
 
+# =========================================================
+# LUCKY DRAW SLOT (IN-MEMORY ARBITRATION)
+# =========================================================
+# Everyone clicks at 05:55 at once, so the slot is decided in memory: window,
+# prize and "has entries" are loaded once per giveaway, the winner is taken by
+# a check-and-set on the event loop, and only the winner's click writes to the
+# DB (after its popup). Losers are answered with no DB I/O at all.
+@dataclass
+class LuckySlot:
+    giveaway_id: str
+    open_ts: Optional[int]   # first second of the window; None before the selection
+    has_entries: bool
+    prize: str
+    winner: Optional[tuple[int, str]] = None
+
+LUCKY_SLOTS: dict[str, LuckySlot] = {}
+
+async def load_lucky_slot(giveaway_id: str) -> Optional[LuckySlot]:
+    g = await db.get_giveaway(giveaway_id)
+    if not g:
+        return None
+    sel_end = await db.get_setting(f"sel_end:{giveaway_id}", None)
+    lucky = await db.lucky_get(giveaway_id)
+    slot = LuckySlot(
+        giveaway_id,
+        open_ts=int(sel_end) - LUCKY_REMAINING if sel_end else None,
+        has_entries=await db.count_participants(giveaway_id) > 0,
+        prize=g["prize"],
+        winner=(int(lucky["winner_user_id"]), lucky["winner_username"]) if lucky and lucky.get("winner_user_id") else None,
+    )
+    if slot.open_ts is None:
+        return slot  # not cached: entries and window are still moving
+    # concurrent loads must end up sharing one slot
+    return LUCKY_SLOTS.setdefault(giveaway_id, slot)
+
+async def persist_lucky_winner(context: ContextTypes.DEFAULT_TYPE, slot: LuckySlot, user_id: int, username: str):
+    # the conditional UPDATE still guards the row (e.g. against a second process)
+    if await db.lucky_set_winner(slot.giveaway_id, user_id, username):
+        await add_lucky_winner(context, slot.giveaway_id, user_id, username, slot.prize)
+        return
+    # lost the row: later clicks must be told about the winner that is actually stored
+    lucky = await db.lucky_get(slot.giveaway_id)
+    stored = (int(lucky["winner_user_id"]), lucky["winner_username"]) if lucky and lucky.get("winner_user_id") else None
+    if slot.winner == (user_id, username):
+        slot.winner = stored
+
 # =========================================================
 # FORCE REFRESH SELECTION DISPLAY (WHEN LUCKY WINNER ADDED)
 # =========================================================
+async def add_lucky_winner(context: ContextTypes.DEFAULT_TYPE, giveaway_id: str, user_id: int, username: str, prize: str):
+    async with GW_LOCKS.hold(giveaway_id):
+        # add as extra winner (last rank)
+        run = SELECTIONS.get(giveaway_id)
+        if run is not None:
+            rank = run.next_rank
+            run.next_rank += 1
+            run.selected += 1
+            run.winner_ids.add(user_id)
+            if run.pool is not None:
+                run.pool.discard(user_id)
+            plan_take_slot(run, user_id)
+            await save_selection_state(run)
+        else:
+            winners = await db.list_winners(giveaway_id)
+            rank = max([int(w["rank"]) for w in winners], default=0) + 1
+        await db.add_winner(giveaway_id, user_id, username, rank=rank)
+        await db.insert_winner_history(giveaway_id, user_id, username, prize)
+
+    # refresh selection post instantly (the running selection renders it next frame)
+    if giveaway_id in SELECTIONS:
+        request_selection_frame(giveaway_id)
+        return
+    try:
+        await force_refresh_selection_display(context, giveaway_id)
+    except Exception:
+        pass
+
 async def force_refresh_selection_display(context: ContextTypes.DEFAULT_TYPE, giveaway_id: str):
     g = await db.get_giveaway(giveaway_id)
     if not g or not g.get("selection_post_msg_id"):
@@ -2142,15 +3649,92 @@ async def resume_active_giveaways(app: Application):
     actives = await db.list_active_giveaways()
     for g in actives:
         gid = g["giveaway_id"]
+        await load_joined(gid)
         await schedule_giveaway_jobs(app, gid)
 
+    # selections interrupted by a restart continue where they left off
+    for g in await db.list_selecting_giveaways():
+        await resume_selection(app, g)
+
+# =========================================================
+# METRICS ENDPOINT
+# =========================================================
+# GET /metrics on METRICS_LISTEN:METRICS_PORT (http.server on a side thread).
+# Gauges are read at scrape time; nothing here runs per update.
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+def render_metrics(app: Application) -> str:
+    out: list[str] = []
+    for fam in METRIC_FAMILIES:
+        fam.render(out)
+
+    def gauge(name: str, help_text: str, samples: list[tuple[str, Any]]):
+        out.append(f"# HELP {name} {help_text}")
+        out.append(f"# TYPE {name} gauge")
+        for labels, value in samples:
+            out.append(f"{name}{labels} {value}")
+
+    proc = app.update_processor
+    gauge("giveaway_update_queue_depth", "Updates fetched but not yet running.", [("", queue_depth(app))])
+    if isinstance(proc, GaugedUpdateProcessor):
+        gauge("giveaway_updates_in_flight", "Updates being processed.", [("", proc.in_flight)])
+    # ACTIVE giveaways are exactly the JOINED index
+    gauge("giveaway_active_giveaways", "Giveaways accepting joins.", [("", len(JOINED))])
+    gauge("giveaway_participants", "Participants per active giveaway (banned users included).",
+          [(f'{{giveaway_id="{gid}"}}', js.count) for gid, js in sorted(JOINED.items())])
+    gauge("giveaway_selections_running", "Selections in progress.", [("", len(SELECTIONS))])
+
+    out.append("# HELP giveaway_clicks_total Callback clicks by click gate verdict.")
+    out.append("# TYPE giveaway_clicks_total counter")
+    for verdict in ("passed", "shed", "limited", "dupes"):
+        out.append(f'giveaway_clicks_total{{verdict="{verdict}"}} {getattr(CLICK_GATE, verdict)}')
+    return "\n".join(out) + "\n"
+
+async def metrics_text(app: Application) -> str:
+    return render_metrics(app)
+
+def start_metrics_server(app: Application) -> ThreadingHTTPServer:
+    # stdlib HTTP server on its own thread; each scrape renders on the event loop
+    # (the counters are only ever touched there)
+    loop = asyncio.get_running_loop()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?", 1)[0].rstrip("/") != "/metrics":
+                self.send_error(404)
+                return
+            body = asyncio.run_coroutine_threadsafe(metrics_text(app), loop).result(timeout=10).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", METRICS_CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((CFG.METRICS_LISTEN, CFG.METRICS_PORT), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
+
 # =========================================================
 # MAIN
 # =========================================================
 async def main():
     await db.init()
 
-    app = Application.builder().token(CFG.BOT_TOKEN).build()
+    api_request, updates_request = build_requests()
+    builder = (
+        Application.builder()
+        .token(CFG.BOT_TOKEN)
+        .request(api_request)
+        .get_updates_request(updates_request)
+        .concurrent_updates(GaugedUpdateProcessor(CFG.CONCURRENT_UPDATES))
+    )
+    if CFG.TELEGRAM_BASE_URL:
+        builder = builder.base_url(CFG.TELEGRAM_BASE_URL)
+    app = builder.build()
 
     # Commands
     app.add_handler(CommandHandler("start", cmd_start))
@@ -2161,9 +3745,12 @@ async def main():
     app.add_handler(CommandHandler("endgiveaway", cmd_endgiveaway))
     app.add_handler(CommandHandler("draw", cmd_draw))
     app.add_handler(CommandHandler("autodraw", cmd_autodraw))
+    app.add_handler(CommandHandler("refreshrate", cmd_refreshrate))
+    app.add_handler(CommandHandler("stats", cmd_stats))
 
     app.add_handler(CommandHandler("prizedelivered", cmd_prizedelivered))
     app.add_handler(CommandHandler("winnerlist", cmd_winnerlist))
+    app.add_handler(CommandHandler("export", cmd_export))
 
     app.add_handler(CommandHandler("reset", cmd_reset))
 
@@ -2177,10 +3764,42 @@ async def main():
     app.add_handler(CallbackQueryHandler(on_callback))
     app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, on_text))
 
-    # Resume active giveaways on startup
-    await resume_active_giveaways(app)
-
-    await app.run_polling(close_loop=False)
+    async with app:
+        # Resume active giveaways on startup
+        TICKER.start(app)
+        await resume_active_giveaways(app)
+
+        await app.start()
+        if CFG.UPDATE_MODE == "webhook":
+            # never register a webhook without a secret: anyone could post forged
+            # admin updates. Telegram gets the secret from set_webhook, so a fresh
+            # random one per run works when none is configured.
+            secret = CFG.WEBHOOK_SECRET or secrets.token_urlsafe(32)
+            await app.updater.start_webhook(
+                listen=CFG.WEBHOOK_LISTEN,
+                port=CFG.WEBHOOK_PORT,
+                url_path=CFG.WEBHOOK_PATH,
+                webhook_url=f"{CFG.WEBHOOK_URL.rstrip('/')}/{CFG.WEBHOOK_PATH}",
+                secret_token=secret,
+                max_connections=CFG.WEBHOOK_MAX_CONNECTIONS,
+            )
+            print(f"Webhook listening on {CFG.WEBHOOK_LISTEN}:{CFG.WEBHOOK_PORT}/{CFG.WEBHOOK_PATH}"
+                  + ("" if CFG.WEBHOOK_SECRET else " (random secret for this run)"))
+        else:
+            await app.updater.start_polling()
+        metrics_server = None
+        if CFG.METRICS_PORT:
+            metrics_server = start_metrics_server(app)
+            print(f"Metrics on http://{CFG.METRICS_LISTEN}:{CFG.METRICS_PORT}/metrics")
+        try:
+            await asyncio.Event().wait()
+        finally:
+            if metrics_server is not None:
+                await asyncio.to_thread(metrics_server.shutdown)
+                metrics_server.server_close()
+            if app.updater.running:
+                await app.updater.stop()
+            await app.stop()
 
 if __name__ == "__main__":
     asyncio.run(main())
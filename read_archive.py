@@ -0,0 +1,91 @@
+# read_archive.py
+# Offline reader for the /export giveaway bundles (main.py and bot.py).
+# Streams the .jsonl.gz file, checks the meta header and the "end" trailer,
+# and verifies the per-type record counts against the trailer.
+#
+# Usage:
+#   python read_archive.py giveaway_P857-P583-B6714.jsonl.gz
+#   python read_archive.py bundle.jsonl.gz --show winner
+
+import sys
+import zlib
+import gzip
+import json
+import argparse
+
+FORMATS = ("giveaway-archive/1",)
+
+
+def read_archive(path: str, show: str = "") -> list[str]:
+    # returns a list of problems (empty = bundle is complete and consistent)
+    problems = []
+    counts: dict[str, int] = {}
+    meta = None
+    end = None
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for n, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    problems.append(f"line {n}: not JSON")
+                    continue
+                kind = rec.get("type")
+                if end is not None:
+                    problems.append(f"line {n}: record after the end trailer")
+                if kind == "meta":
+                    if meta is not None or n != 1:
+                        problems.append(f"line {n}: meta header not on the first line")
+                    meta = rec
+                elif kind == "end":
+                    end = rec
+                else:
+                    counts[kind] = counts.get(kind, 0) + 1
+                    if show and kind == show:
+                        print(json.dumps(rec, ensure_ascii=False))
+    except (EOFError, OSError, zlib.error, UnicodeDecodeError) as e:
+        # cut-off download or damaged gzip stream: report it like any other problem
+        problems.append(f"unreadable bundle (truncated or corrupt?): {type(e).__name__}: {e}")
+
+    if meta is None:
+        problems.append("missing meta header")
+    elif meta.get("format") not in FORMATS:
+        problems.append(f"unknown format: {meta.get('format')}")
+    if end is None:
+        problems.append("missing end trailer (truncated bundle?)")
+        return problems
+
+    expected = end.get("counts", {}) or {}
+    for kind in sorted(set(expected) | set(counts)):
+        want, got = int(expected.get(kind, 0)), counts.get(kind, 0)
+        mark = "OK" if want == got else "MISMATCH"
+        if not show:
+            print(f"{kind:<16}{got:>10} / {want:<10}{mark}")
+        if want != got:
+            problems.append(f"{kind}: {got} records, trailer says {want}")
+    if counts.get("giveaway", 0) != 1:
+        problems.append(f"expected exactly 1 giveaway record, found {counts.get('giveaway', 0)}")
+    if meta and not show:
+        print(f"giveaway:       {meta.get('giveaway_id')} ({meta.get('source')}, {meta.get('format')})")
+    return problems
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Verify a /export giveaway bundle offline.")
+    ap.add_argument("path", help=".jsonl.gz bundle from /export")
+    ap.add_argument("--show", default="", help="print the records of this type (e.g. winner, participant)")
+    args = ap.parse_args()
+
+    problems = read_archive(args.path, args.show)
+    for p in problems:
+        print(f"ERROR: {p}", file=sys.stderr)
+    if not args.show:
+        print("result:         " + ("OK" if not problems else f"{len(problems)} problem(s)"))
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+# replay_updates.py
+# Posts recorded Telegram Update JSON to main.py's webhook (UPDATE_MODE=webhook)
+# and reports the HTTP ack latency, i.e. webhook ingest/enqueue only. For the
+# click -> popup comparison between polling and webhook use
+#   python loadtest.py --mode polling|webhook
+# which times each click up to its answerCallbackQuery at the fake API.
+#
+# main.py needs WEBHOOK_SECRET set for this (otherwise it picks a random one).
+#
+# Input: JSONL file, one raw Update object per line (as returned by getUpdates).
+# Usage:
+#   python replay_updates.py updates.jsonl --rate 50 --concurrency 8
+#   python replay_updates.py updates.jsonl --url http://127.0.0.1:8443/telegram --secret XYZ --repeat 10
+
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def default_url() -> str:
+    host = os.getenv("WEBHOOK_LISTEN", "127.0.0.1").strip()
+    if host in ("0.0.0.0", "::", ""):
+        host = "127.0.0.1"
+    port = os.getenv("WEBHOOK_PORT", "8443").strip()
+    path = os.getenv("WEBHOOK_PATH", "telegram").strip().strip("/")
+    return f"http://{host}:{port}/{path}"
+
+
+def load_updates(path: str) -> list[dict]:
+    out = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                out.append(json.loads(line))
+    return out
+
+
+def percentile(sorted_vals: list[float], p: float) -> float:
+    if not sorted_vals:
+        return 0.0
+    k = min(len(sorted_vals) - 1, max(0, int(round(p / 100.0 * (len(sorted_vals) - 1)))))
+    return sorted_vals[k]
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Replay recorded updates against the local webhook.")
+    ap.add_argument("file")
+    ap.add_argument("--url", default=default_url())
+    ap.add_argument("--secret", default=os.getenv("WEBHOOK_SECRET", "").strip())
+    ap.add_argument("--rate", type=float, default=0.0, help="updates per second (0 = as fast as possible)")
+    ap.add_argument("--concurrency", type=int, default=8)
+    ap.add_argument("--repeat", type=int, default=1, help="replay the file N times with fresh update_ids")
+    args = ap.parse_args()
+
+    updates = load_updates(args.file)
+    if not updates:
+        raise SystemExit("No updates in file.")
+
+    headers = {"Content-Type": "application/json"}
+    if args.secret:
+        headers["X-Telegram-Bot-Api-Secret-Token"] = args.secret
+
+    # fresh, increasing update_ids so repeats are not mistaken for duplicates
+    base_id = int(time.time())
+    payloads = []
+    n = 0
+    for _ in range(max(1, args.repeat)):
+        for u in updates:
+            u = dict(u)
+            u["update_id"] = base_id + n
+            n += 1
+            payloads.append(json.dumps(u).encode("utf-8"))
+
+    lat: list[float] = []
+    errors: dict[str, int] = {}
+    mu = threading.Lock()
+
+    def post(body: bytes):
+        t0 = time.perf_counter()
+        try:
+            req = urllib.request.Request(args.url, data=body, headers=headers, method="POST")
+            with urllib.request.urlopen(req, timeout=30) as r:
+                r.read()
+            dt = time.perf_counter() - t0
+            with mu:
+                lat.append(dt)
+        except urllib.error.HTTPError as e:
+            with mu:
+                errors[str(e.code)] = errors.get(str(e.code), 0) + 1
+        except Exception as e:
+            with mu:
+                errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, args.concurrency)) as ex:
+        for i, body in enumerate(payloads):
+            if args.rate > 0:
+                wait = start + i / args.rate - time.perf_counter()
+                if wait > 0:
+                    time.sleep(wait)
+            ex.submit(post, body)
+    wall = time.perf_counter() - start
+
+    lat.sort()
+    print(f"url:        {args.url}")
+    print(f"sent:       {len(payloads)} in {wall:.2f}s ({len(payloads) / wall if wall else 0:.1f}/s)")
+    print(f"ok:         {len(lat)}")
+    print(f"errors:     {errors or 0}")
+    print(
+        "ack ms:     p50={:.1f} p95={:.1f} p99={:.1f} max={:.1f}".format(
+            percentile(lat, 50) * 1000,
+            percentile(lat, 95) * 1000,
+            percentile(lat, 99) * 1000,
+            (lat[-1] if lat else 0) * 1000,
+        )
+    )
+    return 0 if not errors else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())